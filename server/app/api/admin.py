@@ -0,0 +1,20 @@
+import logging
+import secrets
+from fastapi import APIRouter, Header, HTTPException
+
+from app.core.config import ADMIN_API_KEY
+from app.services.upstream_scheduler import scheduler_stats
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+def _require_admin(x_admin_key: str | None):
+    if not ADMIN_API_KEY:
+        raise HTTPException(status_code=403, detail="Admin API is disabled. Set ADMIN_API_KEY to enable it.")
+    if not x_admin_key or not secrets.compare_digest(x_admin_key, ADMIN_API_KEY):
+        raise HTTPException(status_code=401, detail="Invalid admin key")
+
+@router.get("/admin/upstream", summary="Remaining quota budget, queue and backoff state per upstream provider")
+async def upstream_budget_endpoint(x_admin_key: str | None = Header(None)):
+    _require_admin(x_admin_key)
+    return scheduler_stats()
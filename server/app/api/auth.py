@@ -1,24 +1,41 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+import logging
+from fastapi import APIRouter, Depends, HTTPException
 from datetime import datetime
+from pymongo.errors import DuplicateKeyError
 
-from app.models.schemas import UserCreate, UserLogin
-from app.core.security import hash_password, verify_password, create_token
-from app.db.setup import users_collection
+from app.models.schemas import TokenData, UserCreate, UserLogin
+from app.core.security import create_token, get_current_user
+from app.db.setup import USERS, get_collection
+from app.services.password_hasher import PasswordHasherBusy, password_hasher
 
+logger = logging.getLogger(__name__)
 router = APIRouter()
 
+async def _run_hasher(call):
+    try:
+        return await call
+    except PasswordHasherBusy as e:
+        logger.warning(f"Auth request rejected: {str(e)}")
+        raise HTTPException(status_code=503, detail="Too many sign-ins at once. Please retry shortly.", headers={"Retry-After": str(e.retry_after)})
+    except asyncio.TimeoutError:
+        logger.error(f"Password hashing timed out after {password_hasher.timeout}s.")
+        raise HTTPException(status_code=503, detail="Sign-in is temporarily slow. Please retry shortly.", headers={"Retry-After": str(password_hasher.retry_after)})
+
 @router.post("/signup", summary="Create new user")
 async def signup(user: UserCreate):
-    if users_collection.find_one({"$or": [{"email": user.email}, {"username": user.username}]}):
-        raise HTTPException(status_code=400, detail="Email or username already registered")
-
     user_data = {
         "username": user.username,
         "email": user.email,
-        "password": hash_password(user.password),
+        "password": await _run_hasher(password_hasher.hash(user.password)),
         "created_at": datetime.utcnow()
     }
-    result = users_collection.insert_one(user_data)
+    # The unique email/username indexes make the insert itself the existence
+    # check, which also closes the race between two concurrent signups.
+    try:
+        result = await get_collection(USERS).insert_one(user_data)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email or username already registered")
     user_id = str(result.inserted_id)
     
     return {
@@ -31,8 +48,8 @@ async def signup(user: UserCreate):
 
 @router.post("/login", summary="Login user")
 async def login(user: UserLogin):
-    db_user = users_collection.find_one({"email": user.email})
-    if not db_user or not verify_password(user.password, db_user["password"]):
+    db_user = await get_collection(USERS).find_one({"email": user.email})
+    if not db_user or not await _run_hasher(password_hasher.verify(user.password, db_user["password"])):
         raise HTTPException(status_code=401, detail="Invalid email or password")
 
     user_id = str(db_user["_id"])
@@ -42,4 +59,8 @@ async def login(user: UserLogin):
         "token": create_token(
             {"sub": user_id, "email": db_user["email"]}
         )
-    }
\ No newline at end of file
+    }
+
+@router.get("/me", summary="Claims of the bearer token")
+async def me(current_user: TokenData = Depends(get_current_user)):
+    return current_user
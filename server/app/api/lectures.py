@@ -1,15 +1,48 @@
+import json
 import logging
-import requests
-from fastapi import APIRouter, HTTPException
+import httpx
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from datetime import datetime
 
 from app.core.config import YOUTUBE_API_KEY
-from app.db.setup import lectures_collection
-from app.utils.helpers import parse_duration
+from app.db.setup import LECTURES, get_collection
+from app.core.security import get_current_user, get_optional_user
+from app.models.schemas import LectureCreate, TokenData
+from app.services.topic_cache import lecture_cache, normalize_topic
+from app.services.upstream_scheduler import UpstreamThrottled
+from app.services.video_catalog import UNVERIFIED, hydrate_lectures, remember_videos, to_reference
+from app.services.youtube import MAX_LECTURE_VIDEOS, fetch_lecture_videos, iter_lecture_videos
+from app.utils.pagination import InvalidCursor, after_cursor, encode_cursor
+from app.utils.singleflight import SingleFlight
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+_lecture_flights = SingleFlight("generate_lecture")
+
+def _youtube_http_exception(e: Exception, topic: str) -> HTTPException:
+    if isinstance(e, httpx.HTTPStatusError):
+        logger.error(f"YouTube API HTTP error for topic '{topic}': {str(e)}")
+        if e.response.status_code == 403:
+            error_details = e.response.json().get("error", {}).get("errors", [{}])[0].get("reason")
+            if error_details == "quotaExceeded":
+                return HTTPException(status_code=429, detail="YouTube API quota exceeded. Please try again later.")
+            return HTTPException(status_code=403, detail=f"YouTube API access forbidden: {error_details or 'Reason unknown'}")
+        logger.error(f"YouTube API response content: {e.response.text}")
+    elif isinstance(e, UpstreamThrottled):
+        logger.warning(f"YouTube call for topic '{topic}' not sent: {str(e)}")
+        return HTTPException(status_code=429, detail="This server's YouTube quota budget is used up. Please try again later.", headers={"Retry-After": str(e.retry_after)})
+    elif isinstance(e, httpx.TransportError):
+        logger.error(f"YouTube API unreachable for topic '{topic}': {str(e)}")
+    else:
+        logger.error(f"General API error for topic '{topic}': {str(e)}")
+        return HTTPException(status_code=500, detail="Failed to fetch videos. An unexpected error occurred.")
+    return HTTPException(status_code=503, detail="Failed to fetch videos from YouTube due to an API error. Please try again later.")
+
+def _ndjson(message: dict) -> str:
+    return json.dumps(message) + "\n"
+
 @router.get("/api/generate-lecture", summary="Generate lecture from YouTube videos based on topic")
 async def generate_lecture_endpoint(topic: str):
     if not YOUTUBE_API_KEY:
@@ -17,149 +50,174 @@ async def generate_lecture_endpoint(topic: str):
         raise HTTPException(status_code=500, detail="YouTube API key not configured") 
 
     try:
-        video_ids = []
-        next_page_token = None
-        
-        for _ in range(4): 
-            search_res = requests.get(
-                "https://www.googleapis.com/youtube/v3/search",
-                params={
-                    "part": "snippet",
-                    "q": f"{topic} lecture",
-                    "type": "video",
-                    "maxResults": 50, 
-                    "key": YOUTUBE_API_KEY,
-                    "pageToken": next_page_token or "",
-                    "relevanceLanguage": "en",
-                    "videoEmbeddable": "true"
-                }
-            )
-            search_res.raise_for_status() 
-            search_data = search_res.json()
-            video_ids.extend(item["id"]["videoId"] for item in search_data.get("items", []))
-            if not (next_page_token := search_data.get("nextPageToken")):
-                break
-        
-        if not video_ids:
-            logger.info(f"No video IDs found from YouTube search for topic: {topic}")
-            return {"videos": []} 
-
-        all_video_details = []
-        chunk_size = 50 
-        for i in range(0, len(video_ids), chunk_size):
-            chunk = video_ids[i:i + chunk_size]
-            for attempt in range(3): 
-                try:
-                    detail_res = requests.get(
-                        "https://www.googleapis.com/youtube/v3/videos",
-                        params={
-                            "part": "contentDetails,snippet",
-                            "id": ",".join(chunk),
-                            "key": YOUTUBE_API_KEY
-                        }
-                    )
-                    detail_res.raise_for_status()
-                    all_video_details.extend(detail_res.json().get("items", []))
-                    break 
-                except requests.exceptions.RequestException as e: 
-                    logger.warning(f"Attempt {attempt+1} failed to fetch video details for chunk {i//chunk_size}: {str(e)}")
-                    if attempt == 2:
-                        logger.error(f"All attempts failed to fetch video details for chunk {i//chunk_size}.")
-                except Exception as e: 
-                    logger.error(f"An unexpected error occurred during video detail fetch (chunk {i//chunk_size}, attempt {attempt+1}): {str(e)}")
-                    if attempt == 2:
-                         logger.error(f"All attempts failed (unexpected error) for video details for chunk {i//chunk_size}.")
-
-        videos = []
-        for item in all_video_details:
-            try:
-                video_id = item["id"] 
-                snippet = item.get("snippet", {})
-                content_details = item.get("contentDetails", {})
-                
-                iso_duration = content_details.get("duration")
-                if not iso_duration: 
-                    logger.warning(f"Video {video_id} skipped: missing duration.")
-                    continue
-                
-                readable_duration, total_seconds = parse_duration(iso_duration)
-                if not readable_duration: 
-                    logger.debug(f"Video {video_id} skipped: duration {iso_duration} ({total_seconds}s) is less than 4 minutes.")
-                    continue 
-                
-                thumbnails = snippet.get("thumbnails", {})
-                thumbnail = (thumbnails.get("high", {}).get("url") or
-                             thumbnails.get("medium", {}).get("url") or
-                             thumbnails.get("default", {}).get("url"))
-                if not thumbnail:
-                    logger.warning(f"Video {video_id} skipped: missing thumbnail.")
-                    continue
-                
-                videos.append({
-                    "videoId": video_id,
-                    "title": snippet.get("title", "Untitled Video"),
-                    "description": snippet.get("description", ""),
-                    "thumbnails": thumbnail,
-                    "channel": snippet.get("channelTitle", "Unknown Channel"),
-                    "duration": readable_duration,
-                    "status": "todo" 
-                })
-                
-                if len(videos) >= 100: 
-                    break
-                    
-            except KeyError as e: 
-                logger.error(f"Error processing video item (KeyError: {str(e)}): {item.get('id', 'Unknown ID')}")
-                continue
-            except Exception as e: 
-                logger.error(f"Error processing video item {item.get('id', 'Unknown ID')}: {str(e)}")
-                continue
-        
+        videos = await _lecture_flights.do(normalize_topic(topic), lecture_cache.get_or_fetch, topic, fetch_lecture_videos)
         if not videos:
             logger.info(f"No videos met filtering criteria for topic: {topic}")
         
         return {"videos": videos} 
 
-    except requests.exceptions.HTTPError as e: 
-        logger.error(f"YouTube API HTTP error for topic '{topic}': {str(e)}")
-        if e.response is not None:
-            if e.response.status_code == 403: 
-                error_details = e.response.json().get("error", {}).get("errors", [{}])[0].get("reason")
-                if error_details == "quotaExceeded":
-                    raise HTTPException(status_code=429, detail="YouTube API quota exceeded. Please try again later.")
-                raise HTTPException(status_code=403, detail=f"YouTube API access forbidden: {error_details or 'Reason unknown'}")   
-            logger.error(f"YouTube API response content: {e.response.text}")
-        raise HTTPException(status_code=503, detail="Failed to fetch videos from YouTube due to an API error. Please try again later.")
     except Exception as e:
-        logger.error(f"General API error for topic '{topic}': {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to fetch videos. An unexpected error occurred.")
+        raise _youtube_http_exception(e, topic)
+
+async def _stream_cached(videos: list[dict]):
+    for video in videos:
+        yield _ndjson({"type": "video", "video": video})
+    yield _ndjson({"type": "done", "count": len(videos), "cached": True})
+
+async def _stream_videos(topic: str, count: int, first: dict | None, videos):
+    sent = []
+    try:
+        if first is not None:
+            sent.append(first)
+            yield _ndjson({"type": "video", "video": first})
+            async for video in videos:
+                sent.append(video)
+                yield _ndjson({"type": "video", "video": video})
+    except Exception as e:
+        # Headers are already sent, so the failure is reported in-band.
+        error = _youtube_http_exception(e, topic)
+        yield _ndjson({"type": "error", "status": error.status_code, "detail": error.detail})
+        return
+    finally:
+        await videos.aclose()
+
+    # A full-size or exhausted result is exactly what generate-lecture would
+    # have returned, so it can fill the topic cache; a truncated one cannot.
+    if count >= MAX_LECTURE_VIDEOS or len(sent) < count:
+        await lecture_cache.store(topic, sent)
+    yield _ndjson({"type": "done", "count": len(sent), "cached": False})
+
+@router.get("/api/generate-lecture/stream", summary="Stream qualifying lecture videos as NDJSON as soon as they are found")
+async def generate_lecture_stream_endpoint(topic: str, count: int = Query(MAX_LECTURE_VIDEOS, ge=1, le=MAX_LECTURE_VIDEOS)):
+    if not YOUTUBE_API_KEY:
+        logger.error("YouTube API key not configured.")
+        raise HTTPException(status_code=500, detail="YouTube API key not configured")
+
+    cached = await lecture_cache.lookup(topic, fetch_lecture_videos)
+    if cached is not None:
+        return StreamingResponse(_stream_cached(cached[:count]), media_type="application/x-ndjson")
+
+    # Wait for the first video before answering so that failures of the first
+    # search page still map to a proper status code.
+    videos = iter_lecture_videos(topic, count)
+    try:
+        first = await anext(videos)
+    except StopAsyncIteration:
+        first = None
+    except Exception as e:
+        await videos.aclose()
+        raise _youtube_http_exception(e, topic)
+    return StreamingResponse(_stream_videos(topic, count, first, videos), media_type="application/x-ndjson")
+
+@router.get("/api/generate-lecture/cache-stats", summary="Hit/miss/stale counters of the lecture topic cache")
+async def lecture_cache_stats_endpoint():
+    return lecture_cache.stats()
+
+@router.post("/user/lectures", summary="Save a generated lecture for a user")
+async def save_user_lecture_endpoint(lecture: LectureCreate, current_user: TokenData = Depends(get_current_user)):
+    if lecture.user_id is not None and lecture.user_id != current_user.user_id:
+        raise HTTPException(status_code=403, detail="Cannot save lectures for another user.")
+    # Video metadata goes to the shared catalog; the lecture keeps only the
+    # ordered references and this user's status for each video.
+    videos = [v for v in lecture.videos if v.get("videoId")]
+    await remember_videos({v["videoId"]: v for v in videos if v.get("title")}, fetched_at=UNVERIFIED, overwrite=False)
+    try:
+        result = await get_collection(LECTURES).insert_one({
+            "user_id": current_user.user_id,
+            "topic": lecture.topic,
+            "created_at": datetime.utcnow(),
+            "videos": [to_reference(v) for v in videos]
+        })
+    except Exception as e:
+        logger.error(f"Failed to save lecture for user {current_user.user_id}: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Could not save lecture.")
+    return {"message": "Lecture saved successfully", "lecture_id": str(result.inserted_id)}
 
-@router.get("/user/lectures", summary="Get lectures for a specific user")
-async def get_user_lectures_endpoint(user_id: str):
+LECTURE_VIDEO_FIELDS = ("videoId", "title", "description", "thumbnails", "channel", "duration", "status")
+
+def _video_fields(video_fields: str | None) -> tuple[str, ...] | None:
+    # None (every field) when absent or empty.
+    fields = tuple(f.strip() for f in (video_fields or "").split(",") if f.strip())
+    unknown = [f for f in fields if f not in LECTURE_VIDEO_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown video fields: {', '.join(unknown)}. Allowed: {', '.join(LECTURE_VIDEO_FIELDS)}")
+    return fields or None
+
+def _lectures_projection(view: str, fields: tuple[str, ...] | None) -> dict:
+    projection = {"topic": 1, "created_at": 1}
+    if view == "summary":
+        projection["video_count"] = {"$size": {"$ifNull": ["$videos", []]}}
+    elif fields:
+        # videoId is needed to fill catalog fields into video references.
+        projection.update({f"videos.{f}": 1 for f in {"videoId", *fields}})
+    else:
+        projection["videos"] = 1
+    return projection
+
+@router.get("/user/lectures", summary="Get lectures for a specific user, newest first, one page at a time")
+async def get_user_lectures_endpoint(
+    user_id: str,
+    limit: int = Query(10, ge=1, le=50),
+    cursor: str | None = Query(None, description="next_cursor from the previous page"),
+    view: str = Query("full", pattern="^(full|summary)$", description="summary returns topic, created_at and video_count only"),
+    video_fields: str | None = Query(None, description="Comma-separated subset of video fields for the full view"),
+    current_user: TokenData | None = Depends(get_optional_user)
+):
+    # Anonymous reads keep working for the current client; a token, when
+    # sent, must belong to the requested user.
+    if current_user is not None and current_user.user_id != user_id:
+        raise HTTPException(status_code=403, detail="Token does not belong to this user.")
+    fields = _video_fields(video_fields)
     try:
         # Optional: Validate user_id format and existence
         # try:
         #     query_user_id_obj = ObjectId(user_id)
         # except InvalidId:
         #     raise HTTPException(status_code=400, detail="Invalid user_id format.")
-        # if not users_collection.find_one({"_id": query_user_id_obj}):
+        # if not await get_collection(USERS).find_one({"_id": query_user_id_obj}):
         #      raise HTTPException(status_code=404, detail=f"User with id {user_id} not found.")
 
-        user_lectures = list(lectures_collection.find(
-            {"user_id": user_id}, # Use the provided user_id string
-            {"_id": 0, "topic": 1, "created_at": 1, "videos": 1} 
-        ).sort("created_at", -1).limit(10))
-        
+        query = {"user_id": user_id} # Use the provided user_id string
+        if cursor:
+            try:
+                query.update(after_cursor(cursor))
+            except InvalidCursor:
+                raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+        # One extra document tells whether another page exists. A pipeline
+        # rather than find(): the leading $match/$sort still use the
+        # (user_id, created_at, _id) index, and $project computes video_count.
+        user_lectures = await get_collection(LECTURES).aggregate([
+            {"$match": query},
+            {"$sort": {"created_at": -1, "_id": -1}},
+            {"$limit": limit + 1},
+            {"$project": _lectures_projection(view, fields)},
+        ]).to_list(length=limit + 1)
+
+        next_cursor = None
+        if len(user_lectures) > limit:
+            user_lectures = user_lectures[:limit]
+            last = user_lectures[-1]
+            next_cursor = encode_cursor(last["created_at"], last["_id"])
+
+        if view == "full":
+            await hydrate_lectures(user_lectures, fields)
+            if fields and "videoId" not in fields:
+                for lecture in user_lectures:
+                    for video in lecture.get("videos", []):
+                        video.pop("videoId", None)
+
         for lecture in user_lectures:
+            lecture.pop("_id", None)
             if isinstance(lecture.get("created_at"), datetime):
                 lecture["created_at"] = lecture["created_at"].isoformat()
         
         if not user_lectures:
             logger.info(f"No lectures found for user_id: {user_id}")
         
-        return {"lectures": user_lectures}
+        return {"lectures": user_lectures, "next_cursor": next_cursor}
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Failed to retrieve lectures for user {user_id}: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail="Could not retrieve user lectures.")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Could not retrieve user lectures.")
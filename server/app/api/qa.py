@@ -1,69 +1,143 @@
+import json
 import logging
 import wikipedia
-import google.generativeai as genai
-from google.api_core.exceptions import ResourceExhausted
 from fastapi import APIRouter, HTTPException
-from youtube_transcript_api import YouTubeTranscriptApi
+from fastapi.responses import StreamingResponse
+from youtube_transcript_api import CouldNotRetrieveTranscript
 
-from app.core.config import GEMINI_API_KEY
+from app.core.config import QA_MAX_CONTEXT_TOKENS, QA_TOP_K
+from app.services.content_cache import transcript_cache, wikipedia_cache
+from app.services.gemini import GeminiQuotaExceeded, get_gemini
+from app.services.topic_cache import normalize_topic
+from app.services.transcript_index import format_timestamp, get_transcript_index
+from app.services.upstream_scheduler import UpstreamThrottled
+from app.utils.singleflight import SingleFlight
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-@router.get("/generate-answer", summary="Generate answer based on video transcript and Wikipedia")
-async def generate_answer_endpoint(videoId: str, topic: str, question: str):
+_answer_flights = SingleFlight("generate_answer")
+
+wikipedia.set_user_agent("IntellectAi/1.0 (Intellect@Ai.com; IntellectAi.com)")
+
+def _wikipedia_summary(topic: str) -> str:
+    return wikipedia.summary(topic, sentences=5, auto_suggest=False)
+
+async def _wikipedia_context(topic: str) -> str:
+    # Keyed like the lecture cache, so "Photosynthesis" and "photosynthesis "
+    # share an entry; the page is still looked up with the title as given,
+    # since Wikipedia titles are case-sensitive after the first letter.
     try:
-        transcript_list = YouTubeTranscriptApi.get_transcript(videoId)
-        transcript_text = " ".join([t['text'] for t in transcript_list])
-
-        wikipedia_content = ""
-        try:
-
-            wikipedia.set_user_agent("IntellectAi/1.0 (Intellect@Ai.com; IntellectAi.com)")
-            wikipedia_content = wikipedia.summary(topic, sentences=5, auto_suggest=False)
-        except wikipedia.exceptions.PageError:
-            logger.info(f"Wikipedia page not found for topic: {topic}")
-            wikipedia_content = "No relevant Wikipedia page found for the topic."
-        except wikipedia.exceptions.DisambiguationError as e:
-            options = e.options[:3] 
-            logger.info(f"Wikipedia topic '{topic}' is ambiguous. Options: {options}")
-            wikipedia_content = f"The topic '{topic}' is ambiguous. Possible matches: {', '.join(options)}. Please be more specific."
-        except wikipedia.exceptions.WikipediaException as e:
-            logger.warning(f"Wikipedia lookup error for topic '{topic}': {str(e)}")
-            wikipedia_content = "Could not retrieve information from Wikipedia due to an error."
-        except Exception as e:
-            logger.error(f"Unexpected error during Wikipedia lookup for topic '{topic}': {str(e)}", exc_info=True)
-            wikipedia_content = "An unexpected error occurred while fetching Wikipedia content."
-
-
-        if not GEMINI_API_KEY:
+        return await wikipedia_cache.get_or_load(normalize_topic(topic), lambda _: _wikipedia_summary(topic))
+    except wikipedia.exceptions.PageError:
+        logger.info(f"Wikipedia page not found for topic: {topic}")
+        return "No relevant Wikipedia page found for the topic."
+    except wikipedia.exceptions.DisambiguationError as e:
+        options = e.options[:3] 
+        logger.info(f"Wikipedia topic '{topic}' is ambiguous. Options: {options}")
+        return f"The topic '{topic}' is ambiguous. Possible matches: {', '.join(options)}. Please be more specific."
+    except wikipedia.exceptions.WikipediaException as e:
+        logger.warning(f"Wikipedia lookup error for topic '{topic}': {str(e)}")
+        return "Could not retrieve information from Wikipedia due to an error."
+    except Exception as e:
+        logger.error(f"Unexpected error during Wikipedia lookup for topic '{topic}': {str(e)}", exc_info=True)
+        return "An unexpected error occurred while fetching Wikipedia content."
+
+async def _prepare_answer(videoId: str, topic: str, question: str):
+    # Shared by the plain and streamed endpoints: returns the Gemini client,
+    # the prompt and the cited passages, or raises the matching HTTPException.
+    try:
+        index = await get_transcript_index(videoId)
+        passages = index.select_passages(question, QA_MAX_CONTEXT_TOKENS, QA_TOP_K)
+        transcript_text = "\n\n".join(f"[{format_timestamp(p['start'])}] {p['text']}" for p in passages)
+
+        wikipedia_content = await _wikipedia_context(topic)
+
+        gemini = get_gemini()
+        if gemini is None:
             logger.error("Gemini API key not configured.")
             raise HTTPException(status_code=500, detail="Generative AI service not configured.")
 
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel("gemini-1.5-flash")
-
-        max_transcript_chars = 20000 
         prompt = (
             f"Based on the following information, please answer the question: '{question}'.\n\n"
-            f"From YouTube Video Transcript (Topic: {topic}, Video ID: {videoId}):\n\"\"\"\n{transcript_text[:max_transcript_chars]}\n\"\"\"\n\n"
+            f"Excerpts from YouTube Video Transcript, each prefixed with its [timestamp] (Topic: {topic}, Video ID: {videoId}):\n\"\"\"\n{transcript_text}\n\"\"\"\n\n"
             f"From Wikipedia (Topic: {topic}):\n\"\"\"\n{wikipedia_content}\n\"\"\"\n\n"
-            "Provide a concise and direct answer to the question. If the information is insufficient, state that."
+            "Provide a concise and direct answer to the question, citing the [timestamp] of the transcript excerpts you rely on. "
+            "If the information is insufficient, state that."
         )
+        sources = [{"start": p["start"], "timestamp": format_timestamp(p["start"])} for p in passages]
+        return gemini, prompt, sources
 
-        try:
-            response = model.generate_content(prompt)
-            return {"answer": response.text.strip()}
-        except ResourceExhausted as e:
-            logger.warning(f"Gemini API quota exceeded: {str(e)}")
-            raise HTTPException(status_code=429, detail="Gemini API quota exceeded. Please wait and try again.")
-        except Exception as e:
-            logger.error(f"Error during Gemini content generation: {str(e)}", exc_info=True)
-            raise HTTPException(status_code=500, detail="Failed to generate answer from AI model.")
-
-    except YouTubeTranscriptApi.CouldNotRetrieveTranscript as e:
+    except HTTPException:
+        raise
+    except CouldNotRetrieveTranscript as e:
         logger.warning(f"Could not retrieve transcript for videoId {videoId}: {str(e)}")
         raise HTTPException(status_code=404, detail=f"Transcript not available for video {videoId}. It might be disabled or the video doesn't exist.")
     except Exception as e:
         logger.error(f"Answer generation failed for videoId {videoId}, topic '{topic}': {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail="Failed to generate answer due to an internal error.")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Failed to generate answer due to an internal error.")
+
+def _generation_exception(e: Exception) -> HTTPException:
+    if isinstance(e, UpstreamThrottled):
+        logger.warning(f"Gemini call not sent: {str(e)}")
+        return HTTPException(status_code=429, detail="Gemini API quota exceeded. Please wait and try again.", headers={"Retry-After": str(e.retry_after)})
+    if isinstance(e, GeminiQuotaExceeded):
+        logger.warning(f"Gemini API quota exceeded: {str(e)}")
+        return HTTPException(status_code=429, detail="Gemini API quota exceeded. Please wait and try again.")
+    logger.error(f"Error during Gemini content generation: {str(e)}", exc_info=True)
+    return HTTPException(status_code=500, detail="Failed to generate answer from AI model.")
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _generate_answer(videoId: str, topic: str, question: str) -> dict:
+    gemini, prompt, sources = await _prepare_answer(videoId, topic, question)
+    try:
+        answer = await gemini.generate(prompt)
+    except Exception as e:
+        raise _generation_exception(e)
+    return {"answer": answer.strip(), "sources": sources}
+
+@router.get("/generate-answer", summary="Generate answer based on video transcript and Wikipedia")
+async def generate_answer_endpoint(videoId: str, topic: str, question: str):
+    # Identical questions arriving together (a whole class) share one answer.
+    key = (videoId, normalize_topic(topic), normalize_topic(question))
+    return await _answer_flights.do(key, _generate_answer, videoId, topic, question)
+
+async def _stream_answer(first: str | None, tokens, sources: list[dict]):
+    try:
+        if first is not None:
+            yield _sse("token", {"text": first})
+            async for text in tokens:
+                yield _sse("token", {"text": text})
+    except Exception as e:
+        # Headers are already sent, so the failure is reported in-band.
+        error = _generation_exception(e)
+        yield _sse("error", {"status": error.status_code, "detail": error.detail})
+        return
+    finally:
+        await tokens.aclose()
+    yield _sse("done", {"sources": sources})
+
+@router.get("/generate-answer/stream", summary="Stream the generated answer as server-sent events")
+async def generate_answer_stream_endpoint(videoId: str, topic: str, question: str):
+    gemini, prompt, sources = await _prepare_answer(videoId, topic, question)
+    # Wait for the first token so quota and configuration errors keep their
+    # status codes instead of surfacing inside a 200 stream.
+    tokens = gemini.stream(prompt)
+    try:
+        first = await anext(tokens)
+    except StopAsyncIteration:
+        first = None
+    except Exception as e:
+        await tokens.aclose()
+        raise _generation_exception(e)
+    return StreamingResponse(
+        _stream_answer(first, tokens, sources),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/generate-answer/cache-stats", summary="Hit rates of the transcript and Wikipedia content caches")
+async def content_cache_stats_endpoint():
+    return {"transcripts": transcript_cache.stats(), "wikipedia": wikipedia_cache.stats()}
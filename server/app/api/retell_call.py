@@ -1,36 +1,17 @@
-import os
 import logging
-from fastapi import APIRouter, HTTPException, Body, Depends
+from fastapi import APIRouter, HTTPException, Body, Depends, Header
 from pydantic import BaseModel, Field
-from dotenv import load_dotenv
-from retell_ai_python_sdk.retell_sdk import RetellSDK
-from retell_ai_python_sdk.models import CallResponse 
 
-logger = logging.getLogger(__name__)
-
-if not os.getenv("RETELL_API_KEY"): 
-    project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    dotenv_path = os.path.join(project_root, '.env')
-    if os.path.exists(dotenv_path):
-        load_dotenv(dotenv_path=dotenv_path)
-        logger.info(f".env loaded from: {dotenv_path}")
-    else:
-        logger.warning(f".env file not found at {dotenv_path}. Retell API key might not be available.")
+from app.core.config import RETELL_AGENT_ID, RETELL_FROM_NUMBER
+from app.core.security import get_optional_user
+from app.models.schemas import TokenData
+from app.services.call_jobs import call_jobs, job_view
+from app.services.retell import get_retell
 
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-retell_api_key = os.getenv("RETELL_API_KEY")
-if not retell_api_key:
-    logger.critical("RETELL_API_KEY not found in environment variables. Retell functionality will fail.")
-    retell_sdk_instance = None 
-else:
-    retell_sdk_instance = RetellSDK(api_key=retell_api_key)
-    logger.info("Retell SDK initialized successfully.")
-
-
-RETELL_AGENT_ID_CONFIG = os.getenv("RETELL_AGENT_ID", "your_default_agent_id_here")
-RETELL_FROM_NUMBER_CONFIG = os.getenv("RETELL_FROM_NUMBER", "+916307942349")
 
 class RetellCallRequest(BaseModel):
     text_to_explain: str = Field(..., description="The text content the Retell agent should explain.")
@@ -40,67 +21,76 @@ class RetellCallRequest(BaseModel):
 
 class RetellCallResponse(BaseModel):
     message: str
+    job_id: str
+    status: str
     call_id: str | None = None
 
 
 
-async def get_retell_sdk():
-    if not retell_sdk_instance:
+def require_retell():
+    if get_retell() is None:
+        logger.error("Retell API key not configured.")
         raise HTTPException(
-            status_code=503, 
+            status_code=503,
             detail="Retell service is not configured or unavailable. Missing API key."
         )
-    return retell_sdk_instance
 
 
 @router.post(
     "/initiate-retell-call",
     response_model=RetellCallResponse,
-    summary="Initiates a call via Retell AI to explain a given text.",
-    tags=["Retell Call"] 
+    status_code=202,
+    summary="Queues a call via Retell AI to explain a given text. Poll the returned job for its outcome.",
+    tags=["Retell Call"]
 )
 async def initiate_call_endpoint(
     payload: RetellCallRequest = Body(...),
-    retell: RetellSDK = Depends(get_retell_sdk)
+    idempotency_key: str | None = Header(None, description="Repeating a request with the same key returns the original job"),
+    current_user: TokenData | None = Depends(get_optional_user),
+    _: None = Depends(require_retell)
 ):
     logger.info(f"Received Retell call request for user: {payload.user_phone_number}, topic: {payload.topic}")
 
-    if RETELL_AGENT_ID_CONFIG == "your_default_agent_id_here":
+    if RETELL_AGENT_ID == "your_default_agent_id_here":
         logger.error("FATAL: RETELL_AGENT_ID is not configured in environment variables.")
         raise HTTPException(status_code=500, detail="Retell Agent ID not configured on the backend.")
 
-    if RETELL_FROM_NUMBER_CONFIG == "+1XXXXXXXXXX":
+    if RETELL_FROM_NUMBER == "+1XXXXXXXXXX":
         logger.error("FATAL: RETELL_FROM_NUMBER is not configured in environment variables.")
         raise HTTPException(status_code=500, detail="Retell 'from' number not configured on the backend.")
 
-    custom_parameters = {
-        "text_to_explain_param": payload.text_to_explain,
-        "topic_param": payload.topic,
-        "video_id_param": payload.video_id,
+    request = {
+        "to_number": payload.user_phone_number,
+        "text_to_explain": payload.text_to_explain,
+        "topic": payload.topic,
+        "video_id": payload.video_id,
     }
-
     try:
-        logger.info(f"Attempting Retell call from {RETELL_FROM_NUMBER_CONFIG} to {payload.user_phone_number} using agent {RETELL_AGENT_ID_CONFIG}")
-        
-        call_api_response: CallResponse = retell.call.create_phone_call(
-            from_number=RETELL_FROM_NUMBER_CONFIG,
-            to_number=payload.user_phone_number,
-            agent_id=RETELL_AGENT_ID_CONFIG,
-            retell_llm_dynamic_variables=custom_parameters
-        )
-        
-        logger.info(f"Retell API call successful: call_id={call_api_response.call_id}, status={call_api_response.status}")
-        
-        return RetellCallResponse(
-            message="Call initiated successfully!",
-            call_id=call_api_response.call_id
-        )
-
-    except HTTPException as http_exc:
-        raise http_exc
+        job, created = await call_jobs.enqueue(request, idempotency_key, current_user.user_id if current_user else None)
     except Exception as e:
-        logger.error(f"Retell API call failed: {str(e)}", exc_info=True)
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to initiate call via Retell: {str(e)}"
-        )
\ No newline at end of file
+        logger.error(f"Failed to queue Retell call: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Could not queue the call. Please try again.")
+
+    if not created:
+        logger.info(f"Duplicate Retell call request matched job {job['_id']} ({job['status']}).")
+    return RetellCallResponse(
+        message="Call queued." if created else "This call was already requested.",
+        job_id=job["_id"],
+        status=job["status"],
+        call_id=job.get("call_id")
+    )
+
+
+@router.get("/retell-call/stats", summary="Counters and job totals of the Retell call queue", tags=["Retell Call"])
+async def retell_call_stats_endpoint():
+    return await call_jobs.stats()
+
+
+@router.get("/retell-call/jobs/{job_id}", summary="Status of a queued Retell call", tags=["Retell Call"])
+async def retell_call_job_endpoint(job_id: str, current_user: TokenData | None = Depends(get_optional_user)):
+    job = await call_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Call job not found.")
+    if current_user is not None and job.get("user_id") not in (None, current_user.user_id):
+        raise HTTPException(status_code=403, detail="Call job does not belong to this user.")
+    return job_view(job)
@@ -1,131 +1,248 @@
+import asyncio
 import logging
-import base64
-from io import BytesIO
-from fastapi import APIRouter, HTTPException
-from PIL import Image
-import numpy as np
-from deepface import DeepFace
-
+import json
+from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from starlette.formparsers import MultiPartException
+
+from app.core.config import (
+    STRESS_STREAM_BUFFER_SECONDS, STRESS_FACE_MODE, STRESS_HISTORY, STRESS_MAX_UPLOAD_FRAMES, STRESS_MAX_UPLOAD_FIELDS
+)
+from app.core.metrics import observe_stages, stage
+from app.core.security import decode_token, get_optional_user
+from app.models.schemas import TokenData
+from app.services.face_tracking import FaceLocalizer, FACE_MODES
+from app.services.frame_quality import FrameQualityGate
 from app.services.heart_metrics import HeartMetricsCalculator
+from app.services.stress_analysis import (
+    MIN_VALID_FRAMES, BINARY_ENCODINGS, FramePayloadError,
+    analyze_frames, analyze_binary_frames, extract_intensities
+)
+from app.services.stress_pool import stress_pool, StressPoolBusy
+from app.services.stress_store import stress_store, new_session_id
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
+def _busy_exception(e: StressPoolBusy) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Stress analysis is at capacity. Please retry shortly.",
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+
+async def _run_analysis(fn, *args):
+    with stage("stress_job"):
+        result = await stress_pool.run(fn, *args)
+    observe_stages(result.pop("stage_timings", ()))
+    return result
+
+
+async def _record_history(user_id, session_id, result, video_id, frame_quality=None, source="batch"):
+    # History is best effort: a failed write never fails the analysis.
+    try:
+        await stress_store.record(user_id, session_id, result, video_id, frame_quality, source)
+        return True
+    except Exception as e:
+        logger.warning(f"Could not store stress session {session_id}: {str(e)}")
+        return False
+
+
+async def _with_history(result, current_user, video_id):
+    # Only successful analyses of signed-in users are kept.
+    if not STRESS_HISTORY or current_user is None or "error" in result:
+        return result
+    session_id = new_session_id()
+    if await _record_history(current_user.user_id, session_id, result, video_id, result.get("frame_quality")):
+        result["session_id"] = session_id
+    return result
+
+
 @router.post("/analyze-stress", summary="Analyze stress from video frames")
-async def analyze_stress_endpoint(data: dict): 
+async def analyze_stress_endpoint(data: dict, current_user: TokenData | None = Depends(get_optional_user)):
     try:
         frames = data.get('frames', [])
         if not frames: # Basic validation
             raise HTTPException(status_code=400, detail="No frames provided for analysis.")
         if not isinstance(frames, list) or not all(isinstance(f, str) for f in frames):
              raise HTTPException(status_code=400, detail="Frames must be a list of strings (data URLs).")
+        face_mode = data.get('face_mode', STRESS_FACE_MODE)
+        if face_mode not in FACE_MODES:
+            raise HTTPException(status_code=400, detail=f"face_mode must be one of {', '.join(FACE_MODES)}.")
+
+        result = await _run_analysis(analyze_frames, frames, face_mode, 10) # Assuming 10 FPS from frontend
+        return await _with_history(result, current_user, data.get('video_id'))
+
+    except HTTPException:
+        raise
+    except StressPoolBusy as e:
+        logger.warning(f"Stress analysis rejected: {str(e)}")
+        raise _busy_exception(e)
+    except asyncio.TimeoutError:
+        logger.error(f"Stress analysis timed out after {stress_pool.job_timeout}s.")
+        raise HTTPException(status_code=504, detail="Stress analysis took too long. Try a shorter capture.")
+    except Exception as e:
+        logger.error(f"Overall stress analysis error: {str(e)}", exc_info=True)
+        return {"error": "Failed to process stress analysis due to an unexpected internal server error."}
+
+
+# Binary ingest: either multipart/form-data with one "frames" file part per
+# frame, or a raw body of length-prefixed frames ([4-byte big-endian length]
+# [payload]...). Payloads are JPEG/PNG images, or packed RGB uint8 pixels when
+# encoding=raw (width and height are then required).
+@router.post("/analyze-stress/binary", summary="Analyze stress from binary video frames")
+async def analyze_stress_binary_endpoint(
+    request: Request,
+    encoding: str = "jpeg",
+    width: int | None = None,
+    height: int | None = None,
+    face_mode: str = STRESS_FACE_MODE,
+    fps: int = 10,
+    video_id: str | None = None,
+    current_user: TokenData | None = Depends(get_optional_user)
+):
+    if encoding not in BINARY_ENCODINGS:
+        raise HTTPException(status_code=400, detail=f"encoding must be one of {', '.join(BINARY_ENCODINGS)}.")
+    if encoding == "raw" and not (width and height and width > 0 and height > 0):
+        raise HTTPException(status_code=400, detail="width and height are required for raw frames.")
+    if face_mode not in FACE_MODES:
+        raise HTTPException(status_code=400, detail=f"face_mode must be one of {', '.join(FACE_MODES)}.")
+    if fps <= 0:
+        raise HTTPException(status_code=400, detail="fps must be positive.")
 
+    try:
+        if request.headers.get("content-type", "").startswith("multipart/form-data"):
+            form = await request.form(max_files=STRESS_MAX_UPLOAD_FRAMES, max_fields=STRESS_MAX_UPLOAD_FIELDS)
+            payloads = [await part.read() for part in form.getlist("frames") if hasattr(part, "read")]
+            await form.close()
+        else:
+            payloads = await request.body()
+        if not payloads:
+            raise HTTPException(status_code=400, detail="No frames provided for analysis.")
+
+        result = await _run_analysis(analyze_binary_frames, payloads, encoding, width, height, face_mode, fps)
+        return await _with_history(result, current_user, video_id)
 
-        intensity_values = []
-        processed_frame_count = 0
-        
-        for i, frame_data_url in enumerate(frames):
-            logger.debug(f"Processing frame {i+1}/{len(frames)}")
-            if not isinstance(frame_data_url, str) or ',' not in frame_data_url:
-                logger.warning(f"Frame {i+1}: Invalid data URL format. Skipping.")
+    # Starlette's own HTTPException (a malformed multipart body, or more parts
+    # than the limits above) is the base of FastAPI's, so this covers both.
+    except StarletteHTTPException:
+        raise
+    except MultiPartException as e:
+        raise HTTPException(status_code=400, detail=e.message)
+    except FramePayloadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except StressPoolBusy as e:
+        logger.warning(f"Stress analysis rejected: {str(e)}")
+        raise _busy_exception(e)
+    except asyncio.TimeoutError:
+        logger.error(f"Stress analysis timed out after {stress_pool.job_timeout}s.")
+        raise HTTPException(status_code=504, detail="Stress analysis took too long. Try a shorter capture.")
+    except Exception as e:
+        logger.error(f"Overall binary stress analysis error: {str(e)}", exc_info=True)
+        return {"error": "Failed to process stress analysis due to an unexpected internal server error."}
+
+
+@router.get("/analyze-stress/batching-stats", summary="Throughput and latency of batched face detection per batch size")
+async def batching_stats_endpoint():
+    stats = await run_in_threadpool(stress_pool.batching_stats)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Batched face detection is not running.")
+    return stats
+
+
+# Streaming session protocol: the client sends JSON text messages, either
+# {"frame": "<data URL>"} or {"frames": [...]}, and finally {"type": "end"}.
+# The server answers with a {"type": "metrics", ...} message every step_size
+# valid frames and a {"type": "final", ...} message when the session ends.
+# Browsers can't set headers on websockets, so signed-in clients pass their
+# bearer token as ?token=; their session is then stored as one sample when it
+# ends or disconnects, like a batch analysis.
+@router.websocket("/ws/analyze-stress")
+async def analyze_stress_stream(websocket: WebSocket, fps: int = 10, face_mode: str = STRESS_FACE_MODE,
+                                video_id: str | None = None, token: str | None = None):
+    # Same checks as the POST routes; a websocket can only refuse with a
+    # policy-violation close before it is accepted.
+    if face_mode not in FACE_MODES or fps <= 0:
+        await websocket.close(code=1008)
+        return
+    current_user = None
+    if token:
+        try:
+            current_user = decode_token(token)
+        except HTTPException:
+            await websocket.close(code=1008)
+            return
+    await websocket.accept()
+    session_id = new_session_id() if STRESS_HISTORY and current_user else None
+    localizer = FaceLocalizer(mode=face_mode)
+    gate = FrameQualityGate()
+    calculator = HeartMetricsCalculator(fps=fps)
+    stream = calculator.incremental(buffer_seconds=STRESS_STREAM_BUFFER_SECONDS)
+    frames_received = 0
+
+    def session_state(message_type):
+        state = {"type": message_type, "frames_received": frames_received, "valid_frames": stream.frames}
+        state.update(stream.metrics())
+        state["frame_quality"] = gate.stats()
+        state["face_localization"] = localizer.stats()
+        return state
+
+    async def finish():
+        # Metrics messages carry running values over a sliding buffer, so only
+        # the final state (with the whole session's gate counters) is stored.
+        nonlocal session_id
+        final = session_state("final")
+        if stream.frames < MIN_VALID_FRAMES:
+            final["error"] = f"Insufficient valid frames ({stream.frames} collected). Ensure clear, stable face view."
+        elif session_id and await _record_history(current_user.user_id, session_id, final, video_id, final["frame_quality"], "stream"):
+            final["session_id"] = session_id
+        session_id = None # stored at most once
+        return final
+
+    try:
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+            except json.JSONDecodeError:
+                await websocket.send_json({"type": "error", "detail": "Messages must be JSON objects."})
+                continue
+            if not isinstance(message, dict):
+                await websocket.send_json({"type": "error", "detail": "Messages must be JSON objects."})
                 continue
 
+            if message.get("type") == "end":
+                await websocket.send_json(await finish())
+                await websocket.close()
+                return
+
+            frames = message.get("frames") or ([message["frame"]] if "frame" in message else [])
+            if not frames:
+                continue
+            if not isinstance(frames, list) or not all(isinstance(f, str) for f in frames):
+                await websocket.send_json({"type": "error", "detail": "Frames must be a list of strings (data URLs)."})
+                continue
             try:
-                header, encoded = frame_data_url.split(',', 1)
-                image_data = base64.b64decode(encoded)
-                image = Image.open(BytesIO(image_data)).convert('RGB')
-
-                try:
-                    face_analysis_results = DeepFace.analyze(
-                        img_path=np.array(image),
-                        actions=['emotion'], 
-                        detector_backend='ssd', 
-                        silent=True,
-                        enforce_detection=False
-                    )
-                    
-                    if not face_analysis_results or not isinstance(face_analysis_results, list) or not face_analysis_results[0].get('region'):
-                        logger.warning(f"Frame {i+1}: No face detected or region missing. Skipping. Result: {face_analysis_results}")
-                        continue
-
-                    if len(face_analysis_results) > 1:
-                        logger.warning(f"Frame {i+1}: Multiple faces ({len(face_analysis_results)}) detected. Using the first one.")
-                        # For now, process the first one. Consider skipping or specific logic for multiple faces.
-                    
-                    face_analysis = face_analysis_results[0]
-
-                    box = face_analysis.get('region')
-                    if not box or not all(k in box for k in ['x', 'y', 'w', 'h']):
-                        logger.warning(f"Frame {i+1}: Face detected but region data is incomplete. Skipping. Box: {box}")
-                        continue
-                    
-                    x, y, w, h = box['x'], box['y'], box['w'], box['h']
-                    logger.info(f"Frame {i+1}: Detected face at x:{x}, y:{y}, w:{w}, h:{h}")
-
-                    if w <= 0 or h <= 0:
-                        logger.warning(f"Frame {i+1}: Invalid face region dimensions. w:{w}, h:{h}. Skipping.")
-                        continue
-
-                    roi_y1 = y + (h // 8)
-                    roi_y2 = y + (h // 4)
-                    roi_x1 = x + (w // 3)
-                    roi_x2 = x + w - (w // 3)
-
-                    if not (roi_x1 < roi_x2 and roi_y1 < roi_y2):
-                        logger.warning(f"Frame {i+1}: Invalid forehead ROI. Box: {box}, ROI:({roi_x1},{roi_y1},{roi_x2},{roi_y2}). Skipping.")
-                        continue
-                    
-                    logger.info(f"Frame {i+1}: Forehead ROI x1:{roi_x1}, y1:{roi_y1}, x2:{roi_x2}, y2:{roi_y2}")
-
-                    forehead = image.crop((int(roi_x1), int(roi_y1), int(roi_x2), int(roi_y2)))
-                    
-                    if forehead.size[0] == 0 or forehead.size[1] == 0:
-                        logger.warning(f"Frame {i+1}: Cropped forehead empty. Image: {image.size}, Crop: ({roi_x1},{roi_y1},{roi_x2},{roi_y2}). Skipping.")
-                        continue
-
-                    forehead_array = np.array(forehead)
-                    if forehead_array.ndim < 3 or forehead_array.shape[2] < 2:
-                        logger.warning(f"Frame {i+1}: Forehead array shape {forehead_array.shape} unexpected. Skipping.")
-                        continue
-                    
-                    green_channel_intensity = forehead_array[..., 1]
-                    intensity_values.append(green_channel_intensity)
-                    processed_frame_count += 1
-                    logger.info(f"Frame {i+1}: Added green channel. Total valid intensities: {len(intensity_values)}")
-
-                except ValueError as ve:
-                    logger.warning(f"Frame {i+1}: ValueError in face analysis (no face?). Error: {ve}. Skipping.")
-                    continue
-                except Exception as face_error:
-                    logger.error(f"Frame {i+1}: Error in face/forehead processing. Error: {face_error}", exc_info=True)
-                    continue
-
-            except Exception as frame_error:
-                logger.error(f"Frame {i+1}: General error processing frame. Error: {frame_error}", exc_info=True)
+                with stage("stress_job"):
+                    intensities, localizer, gate = await stress_pool.run(extract_intensities, frames, frames_received + 1, localizer, gate)
+                observe_stages(localizer.timings.drain())
+            except StressPoolBusy as e:
+                await websocket.send_json({"type": "busy", "retry_after": e.retry_after, "dropped_frames": len(frames)})
+                continue
+            except asyncio.TimeoutError:
+                await websocket.send_json({"type": "error", "detail": "Frame processing timed out.", "dropped_frames": len(frames)})
                 continue
-        
-        MIN_VALID_FRAMES = 30 
-        if len(intensity_values) < MIN_VALID_FRAMES:
-            logger.error(f"Insufficient valid frames for analysis: {len(intensity_values)} collected, need {MIN_VALID_FRAMES}.")
-            return {"error": f"Insufficient valid frames ({len(intensity_values)} collected). Ensure clear, stable face view."}
-
-        logger.info(f"Proceeding to HeartMetricsCalculator with {len(intensity_values)} valid intensity frames.")
-        calculator = HeartMetricsCalculator(fps=10) # Assuming 10 FPS from frontend
-        avg_hr, sdnn, rmssd, bsi, lf_hf_ratio = calculator.estimate_heart_rate(intensity_values)
-        
-        logger.info(f"Analysis results: HR:{avg_hr}, SDNN:{sdnn}, RMSSD:{rmssd}, BSI:{bsi}, LF/HF:{lf_hf_ratio}")
-
-        return {
-            "avg_heart_rate": avg_hr if not np.isnan(avg_hr) else 0,
-            "sdnn": sdnn if not np.isnan(sdnn) else 0,
-            "rmssd": rmssd if not np.isnan(rmssd) else 0,
-            "bsi": bsi if not np.isnan(bsi) else 0,
-            "lf_hf_ratio": lf_hf_ratio if not np.isnan(lf_hf_ratio) else 0
-        }
+            frames_received += len(frames)
 
-    except HTTPException:
-        raise
+            for intensity in intensities:
+                if stream.push(intensity):
+                    await websocket.send_json(session_state("metrics"))
+
+    except WebSocketDisconnect:
+        logger.info(f"Stress stream disconnected after {frames_received} frames ({stream.frames} valid).")
+        await finish()
     except Exception as e:
-        logger.error(f"Overall stress analysis error: {str(e)}", exc_info=True)
-        return {"error": "Failed to process stress analysis due to an unexpected internal server error."}
\ No newline at end of file
+        logger.error(f"Stress stream error: {str(e)}", exc_info=True)
+        await websocket.close(code=1011)
@@ -0,0 +1,36 @@
+import logging
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Depends, Query
+
+from app.core.security import get_current_user
+from app.models.schemas import TokenData
+from app.services.stress_store import SCOPES, stress_store
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+# Reads the aggregates maintained by StressStore.record (one document per
+# session, UTC day or lecture video), never the raw samples. Separate from the
+# stress router so it runs in the api pool without the analysis dependencies.
+@router.get("/stress-trends", summary="Heart rate and LF/HF trends of the current user per session, day or lecture")
+async def stress_trends_endpoint(
+    scope: str = "day",
+    video_id: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    limit: int = Query(30, ge=1, le=365),
+    current_user: TokenData = Depends(get_current_user)
+):
+    if scope not in SCOPES:
+        raise HTTPException(status_code=400, detail=f"scope must be one of {', '.join(SCOPES)}.")
+    # Day aggregates span every lecture watched that day, so they carry no video_id.
+    if scope == "day" and video_id:
+        raise HTTPException(status_code=400, detail="video_id can't be combined with scope=day; use scope=lecture or scope=session.")
+    try:
+        aggregates = await stress_store.trends(current_user.user_id, scope, video_id, since, until, limit)
+    except Exception as e:
+        logger.error(f"Failed to read stress trends for user {current_user.user_id}: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Could not load stress trends.")
+    return {"scope": scope, "aggregates": aggregates}
@@ -5,10 +5,123 @@ load_dotenv()
 
 MONGO_URI = os.getenv("MONGO_URI")
 DB_NAME = os.getenv("DB_NAME")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 5000))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 10000))
 JWT_SECRET = os.getenv("JWT_SECRET") 
 ALGORITHM = "HS256" 
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24
 
 YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-PORT = int(os.getenv("PORT", 8000))
\ No newline at end of file
+PORT = int(os.getenv("PORT", 8000))
+
+STRESS_STREAM_BUFFER_SECONDS = int(os.getenv("STRESS_STREAM_BUFFER_SECONDS", 60))
+STRESS_MAX_UPLOAD_FRAMES = int(os.getenv("STRESS_MAX_UPLOAD_FRAMES", 1800)) # file parts per multipart upload; 60 s at 30 fps
+STRESS_MAX_UPLOAD_FIELDS = int(os.getenv("STRESS_MAX_UPLOAD_FIELDS", 16)) # non-file parts per multipart upload
+STRESS_FACE_MODE = os.getenv("STRESS_FACE_MODE", "detect") # "detect" skips the emotion model, "emotion" runs DeepFace.analyze
+STRESS_DETECT_INTERVAL = int(os.getenv("STRESS_DETECT_INTERVAL", 10))
+STRESS_TRACK_MIN_CONFIDENCE = float(os.getenv("STRESS_TRACK_MIN_CONFIDENCE", 0.6))
+STRESS_FRAME_LOG_SAMPLE = int(os.getenv("STRESS_FRAME_LOG_SAMPLE", 50)) # per-frame debug lines are logged for every Nth frame only
+
+STRESS_POOL_SIZE = int(os.getenv("STRESS_POOL_SIZE", 0)) # 0 = one worker per available core, minus one for the event loop
+STRESS_QUEUE_DEPTH = int(os.getenv("STRESS_QUEUE_DEPTH", 0)) # 0 = 2 jobs per worker
+STRESS_JOB_TIMEOUT = float(os.getenv("STRESS_JOB_TIMEOUT", 60))
+STRESS_RETRY_AFTER = int(os.getenv("STRESS_RETRY_AFTER", 5))
+STRESS_QUALITY_GATE = os.getenv("STRESS_QUALITY_GATE", "1").lower() in ("1", "true", "yes") # reject unusable frames before face detection
+STRESS_QUALITY_THUMB_WIDTH = int(os.getenv("STRESS_QUALITY_THUMB_WIDTH", 64)) # frames are scored on a grayscale thumbnail this wide
+STRESS_MIN_BRIGHTNESS = float(os.getenv("STRESS_MIN_BRIGHTNESS", 40)) # mean gray level, 0-255
+STRESS_MAX_BRIGHTNESS = float(os.getenv("STRESS_MAX_BRIGHTNESS", 220))
+STRESS_MIN_CONTRAST = float(os.getenv("STRESS_MIN_CONTRAST", 12)) # gray level standard deviation
+STRESS_MIN_SHARPNESS = float(os.getenv("STRESS_MIN_SHARPNESS", 10)) # variance of the thumbnail's Laplacian
+STRESS_DUPLICATE_MAX_DIFF = float(os.getenv("STRESS_DUPLICATE_MAX_DIFF", 0.2)) # mean abs change from the previous frame; at or below = duplicate
+STRESS_HISTORY = os.getenv("STRESS_HISTORY", "1").lower() in ("1", "true", "yes") # persist results of signed-in users for /stress-trends
+STRESS_SAMPLE_RETENTION_SECONDS = int(os.getenv("STRESS_SAMPLE_RETENTION_SECONDS", 60 * 60 * 24 * 365)) # raw samples; aggregates are kept
+STRESS_BATCHING = os.getenv("STRESS_BATCHING", "1").lower() in ("1", "true", "yes") # detect mode: batch face detection across sessions
+STRESS_BATCH_MAX_SIZE = int(os.getenv("STRESS_BATCH_MAX_SIZE", 16)) # frames per forward pass
+STRESS_BATCH_MAX_WAIT_MS = float(os.getenv("STRESS_BATCH_MAX_WAIT_MS", 5)) # longest a frame waits for its batch to fill
+STRESS_BATCH_MIN_CONFIDENCE = float(os.getenv("STRESS_BATCH_MIN_CONFIDENCE", 0.9)) # same cut-off as DeepFace's ssd backend
+STRESS_BATCH_RESULT_TIMEOUT_SECONDS = float(os.getenv("STRESS_BATCH_RESULT_TIMEOUT_SECONDS", 10)) # a worker waiting longer for a batch detects per frame from then on
+
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", 10))
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", 5))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20))
+YOUTUBE_MAX_ATTEMPTS = int(os.getenv("YOUTUBE_MAX_ATTEMPTS", 3))
+YOUTUBE_BACKOFF_BASE_SECONDS = float(os.getenv("YOUTUBE_BACKOFF_BASE_SECONDS", 0.5))
+
+LECTURE_CACHE_MAX_ENTRIES = int(os.getenv("LECTURE_CACHE_MAX_ENTRIES", 256))
+LECTURE_CACHE_FRESH_SECONDS = int(os.getenv("LECTURE_CACHE_FRESH_SECONDS", 60 * 60))
+LECTURE_CACHE_STALE_SECONDS = int(os.getenv("LECTURE_CACHE_STALE_SECONDS", 60 * 60 * 24 * 7))
+LECTURE_CACHE_REFRESH_LEASE_SECONDS = int(os.getenv("LECTURE_CACHE_REFRESH_LEASE_SECONDS", 120))
+
+QA_MAX_CONTEXT_TOKENS = int(os.getenv("QA_MAX_CONTEXT_TOKENS", 2000)) # transcript share of the Gemini prompt
+QA_TOP_K = int(os.getenv("QA_TOP_K", 6))
+QA_CHUNK_CHARS = int(os.getenv("QA_CHUNK_CHARS", 800))
+QA_INDEX_CACHE_ENTRIES = int(os.getenv("QA_INDEX_CACHE_ENTRIES", 64))
+QA_INDEX_CACHE_SECONDS = int(os.getenv("QA_INDEX_CACHE_SECONDS", 60 * 60))
+
+CONTENT_CACHE_MAX_ENTRIES = int(os.getenv("CONTENT_CACHE_MAX_ENTRIES", 128))
+TRANSCRIPT_CACHE_SECONDS = int(os.getenv("TRANSCRIPT_CACHE_SECONDS", 60 * 60 * 24 * 7))
+WIKIPEDIA_CACHE_SECONDS = int(os.getenv("WIKIPEDIA_CACHE_SECONDS", 60 * 60 * 24))
+CONTENT_NEGATIVE_CACHE_SECONDS = int(os.getenv("CONTENT_NEGATIVE_CACHE_SECONDS", 60 * 10)) # unavailable transcripts, missing/ambiguous pages
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", 8))
+GEMINI_FAKE = os.getenv("GEMINI_FAKE", "").lower() in ("1", "true", "yes") # local canned model, no API calls
+
+VIDEO_CATALOG_MAX_AGE_SECONDS = int(os.getenv("VIDEO_CATALOG_MAX_AGE_SECONDS", 60 * 60 * 24 * 7)) # older entries are re-fetched from YouTube
+
+AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", 0)) # 0 = one thread per available core (bcrypt releases the GIL)
+AUTH_HASH_QUEUE_DEPTH = int(os.getenv("AUTH_HASH_QUEUE_DEPTH", 0)) # 0 = 8 jobs per thread
+AUTH_HASH_TIMEOUT = float(os.getenv("AUTH_HASH_TIMEOUT", 10))
+AUTH_RETRY_AFTER = int(os.getenv("AUTH_RETRY_AFTER", 2))
+AUTH_CLAIMS_CACHE_ENTRIES = int(os.getenv("AUTH_CLAIMS_CACHE_ENTRIES", 1024))
+AUTH_CLAIMS_CACHE_SECONDS = int(os.getenv("AUTH_CLAIMS_CACHE_SECONDS", 300))
+
+# Upstream quota scheduling: whole-deployment quotas of the API keys; each
+# worker process gets an equal share (upstream_scheduler.share_budgets)
+YOUTUBE_DAILY_QUOTA = int(os.getenv("YOUTUBE_DAILY_QUOTA", 10000)) # units; search.list = 100, videos.list = 1
+YOUTUBE_QUOTA_BURST = int(os.getenv("YOUTUBE_QUOTA_BURST", 1000))
+GEMINI_REQUESTS_PER_MINUTE = int(os.getenv("GEMINI_REQUESTS_PER_MINUTE", 15))
+UPSTREAM_BUDGET_PROCESSES = int(os.getenv("UPSTREAM_BUDGET_PROCESSES", 0)) # processes sharing the API keys' quotas; 0 = the gunicorn pool's worker count
+UPSTREAM_MAX_WAIT_SECONDS = float(os.getenv("UPSTREAM_MAX_WAIT_SECONDS", 10)) # user-facing requests
+UPSTREAM_BACKGROUND_MAX_WAIT_SECONDS = float(os.getenv("UPSTREAM_BACKGROUND_MAX_WAIT_SECONDS", 120)) # cache refreshes
+UPSTREAM_BACKOFF_BASE_SECONDS = float(os.getenv("UPSTREAM_BACKOFF_BASE_SECONDS", 5))
+YOUTUBE_BACKOFF_MAX_SECONDS = float(os.getenv("YOUTUBE_BACKOFF_MAX_SECONDS", 60 * 60))
+GEMINI_BACKOFF_MAX_SECONDS = float(os.getenv("GEMINI_BACKOFF_MAX_SECONDS", 60))
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY") # unset = admin endpoints disabled
+
+# Startup (a replica only imports the routers it serves)
+ENABLED_ROUTERS = [r.strip() for r in os.getenv("ENABLED_ROUTERS", "auth,lectures,qa,stress,stress_trends,retell_call,admin").split(",") if r.strip()]
+STRESS_WARMUP = os.getenv("STRESS_WARMUP", "1").lower() in ("1", "true", "yes") # load DeepFace in the workers before /readyz passes
+STRESS_WARMUP_TIMEOUT = float(os.getenv("STRESS_WARMUP_TIMEOUT", 300))
+
+# Retell calls are placed from a job queue in Mongo, not inside the request
+RETELL_API_KEY = os.getenv("RETELL_API_KEY")
+RETELL_AGENT_ID = os.getenv("RETELL_AGENT_ID", "your_default_agent_id_here")
+RETELL_FROM_NUMBER = os.getenv("RETELL_FROM_NUMBER", "+916307942349")
+RETELL_FAKE = os.getenv("RETELL_FAKE", "").lower() in ("1", "true", "yes") # local fake client, no calls are placed
+RETELL_FAKE_LATENCY_SECONDS = float(os.getenv("RETELL_FAKE_LATENCY_SECONDS", 0.5))
+RETELL_FAKE_FAILURE_RATE = float(os.getenv("RETELL_FAKE_FAILURE_RATE", 0)) # share of fake calls failing with a retryable 503
+RETELL_DISPATCHERS = int(os.getenv("RETELL_DISPATCHERS", 2)) # concurrent calls per process; 0 = this process only enqueues
+RETELL_MAX_ATTEMPTS = int(os.getenv("RETELL_MAX_ATTEMPTS", 3))
+RETELL_BACKOFF_BASE_SECONDS = float(os.getenv("RETELL_BACKOFF_BASE_SECONDS", 2))
+RETELL_LEASE_SECONDS = int(os.getenv("RETELL_LEASE_SECONDS", 120)) # a dispatch still unfinished after this is marked failed
+RETELL_POLL_SECONDS = float(os.getenv("RETELL_POLL_SECONDS", 1))
+RETELL_DEDUPE_WINDOW_SECONDS = int(os.getenv("RETELL_DEDUPE_WINDOW_SECONDS", 60 * 5)) # identical requests without an Idempotency-Key
+RETELL_JOB_RETENTION_SECONDS = int(os.getenv("RETELL_JOB_RETENTION_SECONDS", 60 * 60 * 24 * 7))
+
+# Production server (gunicorn.conf.py / serve.py)
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", 0)) # 0 = one uvicorn worker per available core
+WEB_PRELOAD = os.getenv("WEB_PRELOAD", "1").lower() in ("1", "true", "yes") # import the app once in the master, before forking workers
+WEB_GRACEFUL_TIMEOUT = int(os.getenv("WEB_GRACEFUL_TIMEOUT", 30)) # seconds a stopping worker gets to finish in-flight requests
+WEB_TIMEOUT = int(os.getenv("WEB_TIMEOUT", 120))
+WEB_KEEPALIVE = int(os.getenv("WEB_KEEPALIVE", 5))
+WEB_MAX_REQUESTS = int(os.getenv("WEB_MAX_REQUESTS", 0)) # recycle a worker after this many requests; 0 = never
+STRESS_PORT = int(os.getenv("STRESS_PORT", 8001)) # serve.py runs the stress routes as a separate pool on this port
+STRESS_WEB_WORKERS = int(os.getenv("STRESS_WEB_WORKERS", 1)) # event loops in front of the stress process pool
+STRESS_START_METHOD = os.getenv("STRESS_START_METHOD", "spawn") # "forkserver" preloads the detector once and forks workers from it
+STRESS_WORKER_NICE = int(os.getenv("STRESS_WORKER_NICE", 5)) # stress workers yield the CPU to the API processes
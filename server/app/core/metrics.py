@@ -0,0 +1,131 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from fastapi import Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+from pymongo import monitoring
+
+# Prometheus metrics. With several server processes (gunicorn workers) set
+# PROMETHEUS_MULTIPROC_DIR so /metrics aggregates all of them. Stress worker
+# processes don't record directly: they collect StageTimings and the parent
+# observes them when the job returns.
+
+STAGE_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60)
+
+REQUEST_LATENCY = Histogram(
+    "intellectai_http_request_duration_seconds", "HTTP request latency by route template",
+    ["method", "route", "status"], buckets=STAGE_BUCKETS
+)
+STAGE_LATENCY = Histogram(
+    "intellectai_stage_duration_seconds", "Latency of internal and upstream stages",
+    ["stage"], buckets=STAGE_BUCKETS
+)
+STAGE_ERRORS = Counter("intellectai_stage_errors_total", "Stages that raised", ["stage"])
+STARTUP_SECONDS = Gauge(
+    "intellectai_startup_seconds", "Duration of each startup phase (import, init, warm-up)",
+    ["phase"], multiprocess_mode="max"
+)
+FIRST_REQUEST_SECONDS = Gauge(
+    "intellectai_first_request_duration_seconds", "Latency of the first request to each route since process start",
+    ["route"], multiprocess_mode="max"
+)
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.labels(name).inc()
+        raise
+    finally:
+        STAGE_LATENCY.labels(name).observe(time.perf_counter() - start)
+
+
+class StageTimings:
+    # Picklable collector of (stage, seconds) samples for code running where
+    # metrics can't be observed directly (the stress worker processes).
+
+    def __init__(self):
+        self.samples = []
+
+    @contextmanager
+    def time(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.append((name, time.perf_counter() - start))
+
+    def drain(self) -> list:
+        samples, self.samples = self.samples, []
+        return samples
+
+
+def observe_stages(samples):
+    for name, seconds in samples:
+        STAGE_LATENCY.labels(name).observe(seconds)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    # Registered on the motor client; times every command as mongo_<command>.
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        STAGE_LATENCY.labels(f"mongo_{event.command_name}").observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        STAGE_LATENCY.labels(f"mongo_{event.command_name}").observe(event.duration_micros / 1e6)
+        STAGE_ERRORS.labels(f"mongo_{event.command_name}").inc()
+
+
+class MetricsMiddleware:
+    # Plain ASGI middleware (no BaseHTTPMiddleware overhead). Labels requests
+    # by route template, not raw path, so ids in URLs don't explode the label
+    # set; the duration includes streamed response bodies.
+
+    def __init__(self, app):
+        self.app = app
+        self._seen_routes = set()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            elapsed = time.perf_counter() - start
+            REQUEST_LATENCY.labels(scope["method"], route, str(status)).observe(elapsed)
+            if route not in self._seen_routes:
+                # The first call pays lazy imports and cold caches; keep it
+                # visible instead of letting it vanish into the histogram.
+                self._seen_routes.add(route)
+                FIRST_REQUEST_SECONDS.labels(route).set(elapsed)
+                logger.info(f"First request to {route} took {elapsed:.3f}s.")
+
+
+def metrics_response() -> Response:
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
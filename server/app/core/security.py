@@ -1,9 +1,17 @@
 import logging
+import time
 from datetime import datetime, timedelta
-from jose import jwt 
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from jose import JWTError, jwt 
 from passlib.context import CryptContext
 
-from app.core.config import JWT_SECRET, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from app.core.config import (
+    JWT_SECRET, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES,
+    AUTH_CLAIMS_CACHE_ENTRIES, AUTH_CLAIMS_CACHE_SECONDS
+)
+from app.models.schemas import TokenData
+from app.utils.cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
@@ -24,3 +32,31 @@ def create_token(data: dict, expires_delta: timedelta = None) -> str:
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, JWT_SECRET, algorithm=ALGORITHM)
     return encoded_jwt
+
+# Decoded claims of recently seen tokens. An entry never outlives the token's
+# own exp, so caching cannot extend a token's validity.
+_claims_cache = TTLCache(AUTH_CLAIMS_CACHE_ENTRIES, AUTH_CLAIMS_CACHE_SECONDS)
+_bearer = HTTPBearer(auto_error=False)
+
+def decode_token(token: str) -> TokenData:
+    claims = _claims_cache.get(token)
+    if claims is None:
+        try:
+            payload = jwt.decode(token, JWT_SECRET, algorithms=[ALGORITHM])
+        except JWTError as e:
+            logger.info(f"Rejected token: {str(e)}")
+            raise HTTPException(status_code=401, detail="Invalid or expired token", headers={"WWW-Authenticate": "Bearer"})
+        claims = TokenData(user_id=payload.get("sub"), email=payload.get("email"))
+        if claims.user_id is None:
+            raise HTTPException(status_code=401, detail="Invalid or expired token", headers={"WWW-Authenticate": "Bearer"})
+        ttl = min(AUTH_CLAIMS_CACHE_SECONDS, payload["exp"] - time.time()) if "exp" in payload else AUTH_CLAIMS_CACHE_SECONDS
+        _claims_cache.set(token, claims, ttl_seconds=ttl)
+    return claims
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials | None = Depends(_bearer)) -> TokenData:
+    if credentials is None:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    return decode_token(credentials.credentials)
+
+async def get_optional_user(credentials: HTTPAuthorizationCredentials | None = Depends(_bearer)) -> TokenData | None:
+    return decode_token(credentials.credentials) if credentials else None
@@ -0,0 +1,41 @@
+import logging
+import time
+from contextlib import contextmanager
+
+from app.core.metrics import STARTUP_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class Startup:
+    # Startup bookkeeping behind /healthz and /readyz. A process is live as
+    # soon as it answers HTTP; it is ready once the warm-up phases finished,
+    # so the load balancer only routes traffic to warmed replicas.
+
+    def __init__(self):
+        self.phases = {}
+        self.errors = {}
+        self.ready = False
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.errors[name] = str(e)
+            raise
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float):
+        self.phases[name] = round(seconds, 3)
+        STARTUP_SECONDS.labels(name).set(seconds)
+        logger.info(f"Startup phase '{name}' took {seconds:.2f}s.")
+
+    def status(self) -> dict:
+        state = "ready" if self.ready else ("failed" if self.errors else "warming")
+        return {"status": state, "phases": self.phases, "errors": self.errors}
+
+
+startup = Startup()
@@ -0,0 +1,77 @@
+import argparse
+import asyncio
+import logging
+import bson
+from pymongo import UpdateOne
+
+from app.db.setup import LECTURES, VIDEOS, close_db, get_collection
+from app.services.video_catalog import UNVERIFIED, catalog_update, to_reference
+
+logger = logging.getLogger(__name__)
+
+# Moves embedded video metadata out of lecture documents into the shared
+# videos catalog, leaving ordered {"videoId", "status"} references behind.
+# Idempotent: only lectures whose videos still carry a title are touched.
+#
+#   python -m app.db.migrate_video_catalog [--dry-run] [--batch-size 200]
+
+LEGACY_QUERY = {"videos.title": {"$exists": True}}
+
+
+async def migrate(batch_size: int = 200, dry_run: bool = False) -> dict:
+    lectures = get_collection(LECTURES)
+    stats = {"lectures": 0, "videos": 0, "bytes_before": 0, "bytes_after": 0}
+    batch = []
+    async for doc in lectures.find(LEGACY_QUERY, {"videos": 1}, batch_size=batch_size):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            await _migrate_batch(batch, stats, dry_run)
+            batch = []
+    if batch:
+        await _migrate_batch(batch, stats, dry_run)
+    return stats
+
+
+async def _migrate_batch(docs: list[dict], stats: dict, dry_run: bool):
+    catalog, updates = {}, []
+    for doc in docs:
+        videos = [v for v in doc.get("videos", []) if v.get("videoId")]
+        references = [to_reference(v) for v in videos]
+        catalog.update({v["videoId"]: v for v in videos})
+        stats["lectures"] += 1
+        stats["videos"] += len(videos)
+        stats["bytes_before"] += len(bson.encode({"videos": doc.get("videos", [])}))
+        stats["bytes_after"] += len(bson.encode({"videos": references}))
+        updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"videos": references}}))
+    if dry_run:
+        return
+    # Catalog first, so a crash in between never leaves dangling references.
+    await get_collection(VIDEOS).bulk_write(
+        [catalog_update(video_id, video, UNVERIFIED, overwrite=False) for video_id, video in catalog.items()],
+        ordered=False
+    )
+    await get_collection(LECTURES).bulk_write(updates, ordered=False)
+    logger.info(f"Migrated {stats['lectures']} lectures so far.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move embedded lecture videos into the shared videos catalog.")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would change")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    async def run():
+        try:
+            return await migrate(args.batch_size, args.dry_run)
+        finally:
+            close_db()
+
+    stats = asyncio.run(run())
+    saved = stats["bytes_before"] - stats["bytes_after"]
+    print(f"{'Would migrate' if args.dry_run else 'Migrated'} {stats['lectures']} lectures ({stats['videos']} video entries); "
+          f"embedded video bytes {stats['bytes_before']} -> {stats['bytes_after']} ({saved} saved, catalog not counted).")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,104 @@
-from pymongo import MongoClient
-from app.core.config import MONGO_URI, DB_NAME
-client = MongoClient(MONGO_URI)
-db = client[DB_NAME]
+import logging
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import CollectionInvalid, ConnectionFailure
+from app.core.metrics import MongoCommandMetrics
+from app.core.config import (
+    MONGO_URI, DB_NAME, MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE,
+    MONGO_SERVER_SELECTION_TIMEOUT_MS, MONGO_CONNECT_TIMEOUT_MS, MONGO_SOCKET_TIMEOUT_MS,
+    RETELL_JOB_RETENTION_SECONDS, STRESS_SAMPLE_RETENTION_SECONDS
+)
 
-users_collection = db["users"]
-lectures_collection = db["lectures"]
\ No newline at end of file
+logger = logging.getLogger(__name__)
+
+USERS = "users"
+LECTURES = "lectures"
+LECTURE_CACHE = "lecture_cache"
+CONTENT_CACHE = "content_cache"
+VIDEOS = "videos"
+CALL_JOBS = "call_jobs"
+STRESS_SAMPLES = "stress_samples"
+STRESS_AGGREGATES = "stress_aggregates"
+
+# Created in the app lifespan (not at import) so it binds to the running
+# event loop and worker processes don't inherit a connected client.
+_client: AsyncIOMotorClient | None = None
+
+
+def init_db() -> AsyncIOMotorClient:
+    global _client
+    if _client is None:
+        _client = AsyncIOMotorClient(
+            MONGO_URI,
+            maxPoolSize=MONGO_MAX_POOL_SIZE,
+            minPoolSize=MONGO_MIN_POOL_SIZE,
+            serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+            socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+            event_listeners=[MongoCommandMetrics()]
+        )
+        logger.info("MongoDB client initialized.")
+    return _client
+
+
+def close_db():
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+
+def get_collection(name: str):
+    return (_client or init_db())[DB_NAME][name]
+
+
+async def ensure_indexes():
+    # Each step is attempted on its own, so one failure (e.g. existing
+    # duplicate emails, or a server without time-series support) doesn't
+    # leave the later indexes and collections missing. An unreachable server
+    # fails every step, so the rest are skipped instead of each waiting out
+    # the server selection timeout.
+    steps = [
+        ("users.email", lambda: get_collection(USERS).create_index("email", unique=True)),
+        ("users.username", lambda: get_collection(USERS).create_index("username", unique=True)),
+        ("lectures.user_id_created_at", lambda: get_collection(LECTURES).create_index(
+            [("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)])),
+        ("lecture_cache.expires_at", lambda: get_collection(LECTURE_CACHE).create_index("expires_at", expireAfterSeconds=0)),
+        ("content_cache.expires_at", lambda: get_collection(CONTENT_CACHE).create_index("expires_at", expireAfterSeconds=0)),
+        ("call_jobs.idempotency_key", lambda: get_collection(CALL_JOBS).create_index("idempotency_key", unique=True)),
+        ("call_jobs.status_next_attempt_at", lambda: get_collection(CALL_JOBS).create_index(
+            [("status", ASCENDING), ("next_attempt_at", ASCENDING)])),
+        ("call_jobs.created_at", lambda: get_collection(CALL_JOBS).create_index(
+            "created_at", expireAfterSeconds=RETELL_JOB_RETENTION_SECONDS)),
+        ("stress_aggregates.user_id_scope_start", lambda: get_collection(STRESS_AGGREGATES).create_index(
+            [("user_id", ASCENDING), ("scope", ASCENDING), ("start", DESCENDING)])),
+        ("stress_samples", lambda: _ensure_time_series(STRESS_SAMPLES, "ts", "meta", STRESS_SAMPLE_RETENTION_SECONDS)),
+    ]
+    failed = []
+    for n, (name, step) in enumerate(steps):
+        try:
+            await step()
+        except ConnectionFailure as e:
+            failed.extend(skipped for skipped, _ in steps[n:])
+            logger.warning(f"Could not create MongoDB indexes, the server is unreachable: {str(e)}")
+            break
+        except Exception as e:
+            failed.append(name)
+            logger.warning(f"Could not create MongoDB index or collection {name}: {str(e)}")
+    return failed
+
+
+async def _ensure_time_series(name: str, time_field: str, meta_field: str, expire_after_seconds: int):
+    # Time-series collections (MongoDB 5.0+) must be created explicitly; an
+    # insert into a missing one would create a plain collection instead.
+    db = get_collection(name).database
+    if name in await db.list_collection_names(filter={"name": name}):
+        return
+    try:
+        await db.create_collection(
+            name,
+            timeseries={"timeField": time_field, "metaField": meta_field, "granularity": "minutes"},
+            expireAfterSeconds=expire_after_seconds
+        )
+    except CollectionInvalid:
+        pass # another worker created it first
@@ -13,4 +13,9 @@ class UserLogin(BaseModel):
 
 class TokenData(BaseModel):
     user_id: Optional[str] = None 
-    email: Optional[str] = None
\ No newline at end of file
+    email: Optional[str] = None
+
+class LectureCreate(BaseModel):
+    topic: str
+    videos: list[dict]
+    user_id: Optional[str] = None # sent by older clients; the owner always comes from the token
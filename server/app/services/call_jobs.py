@@ -0,0 +1,268 @@
+import asyncio
+import functools
+import hashlib
+import json
+import logging
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.core.config import (
+    RETELL_AGENT_ID, RETELL_FROM_NUMBER, RETELL_DISPATCHERS, RETELL_MAX_ATTEMPTS,
+    RETELL_BACKOFF_BASE_SECONDS, RETELL_LEASE_SECONDS, RETELL_POLL_SECONDS, RETELL_DEDUPE_WINDOW_SECONDS
+)
+from app.core.metrics import stage
+from app.db.setup import CALL_JOBS, get_collection
+from app.services.retell import get_retell
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+DISPATCHING = "dispatching"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+def idempotency_keys(request: dict, client_key: str | None = None) -> list[str]:
+    # A client key is scoped to the callee. Without one, identical requests
+    # share a key per dedupe window; the previous window's key is returned
+    # too, so a double click across a window boundary is still caught.
+    if client_key:
+        return [f"client:{request['to_number']}:{client_key}"]
+    digest = hashlib.sha256(json.dumps(request, sort_keys=True).encode()).hexdigest()
+    window = int(time.time() // RETELL_DEDUPE_WINDOW_SECONDS)
+    return [f"auto:{digest}:{window}", f"auto:{digest}:{window - 1}"]
+
+
+def _released_key(job: dict) -> str:
+    # A failed job gives up its idempotency key (kept unique by the index) so
+    # the same call can be requested again right away.
+    return f"{job['idempotency_key']}:failed:{job['_id']}"
+
+
+def _is_retryable(error: Exception) -> bool:
+    # The SDK's errors carry the HTTP status; other 4xx (bad number, unknown
+    # agent) won't succeed on a retry.
+    status = getattr(error, "status_code", None)
+    return status is None or status >= 500 or status == 429
+
+
+def job_view(job: dict) -> dict:
+    view = {
+        "job_id": job["_id"],
+        "status": job["status"],
+        "attempts": job.get("attempts", 0),
+        "call_id": job.get("call_id"),
+        "call_status": job.get("call_status"),
+        "error": job.get("error"),
+        "created_at": job["created_at"].isoformat(),
+        "updated_at": job["updated_at"].isoformat(),
+    }
+    if job["status"] == QUEUED and job.get("attempts"):
+        view["next_attempt_at"] = job["next_attempt_at"].isoformat()
+    return view
+
+
+class CallJobQueue:
+    # Persistent queue of outbound Retell calls. The endpoint only inserts a
+    # job; dispatcher tasks in every server process claim due jobs with
+    # findOneAndUpdate, so each job is dispatched by exactly one of them and
+    # jobs queued before a restart are picked up afterwards. The blocking SDK
+    # runs on a dedicated thread pool of `dispatchers` threads, which is also
+    # the per-process limit on concurrent calls.
+    #
+    # Failed attempts are retried with full-jitter exponential backoff. A job
+    # whose lease ran out mid-dispatch (the process died) is failed rather
+    # than retried: the call may already have been placed.
+
+    def __init__(self, dispatchers=RETELL_DISPATCHERS, max_attempts=RETELL_MAX_ATTEMPTS, backoff_base=RETELL_BACKOFF_BASE_SECONDS,
+                 lease_seconds=RETELL_LEASE_SECONDS, poll_seconds=RETELL_POLL_SECONDS):
+        self.dispatchers = dispatchers
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self._executor = None
+        self._tasks = []
+        self._wakeup = None
+        self._stopping = False
+        self.counters = {"enqueued": 0, "deduplicated": 0, "dispatched": 0, "succeeded": 0,
+                         "retried": 0, "failed": 0, "lease_expired": 0}
+
+    @property
+    def collection(self):
+        return get_collection(CALL_JOBS)
+
+    async def stats(self) -> dict:
+        by_status = await self.collection.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]).to_list(length=None)
+        return {**self.counters, "dispatchers": len(self._tasks), "jobs": {s["_id"]: s["count"] for s in by_status}}
+
+    async def enqueue(self, request: dict, client_key: str | None = None, user_id: str | None = None) -> tuple[dict, bool]:
+        # Returns (job, created). created is False when the request matched an
+        # existing job that has not failed, in which case no new call is placed.
+        keys = idempotency_keys(request, client_key)
+        existing = await self.collection.find_one({"idempotency_key": {"$in": keys}, "status": {"$ne": FAILED}})
+        if existing:
+            self.counters["deduplicated"] += 1
+            return existing, False
+
+        now = datetime.utcnow()
+        job = {
+            "_id": uuid.uuid4().hex,
+            "idempotency_key": keys[0],
+            "user_id": user_id,
+            "request": request,
+            "status": QUEUED,
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now,
+            "updated_at": now
+        }
+        try:
+            await self.collection.insert_one(job)
+        except DuplicateKeyError:
+            # A concurrent duplicate won the insert.
+            self.counters["deduplicated"] += 1
+            return await self.collection.find_one({"idempotency_key": keys[0]}), False
+        self.counters["enqueued"] += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job, True
+
+    async def get(self, job_id: str) -> dict | None:
+        return await self.collection.find_one({"_id": job_id})
+
+    def start(self):
+        if self._tasks or self.dispatchers <= 0:
+            return
+        self._stopping = False
+        self._executor = ThreadPoolExecutor(max_workers=self.dispatchers, thread_name_prefix="retell")
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._dispatch_loop(n)) for n in range(self.dispatchers)]
+        logger.info(f"Retell call dispatcher started with {self.dispatchers} workers.")
+
+    async def shutdown(self, timeout=None):
+        # Stop claiming, give calls in flight `timeout` (default one lease) to
+        # finish, then cancel; unfinished jobs are failed once the lease expires.
+        if not self._tasks:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        _, pending = await asyncio.wait(self._tasks, timeout=timeout or self.lease_seconds)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self._tasks = []
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+
+    async def _dispatch_loop(self, n: int):
+        while not self._stopping:
+            try:
+                job = await self._claim()
+                if job is not None:
+                    await self._dispatch(job)
+                    continue
+                if n == 0:
+                    await self._expire_leases()
+            except Exception as e:
+                # Typically Mongo being unreachable; retried on the next poll.
+                logger.warning(f"Retell dispatcher {n} error: {str(e)}")
+            # Idle: wait for a local enqueue, or poll for jobs queued by other
+            # processes and for retries coming due.
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _claim(self) -> dict | None:
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {"status": QUEUED, "next_attempt_at": {"$lte": now}},
+            {"$set": {"status": DISPATCHING, "lease_until": now + timedelta(seconds=self.lease_seconds), "updated_at": now},
+             "$inc": {"attempts": 1}},
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _dispatch(self, job: dict):
+        request = job["request"]
+        client = get_retell()
+        if client is None:
+            await self._finish(job, FAILED, error="Retell is not configured.")
+            return
+
+        self.counters["dispatched"] += 1
+        create_call = functools.partial(
+            client.call.create_phone_call,
+            from_number=RETELL_FROM_NUMBER,
+            to_number=request["to_number"],
+            agent_id=RETELL_AGENT_ID,
+            retell_llm_dynamic_variables={
+                "text_to_explain_param": request["text_to_explain"],
+                "topic_param": request.get("topic"),
+                "video_id_param": request.get("video_id"),
+            }
+        )
+        try:
+            with stage("retell_create_call"):
+                response = await asyncio.get_running_loop().run_in_executor(self._executor, create_call)
+        except Exception as e:
+            await self._record_failure(job, e)
+            return
+
+        logger.info(f"Retell job {job['_id']} placed call {response.call_id} (status {response.status}).")
+        self.counters["succeeded"] += 1
+        await self._finish(job, SUCCEEDED, call_id=response.call_id, call_status=response.status)
+
+    async def _record_failure(self, job: dict, error: Exception):
+        if job["attempts"] < self.max_attempts and _is_retryable(error):
+            delay = random.uniform(0, self.backoff_base * 2 ** (job["attempts"] - 1))
+            logger.warning(f"Retell job {job['_id']} attempt {job['attempts']} failed: {str(error)}. Retrying in {delay:.2f}s.")
+            self.counters["retried"] += 1
+            now = datetime.utcnow()
+            await self.collection.update_one(
+                {"_id": job["_id"], "status": DISPATCHING},
+                {"$set": {"status": QUEUED, "error": str(error), "updated_at": now,
+                          "next_attempt_at": now + timedelta(seconds=delay)},
+                 "$unset": {"lease_until": ""}}
+            )
+            return
+        logger.error(f"Retell job {job['_id']} failed after {job['attempts']} attempt(s): {str(error)}")
+        self.counters["failed"] += 1
+        await self._finish(job, FAILED, error=str(error))
+
+    async def _finish(self, job: dict, status: str, **fields):
+        if status == FAILED:
+            fields["idempotency_key"] = _released_key(job)
+        await self.collection.update_one(
+            {"_id": job["_id"], "status": DISPATCHING},
+            {"$set": {"status": status, "updated_at": datetime.utcnow(), **fields}, "$unset": {"lease_until": ""}}
+        )
+
+    async def _expire_leases(self):
+        # One update per job, since each releases its own idempotency key;
+        # expired leases are rare (a process died mid-dispatch).
+        now = datetime.utcnow()
+        expired_filter = {"status": DISPATCHING, "lease_until": {"$lt": now}}
+        expired = await self.collection.find(expired_filter, {"idempotency_key": 1}).to_list(length=None)
+        count = 0
+        for job in expired:
+            result = await self.collection.update_one(
+                {"_id": job["_id"], **expired_filter},
+                {"$set": {"status": FAILED, "updated_at": now, "idempotency_key": _released_key(job),
+                          "error": "Dispatch did not finish; the call may or may not have been placed."},
+                 "$unset": {"lease_until": ""}}
+            )
+            count += result.modified_count
+        if count:
+            self.counters["lease_expired"] += count
+            logger.warning(f"Marked {count} Retell job(s) with expired leases as failed.")
+
+
+call_jobs = CallJobQueue()
@@ -0,0 +1,142 @@
+import json
+import logging
+import time
+import zlib
+from datetime import datetime
+from fastapi.concurrency import run_in_threadpool
+from wikipedia.exceptions import DisambiguationError, PageError
+from youtube_transcript_api import CouldNotRetrieveTranscript
+
+from app.core.config import (
+    CONTENT_CACHE_MAX_ENTRIES, TRANSCRIPT_CACHE_SECONDS,
+    WIKIPEDIA_CACHE_SECONDS, CONTENT_NEGATIVE_CACHE_SECONDS
+)
+from app.core.metrics import stage
+from app.db.setup import CONTENT_CACHE, get_collection
+from app.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+def _unpack(blob: bytes) -> dict:
+    return json.loads(zlib.decompress(blob))
+
+
+class ContentCache:
+    # Read-through cache for slow upstream content (transcripts, Wikipedia
+    # summaries). Records are zlib-compressed JSON both in the per-process LRU
+    # and in the shared Mongo collection, which expires them via a TTL index.
+    #
+    # Failures listed in negative_errors are cached too, for the shorter
+    # negative_ttl_seconds: freeze() turns the exception into a JSON-able dict
+    # and thaw() rebuilds an equivalent exception, which is raised on a hit so
+    # callers keep their existing except clauses. Other errors are not cached.
+
+    def __init__(self, name, collection_name, ttl_seconds, negative_ttl_seconds=CONTENT_NEGATIVE_CACHE_SECONDS,
+                 negative_errors=(), freeze=None, thaw=None, max_entries=CONTENT_CACHE_MAX_ENTRIES):
+        self.name = name
+        self.collection_name = collection_name
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.negative_errors = negative_errors
+        self.freeze = freeze
+        self.thaw = thaw
+        self._memory = TTLCache(max_entries, ttl_seconds)
+        self.counters = {"hits": 0, "negative_hits": 0, "misses": 0, "memory_hits": 0, "mongo_hits": 0,
+                         "load_errors": 0, "raw_bytes": 0, "stored_bytes": 0}
+
+    @property
+    def collection(self):
+        return get_collection(self.collection_name)
+
+    def stats(self) -> dict:
+        lookups = self.counters["hits"] + self.counters["negative_hits"] + self.counters["misses"]
+        return {
+            **self.counters,
+            "hit_rate": (self.counters["hits"] + self.counters["negative_hits"]) / lookups if lookups else 0.0,
+            "compression_ratio": self.counters["stored_bytes"] / self.counters["raw_bytes"] if self.counters["raw_bytes"] else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+    async def get_or_load(self, key: str, load):
+        # load is a blocking callable and runs in the threadpool on a miss.
+        record = await self._lookup(key)
+        if record is None:
+            self.counters["misses"] += 1
+            try:
+                with stage(f"{self.name}_fetch"):
+                    value = await run_in_threadpool(load, key)
+            except self.negative_errors as e:
+                await self._store(key, {"error": self.freeze(e)}, self.negative_ttl_seconds)
+                raise
+            except Exception:
+                self.counters["load_errors"] += 1
+                raise
+            await self._store(key, {"value": value}, self.ttl_seconds)
+            return value
+
+        if "error" in record:
+            self.counters["negative_hits"] += 1
+            raise self.thaw(key, record["error"])
+        self.counters["hits"] += 1
+        return record["value"]
+
+    async def _lookup(self, key):
+        blob = self._memory.get(key)
+        if blob is not None:
+            self.counters["memory_hits"] += 1
+            return _unpack(blob)
+        try:
+            doc = await self.collection.find_one({"_id": f"{self.name}:{key}"})
+        except Exception as e:
+            logger.warning(f"{self.name} cache lookup failed for '{key}': {str(e)}")
+            return None
+        # The TTL monitor only runs once a minute, so check expiry ourselves.
+        if not doc or doc["expires_at"] <= datetime.utcnow():
+            return None
+        self.counters["mongo_hits"] += 1
+        blob = bytes(doc["data"])
+        self._memory.set(key, blob, ttl_seconds=(doc["expires_at"] - datetime.utcnow()).total_seconds())
+        return _unpack(blob)
+
+    async def _store(self, key, record, ttl_seconds):
+        raw = json.dumps(record, separators=(",", ":")).encode()
+        blob = zlib.compress(raw, 6)
+        self.counters["raw_bytes"] += len(raw)
+        self.counters["stored_bytes"] += len(blob)
+        self._memory.set(key, blob, ttl_seconds=ttl_seconds)
+        try:
+            await self.collection.replace_one(
+                {"_id": f"{self.name}:{key}"},
+                {"cache": self.name, "data": blob, "negative": "error" in record,
+                 "expires_at": datetime.utcfromtimestamp(time.time() + ttl_seconds)},
+                upsert=True
+            )
+        except Exception as e:
+            logger.warning(f"{self.name} cache write failed for '{key}': {str(e)}")
+
+
+def _freeze_wikipedia_error(e):
+    if isinstance(e, DisambiguationError):
+        return {"type": "disambiguation", "title": e.title, "options": e.options}
+    return {"type": "page"}
+
+
+def _thaw_wikipedia_error(topic, error):
+    if error["type"] == "disambiguation":
+        return DisambiguationError(error["title"], error["options"])
+    return PageError(topic)
+
+
+transcript_cache = ContentCache(
+    "transcript", CONTENT_CACHE, TRANSCRIPT_CACHE_SECONDS,
+    negative_errors=(CouldNotRetrieveTranscript,),
+    freeze=lambda e: {"reason": str(e)},
+    thaw=lambda video_id, error: CouldNotRetrieveTranscript(video_id)
+)
+wikipedia_cache = ContentCache(
+    "wikipedia", CONTENT_CACHE, WIKIPEDIA_CACHE_SECONDS,
+    negative_errors=(PageError, DisambiguationError),
+    freeze=_freeze_wikipedia_error,
+    thaw=_thaw_wikipedia_error
+)
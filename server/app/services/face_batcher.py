@@ -0,0 +1,239 @@
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from multiprocessing.connection import Client, Listener, wait
+
+import cv2
+
+from app.core.config import (
+    STRESS_BATCH_MAX_SIZE, STRESS_BATCH_MAX_WAIT_MS, STRESS_BATCH_MIN_CONFIDENCE, STRESS_BATCH_RESULT_TIMEOUT_SECONDS,
+    STRESS_WORKER_NICE
+)
+
+logger = logging.getLogger(__name__)
+
+SSD_INPUT_SIZE = (300, 300)
+SSD_MEAN = (104.0, 177.0, 123.0) # BGR means the res10 SSD was trained with
+SSD_PROTOTXT = "deploy.prototxt"
+SSD_WEIGHTS = "res10_300x300_ssd_iter_140000.caffemodel"
+STATS_SAMPLES = 1000 # latency samples kept per batch size for percentiles
+CONNECT_TIMEOUT_SECONDS = 10
+
+
+def _weights_dir():
+    return os.path.join(os.getenv("DEEPFACE_HOME", os.path.expanduser("~")), ".deepface", "weights")
+
+
+def load_ssd():
+    # The res10 SSD that DeepFace's "ssd" backend uses; DeepFace downloads
+    # the weights on first use, so let it do that when they are missing.
+    prototxt, weights = (os.path.join(_weights_dir(), name) for name in (SSD_PROTOTXT, SSD_WEIGHTS))
+    if not (os.path.isfile(prototxt) and os.path.isfile(weights)):
+        from app.services.stress_pool import load_detector
+        load_detector()
+    return cv2.dnn.readNetFromCaffe(prototxt, weights)
+
+
+def prepare(image_array, channel_order="RGB"):
+    # Only the 300x300 network input crosses the process boundary.
+    image = cv2.resize(image_array, SSD_INPUT_SIZE, interpolation=cv2.INTER_AREA)
+    if channel_order == "RGB":
+        image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+    return image
+
+
+def detect_batch(net, images, min_confidence=STRESS_BATCH_MIN_CONFIDENCE):
+    # One forward pass for the whole batch. Returns, per image, the most
+    # confident face as normalized (x1, y1, x2, y2), or None.
+    blob = cv2.dnn.blobFromImages(images, 1.0, SSD_INPUT_SIZE, SSD_MEAN, swapRB=False, crop=False)
+    net.setInput(blob)
+    best = [None] * len(images)
+    # Rows are [image_id, label, confidence, x1, y1, x2, y2].
+    for image_id, _, confidence, x1, y1, x2, y2 in net.forward()[0, 0]:
+        i = int(image_id)
+        if 0 <= i < len(images) and confidence >= min_confidence and (best[i] is None or confidence > best[i][0]):
+            best[i] = (float(confidence), float(x1), float(y1), float(x2), float(y2))
+    return [b[1:] if b else None for b in best]
+
+
+class BatchStats:
+
+    def __init__(self):
+        self.batches = defaultdict(int)
+        self.inference = defaultdict(lambda: deque(maxlen=STATS_SAMPLES))
+        self.waits = defaultdict(lambda: deque(maxlen=STATS_SAMPLES))
+        self.inference_seconds = defaultdict(float)
+
+    def record(self, size, inference_seconds, waits):
+        self.batches[size] += 1
+        self.inference_seconds[size] += inference_seconds
+        self.inference[size].append(inference_seconds)
+        self.waits[size].extend(waits)
+
+    def snapshot(self) -> dict:
+        sizes = {}
+        for size in sorted(self.batches):
+            inference = sorted(self.inference[size])
+            waits = sorted(self.waits[size])
+            frames = self.batches[size] * size
+            sizes[str(size)] = {
+                "batches": self.batches[size],
+                "frames": frames,
+                "frames_per_second": round(frames / self.inference_seconds[size], 1) if self.inference_seconds[size] else None,
+                "inference_p50_ms": round(inference[len(inference) // 2] * 1000, 3),
+                "inference_p95_ms": round(inference[int(0.95 * (len(inference) - 1))] * 1000, 3),
+                "wait_p50_ms": round(waits[len(waits) // 2] * 1000, 3),
+                "wait_p95_ms": round(waits[int(0.95 * (len(waits) - 1))] * 1000, 3),
+            }
+        return sizes
+
+
+def serve(address, authkey, max_size=STRESS_BATCH_MAX_SIZE, max_wait_ms=STRESS_BATCH_MAX_WAIT_MS):
+    # Detector process of the stress pool. Every stress worker holds one
+    # connection and has at most one frame outstanding, so a batch is sent
+    # as soon as it is full, every worker is waiting, or the oldest frame
+    # has waited max_wait_ms; frames from all concurrent sessions share
+    # one forward pass.
+    logging.basicConfig(level=logging.INFO)
+    if STRESS_WORKER_NICE:
+        os.nice(STRESS_WORKER_NICE)
+    # Listen before loading the model: workers connect right away and their
+    # first frames wait here; if loading fails, the process exits, their
+    # connections close and they fall back to per-frame detection.
+    listener = Listener(address, authkey=authkey)
+    connections = []
+    lock = threading.Lock()
+
+    def accept():
+        while True:
+            try:
+                connection = listener.accept()
+            except Exception as e:
+                logger.warning(f"Face detection batcher rejected a connection: {str(e)}")
+                continue
+            with lock:
+                connections.append(connection)
+
+    threading.Thread(target=accept, daemon=True).start()
+    try:
+        net = load_ssd()
+    except Exception as e:
+        logger.error(f"Face detection batcher could not load the SSD model: {str(e)}", exc_info=True)
+        return
+    logger.info(f"Face detection batcher {os.getpid()} ready (max batch {max_size}, max wait {max_wait_ms}ms).")
+
+    max_wait = max_wait_ms / 1000
+    stats = BatchStats()
+    workers = set()
+    pending = [] # (connection, request id, image, received at)
+    while True:
+        with lock:
+            current = list(connections)
+        # Re-check the connection list at least every 50ms for new workers.
+        timeout = min(0.05, max(0.0, pending[0][3] + max_wait - time.monotonic())) if pending else 0.05
+        if not current:
+            time.sleep(timeout)
+            continue
+        for connection in wait(current, timeout=timeout):
+            try:
+                message = connection.recv()
+            except (EOFError, OSError):
+                with lock:
+                    connections.remove(connection)
+                workers.discard(connection)
+                pending = [p for p in pending if p[0] is not connection]
+                continue
+            if message[0] == "detect":
+                workers.add(connection)
+                pending.append((connection, message[1], message[2], time.monotonic()))
+            elif message[0] == "stats":
+                connection.send({"max_batch_size": max_size, "max_wait_ms": max_wait_ms,
+                                 "connected_workers": len(workers), "batch_sizes": stats.snapshot()})
+
+        while pending and (len(pending) >= min(max_size, len(workers)) or time.monotonic() - pending[0][3] >= max_wait):
+            batch, pending = pending[:max_size], pending[max_size:]
+            started = time.monotonic()
+            try:
+                regions = detect_batch(net, [p[2] for p in batch])
+            except Exception as e:
+                logger.error(f"Batched face detection failed for {len(batch)} frames: {str(e)}", exc_info=True)
+                regions = [None] * len(batch)
+            stats.record(len(batch), time.monotonic() - started, [started - p[3] for p in batch])
+            for (connection, request_id, _, _), region in zip(batch, regions):
+                try:
+                    connection.send(("result", request_id, region))
+                except (EOFError, OSError):
+                    pass # the worker is gone; its connection is dropped on the next recv
+
+
+class BatchedDetector:
+    # Worker side of the batcher: blocks until the batch holding its frame
+    # has run, then maps the region back to the frame's size. A batcher that
+    # is alive but stuck (or still loading its model) would hold the worker
+    # forever, so the wait is bounded by result_timeout; on expiry the
+    # connection is closed and TimeoutError (an OSError) is raised.
+
+    def __init__(self, address, authkey, result_timeout=STRESS_BATCH_RESULT_TIMEOUT_SECONDS):
+        self._connection = Client(address, authkey=authkey)
+        self._request_id = 0
+        self.result_timeout = result_timeout
+
+    def detect(self, image_array, channel_order="RGB"):
+        h, w = image_array.shape[:2]
+        self._request_id += 1
+        self._connection.send(("detect", self._request_id, prepare(image_array, channel_order)))
+        if not self._connection.poll(self.result_timeout):
+            # A late result must not be read as the answer to the next frame.
+            self.close()
+            raise TimeoutError(f"no result from the face detection batcher within {self.result_timeout}s")
+        _, _, region = self._connection.recv()
+        if region is None:
+            return None
+        x1, y1 = int(max(0.0, region[0]) * w), int(max(0.0, region[1]) * h)
+        x2, y2 = int(min(1.0, region[2]) * w), int(min(1.0, region[3]) * h)
+        return (x1, y1, x2 - x1, y2 - y1) if x2 > x1 and y2 > y1 else None
+
+    def close(self):
+        self._connection.close()
+
+
+_detector = None
+
+
+def connect(address, authkey, timeout=CONNECT_TIMEOUT_SECONDS):
+    # Called from the stress worker initializer; the batcher process may not
+    # be listening yet, so keep trying until `timeout`.
+    global _detector
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _detector = BatchedDetector(address, authkey)
+            return _detector
+        except (FileNotFoundError, ConnectionRefusedError):
+            if time.monotonic() >= deadline:
+                logger.error(f"Stress worker {os.getpid()} could not reach the face detection batcher; detecting per frame.")
+                return None
+            time.sleep(0.1)
+
+
+def batched_detector():
+    return _detector
+
+
+def disconnect():
+    # After a failed exchange the worker falls back to per-frame detection.
+    global _detector
+    if _detector is not None:
+        _detector.close()
+    _detector = None
+
+
+def fetch_stats(address, authkey, timeout=2.0) -> dict | None:
+    connection = Client(address, authkey=authkey)
+    try:
+        connection.send(("stats",))
+        return connection.recv() if connection.poll(timeout) else None
+    finally:
+        connection.close()
@@ -0,0 +1,178 @@
+import logging
+import cv2
+import numpy as np
+
+from app.core.config import STRESS_DETECT_INTERVAL, STRESS_TRACK_MIN_CONFIDENCE, STRESS_FACE_MODE, STRESS_FRAME_LOG_SAMPLE
+from app.core.metrics import StageTimings
+from app.services import face_batcher
+
+logger = logging.getLogger(__name__)
+
+FACE_MODES = ("detect", "emotion")
+TRACK_TEMPLATE_WIDTH = 48 # Face template is downscaled to this width before matching
+TRACK_SEARCH_MARGIN = 0.25 # Fraction of the box size searched around the last position
+
+
+def log_frame(frame_no) -> bool:
+    # Per-frame diagnostics are sampled so logging stays off the hot path.
+    return logger.isEnabledFor(logging.DEBUG) and (frame_no or 0) % STRESS_FRAME_LOG_SAMPLE == 0
+
+
+class FaceLocalizer:
+    # Runs the face detector on the first frame, every `detect_interval` frames
+    # and whenever template tracking confidence drops below `min_confidence`.
+    # In between, the last face box is carried forward by matching a small
+    # grayscale template of the face inside a window around its last position.
+
+    def __init__(self, mode=STRESS_FACE_MODE, detect_interval=STRESS_DETECT_INTERVAL, min_confidence=STRESS_TRACK_MIN_CONFIDENCE):
+        if mode not in FACE_MODES:
+            logger.warning(f"FaceLocalizer: Unknown mode '{mode}'. Falling back to 'detect'.")
+            mode = "detect"
+        self.mode = mode
+        self.detect_interval = max(1, int(detect_interval))
+        self.min_confidence = min_confidence
+
+        self._box = None
+        self._template = None
+        self._gray = None
+        self._scale = 1.0
+        self._since_detection = 0
+
+        self.frames = 0
+        self.detections = 0
+        self.tracked = 0
+        self.redetections = 0
+        self.misses = 0
+        self.timings = StageTimings()
+
+    def __getstate__(self):
+        # The grayscale scratch buffer is per-process; don't ship it between workers.
+        state = self.__dict__.copy()
+        state["_gray"] = None
+        return state
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "frames": self.frames,
+            "full_detections": self.detections,
+            "tracked_frames": self.tracked,
+            "low_confidence_redetections": self.redetections,
+            "frames_without_face": self.misses,
+        }
+
+    def locate(self, image_array, frame_no=None, channel_order="RGB"):
+        self.frames += 1
+        if self._gray is None or self._gray.shape != image_array.shape[:2]:
+            self._gray = np.empty(image_array.shape[:2], dtype=np.uint8)
+        code = cv2.COLOR_BGR2GRAY if channel_order == "BGR" else cv2.COLOR_RGB2GRAY
+        gray = cv2.cvtColor(image_array, code, dst=self._gray)
+
+        if self._box is not None and self._since_detection < self.detect_interval:
+            with self.timings.time("face_tracking"):
+                box, confidence = self._track(gray)
+            if box is not None and confidence >= self.min_confidence:
+                self._box = box
+                self._since_detection += 1
+                self.tracked += 1
+                return box
+            if log_frame(frame_no):
+                logger.debug(f"Frame {frame_no}: Tracking confidence {confidence:.2f} below {self.min_confidence}. Re-detecting.")
+            self.redetections += 1
+
+        with self.timings.time("face_detection"):
+            box = self._detect(image_array, frame_no, channel_order)
+        if box is None:
+            self.misses += 1
+            self._box = None
+            self._template = None
+            return None
+
+        self._box = box
+        self._since_detection = 1
+        self._set_template(gray, box)
+        return box
+
+    def _detect(self, image_array, frame_no, channel_order="RGB"):
+        self.detections += 1
+        detector = face_batcher.batched_detector() if self.mode == "detect" else None
+        if detector is not None:
+            try:
+                return detector.detect(image_array, channel_order)
+            except (EOFError, OSError) as e: # OSError includes the result TimeoutError
+                logger.warning(f"Face detection batcher unavailable ({str(e)}). Detecting per frame.")
+                face_batcher.disconnect()
+
+        # Imported here so the API process never loads TensorFlow; only the
+        # stress workers run detection.
+        from deepface import DeepFace
+
+        try:
+            if self.mode == "emotion":
+                results = DeepFace.analyze(
+                    img_path=image_array,
+                    actions=['emotion'],
+                    detector_backend='ssd',
+                    silent=True,
+                    enforce_detection=False
+                )
+                region = results[0].get('region') if results and isinstance(results, list) else None
+            else:
+                results = DeepFace.extract_faces(
+                    img_path=image_array,
+                    detector_backend='ssd',
+                    enforce_detection=False,
+                    align=False
+                )
+                if results and isinstance(results, list) and results[0].get('confidence', 0) <= 0:
+                    results = None
+                region = results[0].get('facial_area') if results else None
+        except ValueError as ve:
+            if log_frame(frame_no):
+                logger.debug(f"Frame {frame_no}: ValueError in face detection (no face?). Error: {ve}.")
+            return None
+
+        # Misses are counted in stats(); only a sample of them is logged.
+        if not region or not all(k in region for k in ['x', 'y', 'w', 'h']):
+            if log_frame(frame_no):
+                logger.debug(f"Frame {frame_no}: No face detected or region incomplete. Region: {region}")
+            return None
+        if len(results) > 1 and log_frame(frame_no):
+            logger.debug(f"Frame {frame_no}: Multiple faces ({len(results)}) detected. Using the first one.")
+
+        x, y, w, h = (int(region[k]) for k in ('x', 'y', 'w', 'h'))
+        if w <= 0 or h <= 0:
+            logger.warning(f"Frame {frame_no}: Invalid face region dimensions. w:{w}, h:{h}.")
+            return None
+        return x, y, w, h
+
+    def _set_template(self, gray, box):
+        x, y, w, h = box
+        face = gray[max(0, y):y + h, max(0, x):x + w]
+        if face.size == 0:
+            self._template = None
+            return
+        self._scale = min(1.0, TRACK_TEMPLATE_WIDTH / face.shape[1])
+        self._template = cv2.resize(face, None, fx=self._scale, fy=self._scale, interpolation=cv2.INTER_AREA)
+
+    def _track(self, gray):
+        if self._template is None:
+            return None, 0.0
+        x, y, w, h = self._box
+        margin_x, margin_y = int(w * TRACK_SEARCH_MARGIN), int(h * TRACK_SEARCH_MARGIN)
+        sx1, sy1 = max(0, x - margin_x), max(0, y - margin_y)
+        sx2, sy2 = min(gray.shape[1], x + w + margin_x), min(gray.shape[0], y + h + margin_y)
+
+        search = gray[sy1:sy2, sx1:sx2]
+        if search.size == 0:
+            return None, 0.0
+        search = cv2.resize(search, None, fx=self._scale, fy=self._scale, interpolation=cv2.INTER_AREA)
+        th, tw = self._template.shape
+        if search.shape[0] < th or search.shape[1] < tw:
+            return None, 0.0
+
+        scores = cv2.matchTemplate(search, self._template, cv2.TM_CCOEFF_NORMED)
+        _, confidence, _, (loc_x, loc_y) = cv2.minMaxLoc(scores)
+        if not np.isfinite(confidence):
+            return None, 0.0
+        return (sx1 + int(round(loc_x / self._scale)), sy1 + int(round(loc_y / self._scale)), w, h), confidence
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+
+from app.core.config import GEMINI_API_KEY, GEMINI_MODEL, GEMINI_MAX_CONCURRENCY, GEMINI_FAKE
+from app.core.metrics import stage
+from app.services.upstream_scheduler import gemini_scheduler
+
+logger = logging.getLogger(__name__)
+
+
+class _FakeResponse:
+    def __init__(self, chunks: list[str]):
+        self._chunks = chunks
+        self.text = "".join(chunks)
+
+    async def __aiter__(self):
+        for chunk in self._chunks:
+            await asyncio.sleep(0.01)
+            yield _FakeResponse([chunk])
+
+
+class FakeGenerativeModel:
+    # Stand-in for genai.GenerativeModel (GEMINI_FAKE=1): answers with a canned
+    # text derived from the prompt, streamed word by word, without any network.
+    def __init__(self, model_name: str = "fake"):
+        self.model_name = model_name
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        first_line = prompt.strip().splitlines()[0] if prompt.strip() else ""
+        words = f"Fake answer ({len(prompt)} prompt chars) to: {first_line}".split(" ")
+        return _FakeResponse([w + " " for w in words[:-1]] + words[-1:])
+
+
+class GeminiQuotaExceeded(Exception):
+    pass
+
+
+class GeminiClient:
+    # One model object per process, created in the app lifespan. The
+    # semaphore caps concurrent generations so a burst of questions queues
+    # here instead of piling up on the API quota. quota_errors are the SDK's
+    # quota exceptions; they are re-raised as GeminiQuotaExceeded so callers
+    # don't have to import the SDK.
+
+    def __init__(self, model, max_concurrency: int = GEMINI_MAX_CONCURRENCY, quota_errors: tuple = ()):
+        self.model = model
+        self.quota_errors = quota_errors
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def generate(self, prompt: str) -> str:
+        await gemini_scheduler.acquire()
+        async with self._semaphore:
+            try:
+                with stage("gemini_generate"):
+                    response = await self.model.generate_content_async(prompt)
+            except self.quota_errors as e:
+                gemini_scheduler.report_exhausted()
+                raise GeminiQuotaExceeded(str(e)) from e
+        gemini_scheduler.report_success()
+        return response.text
+
+    async def stream(self, prompt: str):
+        # Holds a concurrency slot until the stream is exhausted or closed.
+        await gemini_scheduler.acquire()
+        async with self._semaphore:
+            try:
+                with stage("gemini_first_chunk"):
+                    response = await self.model.generate_content_async(prompt, stream=True)
+                async for chunk in response:
+                    if chunk.text:
+                        yield chunk.text
+            except self.quota_errors as e:
+                gemini_scheduler.report_exhausted()
+                raise GeminiQuotaExceeded(str(e)) from e
+        gemini_scheduler.report_success()
+
+
+_client: GeminiClient | None = None
+
+
+def init_gemini() -> GeminiClient | None:
+    global _client
+    if _client is None:
+        if GEMINI_FAKE:
+            _client = GeminiClient(FakeGenerativeModel())
+            logger.info("Using the fake Gemini model.")
+        elif GEMINI_API_KEY:
+            # The SDK (and grpc under it) is only imported once a client is needed.
+            import google.generativeai as genai
+            from google.api_core.exceptions import ResourceExhausted
+
+            genai.configure(api_key=GEMINI_API_KEY)
+            _client = GeminiClient(genai.GenerativeModel(GEMINI_MODEL), quota_errors=(ResourceExhausted,))
+            logger.info(f"Gemini client initialized for {GEMINI_MODEL}.")
+    return _client
+
+
+def get_gemini() -> GeminiClient | None:
+    return _client or init_gemini()
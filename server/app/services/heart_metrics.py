@@ -1,10 +1,29 @@
 import logging
+from collections import deque
+from functools import lru_cache
 import numpy as np
-from scipy.signal import find_peaks, detrend, butter, filtfilt
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import find_peaks, detrend, butter, sosfiltfilt, sosfilt, sosfilt_zi
 from scipy.fftpack import fft, fftfreq
 
 logger = logging.getLogger(__name__)
 
+
+@lru_cache(maxsize=64)
+def bandpass_sos(fs, lowcut, highcut, order=5):
+    # Butterworth design is cached per (fs, band, order) and kept in
+    # second-order sections, which stay stable at low fs / high order where
+    # the (b, a) polynomial form loses precision. Returns None for invalid bands.
+    # Callers share the returned array and must not modify it.
+    nyquist = 0.5 * fs
+    low = lowcut / nyquist
+    high = highcut / nyquist
+    if low >= high or low <= 0 or high >= 1:
+        logger.warning(f"Bandpass filter: Invalid cutoffs {lowcut, highcut} for fs {fs}. Low: {low}, High: {high}")
+        return None
+    return butter(order, [low, high], btype='band', output='sos')
+
+
 class HeartMetricsCalculator:
 
     def __init__(self, fps=30, window_length_multiplier=2, step_size_multiplier=1):
@@ -18,20 +37,22 @@ class HeartMetricsCalculator:
         if self.window_length <=0 : self.window_length = self.fps * 2 
         if self.step_size <=0: self.step_size = self.fps 
 
+    def incremental(self, buffer_seconds=60):
+        return IncrementalHeartMetrics(self, buffer_seconds=buffer_seconds)
 
     @staticmethod
     def bandpass_filter(data, lowcut, highcut, fs, order=5):
         if fs <= 0: 
             logger.error("Bandpass filter: fs must be positive.")
             return data
-        nyquist = 0.5 * fs
-        low = lowcut / nyquist
-        high = highcut / nyquist
-        if low >= high or low <= 0 or high >= 1: 
-            logger.warning(f"Bandpass filter: Invalid cutoffs {lowcut, highcut} for fs {fs}. Low: {low}, High: {high}")
+        sos = bandpass_sos(fs, lowcut, highcut, order)
+        if sos is None:
             return data 
-        b, a = butter(order, [low, high], btype='band')
-        return filtfilt(b, a, data)
+        # Same edge padding as filtfilt, but clamped so that short captures
+        # (e.g. the 30-frame minimum) are filtered instead of raising.
+        ntaps = 2 * len(sos) + 1 - min((sos[:, 2] == 0).sum(), (sos[:, 5] == 0).sum())
+        padlen = min(3 * ntaps, np.shape(data)[-1] - 1)
+        return sosfiltfilt(sos, data, axis=-1, padlen=padlen)
 
     @staticmethod
     def calculate_heart_rate(peaks, fs):
@@ -43,8 +64,10 @@ class HeartMetricsCalculator:
 
     @staticmethod
     def moving_average(data, window_size):
-        if window_size <= 0 or window_size > len(data): return data 
-        return np.convolve(data, np.ones(window_size)/window_size, mode='valid')
+        if window_size <= 0 or window_size > np.shape(data)[-1]: return data 
+        if np.ndim(data) == 1:
+            return np.convolve(data, np.ones(window_size)/window_size, mode='valid')
+        return sliding_window_view(data, window_size, axis=-1) @ (np.ones(window_size)/window_size)
 
     @staticmethod
     def compute_IBI(peaks, fs):
@@ -52,46 +75,106 @@ class HeartMetricsCalculator:
         return np.diff(peaks) / fs
 
     def estimate_heart_rate(self, roi_frames):
-        heart_rates_list = [] 
         if len(roi_frames) <= 2: 
             logger.warning(f"HeartMetricsCalculator: Insufficient roi_frames ({len(roi_frames)}), need > 2.")
             return 0, 0, 0, 0, 0
 
         intensity_over_time = [np.mean(frame) for frame in roi_frames if frame.size > 0] # Ensure frames are not empty
+        return self.estimate_heart_rate_from_intensities(intensity_over_time)
+
+    def estimate_heart_rate_from_intensities(self, intensity_over_time):
         if len(intensity_over_time) <= 2: 
             logger.warning(f"HeartMetricsCalculator: Insufficient intensity_over_time ({len(intensity_over_time)}), need > 2 for detrend.")
             return 0,0,0,0,0
 
         detrended_intensity = detrend(intensity_over_time)
-        
         filtered_signal = self.bandpass_filter(detrended_intensity, 0.5, 3, self.fps)
+        return self._metrics_from_filtered(filtered_signal, self._smooth(filtered_signal))
+
+    def estimate_heart_rate_batch(self, intensities):
+        # Metrics for many sessions at once: `intensities` is a 2-D array with
+        # one equal-length intensity trace per row. Detrending, filtering and
+        # smoothing run over the whole matrix; returns an (n_sessions, 5) array
+        # of (avg_hr, sdnn, rmssd, bsi, lf_hf_ratio) rows.
+        intensities = np.asarray(intensities, dtype=float)
+        if intensities.ndim != 2:
+            raise ValueError(f"Expected a 2-D array of intensity traces, got shape {intensities.shape}.")
+        results = np.zeros((intensities.shape[0], 5))
+        if intensities.shape[1] <= 2:
+            logger.warning(f"HeartMetricsCalculator: Insufficient intensity_over_time ({intensities.shape[1]}), need > 2 for detrend.")
+            return results
 
+        filtered = self.bandpass_filter(detrend(intensities, axis=-1), 0.5, 3, self.fps)
+        smoothed = self._smooth(filtered)
+        for row in range(intensities.shape[0]):
+            results[row] = self._metrics_from_filtered(filtered[row], smoothed[row])
+        return results
+
+    def _smooth(self, filtered_signal):
         ma_window_size = max(1, int(self.fps / 3.0))
-        if len(filtered_signal) < ma_window_size: 
-            logger.warning(f"HeartMetricsCalculator: Filtered signal length ({len(filtered_signal)}) is less than MA window size ({ma_window_size}). Using original filtered signal for smoothing.")
-            smoothed_signal = filtered_signal
-        else:
-            smoothed_signal = self.moving_average(filtered_signal, ma_window_size)
+        if filtered_signal.shape[-1] < ma_window_size: 
+            logger.warning(f"HeartMetricsCalculator: Filtered signal length ({filtered_signal.shape[-1]}) is less than MA window size ({ma_window_size}). Using original filtered signal for smoothing.")
+            return filtered_signal
+        return self.moving_average(filtered_signal, ma_window_size)
 
-        if len(smoothed_signal) < self.window_length:
-            logger.warning(f"HeartMetricsCalculator: Smoothed signal length ({len(smoothed_signal)}) is less than window_length ({self.window_length}). HR might be 0.")
+    def _window_heart_rates(self, smoothed_signal):
+        # Per-window HR of the sliding (window_length, step_size) windows in one
+        # pass: local maxima are found once over the whole signal, assigned to
+        # the windows whose interior contains them and thresholded against each
+        # window's 0.6 * max. Windows where find_peaks' distance rule or a
+        # plateau could change the result fall back to the per-window search.
+        n = len(smoothed_signal)
+        if n < self.window_length:
+            return np.array([])
+        distance = max(1, int(self.fps/3.0))
+        starts = np.arange(0, n - self.window_length + 1, self.step_size)
+        windows = sliding_window_view(smoothed_signal, self.window_length)[starts]
+        window_max = windows.max(axis=1)
+        window_min = windows.min(axis=1)
+        active = ~((window_max == window_min) & (window_max == 0))
+        threshold = np.where(window_max == window_min, -np.inf, window_max * 0.6)
+
+        candidates, _ = find_peaks(smoothed_signal)
+        plateau = np.zeros(len(candidates), dtype=bool)
+        if len(candidates):
+            values = smoothed_signal[candidates]
+            plateau = (smoothed_signal[candidates - 1] == values) | (smoothed_signal[candidates + 1] == values)
 
-        for start in range(0, len(smoothed_signal) - self.window_length + 1, self.step_size):
-            segment = smoothed_signal[start:start+self.window_length] 
-            if len(segment) == 0: continue
-            
-            if np.max(segment) == np.min(segment) and np.max(segment) == 0 : continue 
-            if np.max(segment) == np.min(segment) and np.max(segment) != 0 : 
-                 peaks, _ = find_peaks(segment, distance=max(1, int(self.fps/3.0))) 
+        lo = np.searchsorted(candidates, starts, side='right')
+        hi = np.searchsorted(candidates, starts + self.window_length - 1, side='left')
+        counts = np.maximum(hi - lo, 0)
+        rows = np.repeat(np.arange(len(starts)), counts)
+        cols = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(lo, counts)
+
+        fallback = np.zeros(len(starts), dtype=bool)
+        fallback[rows[plateau[cols]]] = True
+
+        keep = (smoothed_signal[candidates[cols]] >= threshold[rows]) & active[rows]
+        rows, peaks = rows[keep], candidates[cols[keep]]
+        same_window = rows[1:] == rows[:-1]
+        gaps = np.diff(peaks)[same_window]
+        gap_rows = rows[1:][same_window]
+        fallback[gap_rows[gaps < distance]] = True
+
+        rate_sum = np.bincount(gap_rows, weights=60 / (gaps / self.fps), minlength=len(starts))
+        rate_count = np.bincount(gap_rows, minlength=len(starts))
+        heart_rates = np.divide(rate_sum, rate_count, out=np.zeros(len(starts)), where=rate_count > 0)
+
+        for row in np.flatnonzero(fallback & active):
+            segment = windows[row]
+            if window_max[row] == window_min[row]:
+                segment_peaks, _ = find_peaks(segment, distance=distance)
             else:
-                 peaks, _ = find_peaks(segment, distance=max(1, int(self.fps/3.0)), height=np.max(segment)*0.6)
+                segment_peaks, _ = find_peaks(segment, distance=distance, height=window_max[row]*0.6)
+            heart_rates[row] = self.calculate_heart_rate(segment_peaks, self.fps) if len(segment_peaks) > 1 else 0
 
+        return heart_rates[heart_rates > 0]
 
-            if len(peaks) > 1:
-                heart_rate = self.calculate_heart_rate(peaks, self.fps)
-                if heart_rate > 0: 
-                    heart_rates_list.append(heart_rate)
+    def _metrics_from_filtered(self, filtered_signal, smoothed_signal):
+        if len(smoothed_signal) < self.window_length:
+            logger.warning(f"HeartMetricsCalculator: Smoothed signal length ({len(smoothed_signal)}) is less than window_length ({self.window_length}). HR might be 0.")
 
+        heart_rates_list = self._window_heart_rates(smoothed_signal).tolist()
         avg_heart_rate = sum(heart_rates_list) / len(heart_rates_list) if heart_rates_list else 0
         
         all_peaks_height = np.max(filtered_signal) * 0.6 if np.max(filtered_signal) > 0 else 0
@@ -106,6 +189,11 @@ class HeartMetricsCalculator:
             logger.warning("HeartMetricsCalculator: IBI calculation resulted in an empty array. HRV metrics will be 0.")
             return avg_heart_rate, 0, 0, 0, 0
 
+        sdnn, rmssd, bsi, lf_hf_ratio = self.compute_hrv(ibi)
+        return avg_heart_rate, sdnn, rmssd, bsi, lf_hf_ratio
+
+    @staticmethod
+    def compute_hrv(ibi):
         sdnn = np.std(ibi) if len(ibi) > 0 else 0
         rmssd = np.sqrt(np.mean(np.square(np.diff(ibi)))) if len(ibi) > 1 else 0
         bsi = (1 / rmssd) if rmssd > 0 else 0 # BSI calculation
@@ -132,4 +220,119 @@ class HeartMetricsCalculator:
                 
                 lf_hf_ratio = (lf_power / hf_power) if hf_power > 0 else 0
 
-        return avg_heart_rate, sdnn, rmssd, bsi, lf_hf_ratio
+        return sdnn, rmssd, bsi, lf_hf_ratio
+
+
+class IncrementalHeartMetrics:
+    # Streaming counterpart of HeartMetricsCalculator.estimate_heart_rate. Each
+    # pushed intensity is filtered causally (SOS state carried between calls, so
+    # the DC level is absorbed instead of re-detrending the history), smoothed
+    # with a running moving average and checked once for a local maximum. HR/HRV
+    # are then derived from the peak positions of the last buffer_seconds; the
+    # raw intensities themselves are not kept.
+
+    def __init__(self, calculator, buffer_seconds=60, lowcut=0.5, highcut=3, order=5):
+        self.fps = calculator.fps
+        self.window_length = calculator.window_length
+        self.step_size = calculator.step_size
+        self.capacity = max(self.window_length, int(self.fps * buffer_seconds))
+        self.frames = 0
+
+        self._sos = bandpass_sos(self.fps, lowcut, highcut, order)
+        self._zi = None
+
+        self._ma_window_size = max(1, int(self.fps / 3.0))
+        self._ma_values = deque(maxlen=self._ma_window_size)
+        self._ma_sum = 0.0
+
+        self._peak_distance = max(1, int(self.fps / 3.0))
+        # Smoothed samples as (index, value); also a monotonic deque for the
+        # sliding max used by the 0.6 * max height threshold.
+        self._recent = deque(maxlen=3)
+        self._window_max = deque()
+        self._peaks = deque()
+        self._n_smoothed = 0
+
+        self._window_hr_sum = 0.0
+        self._window_hr_count = 0
+
+    def push(self, value):
+        self.frames += 1
+        if self._sos is None:
+            filtered = value
+        else:
+            if self._zi is None:
+                self._zi = sosfilt_zi(self._sos) * value
+            out, self._zi = sosfilt(self._sos, [value], zi=self._zi)
+            filtered = out[0]
+
+        if len(self._ma_values) == self._ma_window_size:
+            self._ma_sum -= self._ma_values[0]
+        self._ma_values.append(filtered)
+        self._ma_sum += filtered
+        if len(self._ma_values) == self._ma_window_size:
+            self._push_smoothed(self._ma_sum / self._ma_window_size)
+
+        if self.frames >= self.window_length and (self.frames - self.window_length) % self.step_size == 0:
+            self._record_window_hr()
+            return True
+        return False
+
+    def _push_smoothed(self, value):
+        index = self._n_smoothed
+        self._n_smoothed += 1
+
+        while self._window_max and self._window_max[-1][1] <= value:
+            self._window_max.pop()
+        self._window_max.append((index, value))
+        while self._window_max[0][0] <= index - self.window_length:
+            self._window_max.popleft()
+
+        self._recent.append((index, value))
+        if len(self._recent) == 3:
+            (_, left), (mid_index, mid), (_, right) = self._recent
+            if left < mid >= right:
+                self._add_peak(mid_index, mid)
+
+        oldest = self._n_smoothed - self.capacity
+        while self._peaks and self._peaks[0][0] < oldest:
+            self._peaks.popleft()
+
+    def _add_peak(self, index, value):
+        window_max = self._window_max[0][1]
+        if window_max > 0 and value < window_max * 0.6:
+            return
+        if self._peaks and index - self._peaks[-1][0] < self._peak_distance:
+            if value > self._peaks[-1][1]:
+                self._peaks[-1] = (index, value)
+            return
+        self._peaks.append((index, value))
+
+    def _window_peaks(self):
+        start = self._n_smoothed - self.window_length
+        return [index for index, _ in self._peaks if index >= start]
+
+    def _record_window_hr(self):
+        heart_rate = HeartMetricsCalculator.calculate_heart_rate(self._window_peaks(), self.fps)
+        if heart_rate > 0:
+            self._window_hr_sum += heart_rate
+            self._window_hr_count += 1
+
+    def metrics(self):
+        current_hr = HeartMetricsCalculator.calculate_heart_rate(self._window_peaks(), self.fps)
+        avg_heart_rate = self._window_hr_sum / self._window_hr_count if self._window_hr_count else 0
+
+        ibi = HeartMetricsCalculator.compute_IBI([index for index, _ in self._peaks], self.fps)
+        if len(ibi) == 0:
+            sdnn = rmssd = bsi = lf_hf_ratio = 0
+        else:
+            sdnn, rmssd, bsi, lf_hf_ratio = HeartMetricsCalculator.compute_hrv(ibi)
+
+        return {
+            "heart_rate": float(current_hr),
+            "avg_heart_rate": float(avg_heart_rate),
+            "sdnn": float(sdnn),
+            "rmssd": float(rmssd),
+            "bsi": float(bsi),
+            "lf_hf_ratio": float(lf_hf_ratio),
+        }
@@ -0,0 +1,38 @@
+import logging
+import httpx
+
+from app.core.config import (
+    HTTP_TIMEOUT_SECONDS, HTTP_CONNECT_TIMEOUT_SECONDS,
+    HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE_CONNECTIONS
+)
+
+logger = logging.getLogger(__name__)
+
+# One pooled client per process, opened in the app lifespan, so upstream calls
+# reuse keep-alive connections instead of a fresh TCP/TLS handshake each time.
+_client: httpx.AsyncClient | None = None
+
+
+def init_http_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(HTTP_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS
+            )
+        )
+        logger.info("Shared HTTP client initialized.")
+    return _client
+
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    return _client or init_http_client()
@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.config import AUTH_HASH_WORKERS, AUTH_HASH_QUEUE_DEPTH, AUTH_HASH_TIMEOUT, AUTH_RETRY_AFTER
+from app.core.security import hash_password, verify_password
+from app.utils.cpu import default_pool_size
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordHasherBusy(Exception):
+
+    def __init__(self, retry_after):
+        super().__init__(f"Password hashing queue is full. Retry after {retry_after}s.")
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    # bcrypt takes ~100+ ms per call, so it runs on a small dedicated thread
+    # pool (bcrypt releases the GIL) instead of the event loop or the shared
+    # default executor. Like the stress pool, at most `queue_depth` jobs may
+    # be running or waiting; beyond that callers get PasswordHasherBusy and
+    # the endpoint answers 503 + Retry-After.
+
+    def __init__(self, workers=AUTH_HASH_WORKERS, queue_depth=AUTH_HASH_QUEUE_DEPTH, timeout=AUTH_HASH_TIMEOUT, retry_after=AUTH_RETRY_AFTER):
+        self.workers = workers if workers > 0 else default_pool_size()
+        self.queue_depth = queue_depth if queue_depth > 0 else 8 * self.workers
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+            logger.info(f"Password hasher started with {self.workers} threads, queue depth {self.queue_depth}.")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _job_done(self, _future):
+        with self._lock:
+            self._pending -= 1
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.queue_depth:
+                raise PasswordHasherBusy(self.retry_after)
+            self._pending += 1
+
+        try:
+            self.start()
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._job_done(None)
+            raise
+        future.add_done_callback(self._job_done)
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            raise
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    async def verify(self, plain: str, hashed: str) -> bool:
+        return await self._run(verify_password, plain, hashed)
+
+
+password_hasher = PasswordHasher()
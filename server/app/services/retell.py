@@ -0,0 +1,64 @@
+import logging
+import random
+import time
+import uuid
+
+from app.core.config import RETELL_API_KEY, RETELL_FAKE, RETELL_FAKE_LATENCY_SECONDS, RETELL_FAKE_FAILURE_RATE
+
+logger = logging.getLogger(__name__)
+
+
+class FakeRetellError(Exception):
+
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class _FakeCallResponse:
+    def __init__(self, call_id: str, status: str):
+        self.call_id = call_id
+        self.status = status
+
+
+class _FakeCalls:
+    def __init__(self):
+        self.placed = []
+
+    def create_phone_call(self, from_number, to_number, agent_id, retell_llm_dynamic_variables=None):
+        # Blocking like the real SDK, so it exercises the dispatcher threads.
+        time.sleep(RETELL_FAKE_LATENCY_SECONDS)
+        if random.random() < RETELL_FAKE_FAILURE_RATE:
+            raise FakeRetellError(503, "Fake Retell service unavailable")
+        response = _FakeCallResponse(f"fake_{uuid.uuid4().hex}", "registered")
+        self.placed.append({"call_id": response.call_id, "to_number": to_number, "agent_id": agent_id})
+        return response
+
+
+class FakeRetellClient:
+    # Stand-in for RetellSDK (RETELL_FAKE=1): accepts calls after
+    # RETELL_FAKE_LATENCY_SECONDS, fails RETELL_FAKE_FAILURE_RATE of them, and
+    # records the calls it "placed" in call.placed.
+    def __init__(self):
+        self.call = _FakeCalls()
+
+
+_client = None
+
+
+def init_retell():
+    global _client
+    if _client is None:
+        if RETELL_FAKE:
+            _client = FakeRetellClient()
+            logger.info("Using the fake Retell client.")
+        elif RETELL_API_KEY:
+            from retell_ai_python_sdk.retell_sdk import RetellSDK
+
+            _client = RetellSDK(api_key=RETELL_API_KEY)
+            logger.info("Retell SDK initialized successfully.")
+    return _client
+
+
+def get_retell():
+    return _client or init_retell()
@@ -0,0 +1,223 @@
+import logging
+import base64
+import struct
+from io import BytesIO
+import cv2
+from PIL import Image
+import numpy as np
+
+from app.services.face_tracking import FaceLocalizer, log_frame
+from app.services.frame_quality import FrameQualityGate
+from app.services.heart_metrics import HeartMetricsCalculator
+
+logger = logging.getLogger(__name__)
+
+MIN_VALID_FRAMES = 30
+BINARY_ENCODINGS = ("jpeg", "raw")
+_LENGTH_PREFIX = struct.Struct(">I")
+
+# Everything in this module runs inside the stress worker processes, so the
+# entry points only take and return picklable values. Each frame is reduced to
+# its forehead green-channel mean as soon as it is decoded; only that float is
+# kept, so a session costs O(frames) memory regardless of ROI size.
+
+
+class FramePayloadError(ValueError):
+    pass
+
+
+def forehead_intensity(image_array, frame_no, localizer, channel_order="RGB", gate=None):
+    if gate is not None:
+        with localizer.timings.time("frame_quality"):
+            reason = gate.check(image_array, channel_order)
+        if reason is not None:
+            if log_frame(frame_no):
+                logger.debug(f"Frame {frame_no}: Rejected by quality gate ({reason}).")
+            return None
+
+    box = localizer.locate(image_array, frame_no, channel_order)
+    if box is None:
+        return None
+
+    x, y, w, h = box
+    if log_frame(frame_no):
+        logger.debug(f"Frame {frame_no}: Face at x:{x}, y:{y}, w:{w}, h:{h}")
+
+    roi_y1 = max(0, y + (h // 8))
+    roi_y2 = y + (h // 4)
+    roi_x1 = max(0, x + (w // 3))
+    roi_x2 = x + w - (w // 3)
+
+    if not (roi_x1 < roi_x2 and roi_y1 < roi_y2):
+        logger.warning(f"Frame {frame_no}: Invalid forehead ROI. Box: {box}, ROI:({roi_x1},{roi_y1},{roi_x2},{roi_y2}). Skipping.")
+        return None
+
+    if log_frame(frame_no):
+        logger.debug(f"Frame {frame_no}: Forehead ROI x1:{roi_x1}, y1:{roi_y1}, x2:{roi_x2}, y2:{roi_y2}")
+
+    if image_array.ndim < 3 or image_array.shape[2] < 2:
+        logger.warning(f"Frame {frame_no}: Image array shape {image_array.shape} unexpected. Skipping.")
+        return None
+
+    # Green is channel 1 in both RGB and BGR; slicing is a view, not a copy.
+    forehead_green = image_array[roi_y1:roi_y2, roi_x1:roi_x2, 1]
+    if forehead_green.size == 0:
+        logger.warning(f"Frame {frame_no}: Cropped forehead empty. Image: {image_array.shape}, Crop: ({roi_x1},{roi_y1},{roi_x2},{roi_y2}). Skipping.")
+        return None
+
+    return float(forehead_green.mean())
+
+
+def decode_data_url(frame_data_url):
+    header, encoded = frame_data_url.split(',', 1)
+    image_data = base64.b64decode(encoded)
+    return np.asarray(Image.open(BytesIO(image_data)).convert('RGB'))
+
+
+def _data_url_intensity(frame_data_url, frame_no, localizer, gate=None):
+    if not isinstance(frame_data_url, str) or ',' not in frame_data_url:
+        logger.warning(f"Frame {frame_no}: Invalid data URL format. Skipping.")
+        return None
+
+    try:
+        with localizer.timings.time("frame_decode"):
+            image_array = decode_data_url(frame_data_url)
+        return forehead_intensity(image_array, frame_no, localizer, gate=gate)
+    except Exception as frame_error:
+        logger.error(f"Frame {frame_no}: Error processing frame. Error: {frame_error}", exc_info=True)
+        return None
+
+
+def iter_length_prefixed(body):
+    # Body layout: repeated [4-byte big-endian length][payload]. Payloads are
+    # yielded as memoryview slices of the request body, without copying.
+    view = memoryview(body)
+    offset = 0
+    while offset < len(view):
+        if offset + _LENGTH_PREFIX.size > len(view):
+            raise FramePayloadError(f"Truncated length prefix at byte {offset}.")
+        (length,) = _LENGTH_PREFIX.unpack_from(view, offset)
+        offset += _LENGTH_PREFIX.size
+        if length == 0 or offset + length > len(view):
+            raise FramePayloadError(f"Invalid frame length {length} at byte {offset - _LENGTH_PREFIX.size}.")
+        yield view[offset:offset + length]
+        offset += length
+
+
+def decode_binary_frame(payload, encoding="jpeg", width=None, height=None):
+    buffer = np.frombuffer(payload, dtype=np.uint8)
+    if encoding == "raw":
+        if buffer.size != width * height * 3:
+            raise FramePayloadError(f"Raw frame has {buffer.size} bytes, expected {width}x{height}x3.")
+        return buffer.reshape(height, width, 3), "RGB"
+    # cv2 decodes straight from the byte view into a single BGR array.
+    image_array = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+    if image_array is None:
+        raise FramePayloadError("Frame could not be decoded as an image.")
+    return image_array, "BGR"
+
+
+def _cannot_reach_minimum(valid_frames, frames_left):
+    # Checked after every frame when the total is known up front, so a
+    # hopeless request stops decoding and detecting right away.
+    return valid_frames + frames_left < MIN_VALID_FRAMES
+
+
+def _summarize(intensity_values, localizer, gate, fps, frames_received, frames_skipped=0):
+    if len(intensity_values) < MIN_VALID_FRAMES:
+        logger.error(f"Insufficient valid frames for analysis: {len(intensity_values)} collected, need {MIN_VALID_FRAMES}"
+                     f"{f' ({frames_skipped} frames not processed)' if frames_skipped else ''}.")
+        return {
+            "error": f"Insufficient valid frames ({len(intensity_values)} collected). Ensure clear, stable face view.",
+            "frames_skipped": frames_skipped,
+            "frame_quality": gate.stats(),
+            "face_localization": localizer.stats(),
+            "stage_timings": localizer.timings.drain()
+        }
+
+    logger.info(f"Proceeding to HeartMetricsCalculator with {len(intensity_values)} of {frames_received} frames.")
+    calculator = HeartMetricsCalculator(fps=fps)
+    with localizer.timings.time("heart_metrics"):
+        avg_hr, sdnn, rmssd, bsi, lf_hf_ratio = calculator.estimate_heart_rate_from_intensities(intensity_values)
+
+    logger.info(f"Analysis results: HR:{avg_hr}, SDNN:{sdnn}, RMSSD:{rmssd}, BSI:{bsi}, LF/HF:{lf_hf_ratio}")
+
+    return {
+        "avg_heart_rate": float(avg_hr) if not np.isnan(avg_hr) else 0,
+        "sdnn": float(sdnn) if not np.isnan(sdnn) else 0,
+        "rmssd": float(rmssd) if not np.isnan(rmssd) else 0,
+        "bsi": float(bsi) if not np.isnan(bsi) else 0,
+        "lf_hf_ratio": float(lf_hf_ratio) if not np.isnan(lf_hf_ratio) else 0,
+        "frame_quality": gate.stats(),
+        "face_localization": localizer.stats(),
+        # Popped by the API process and turned into stage metrics.
+        "stage_timings": localizer.timings.drain()
+    }
+
+
+def extract_intensities(frames, first_frame_no, localizer, gate):
+    # Used by streaming sessions: the localizer (and its tracking template)
+    # and the quality gate (and its previous thumbnail) are shipped to the
+    # worker with each chunk and returned updated.
+    intensities = []
+    for offset, frame_data_url in enumerate(frames):
+        intensity = _data_url_intensity(frame_data_url, first_frame_no + offset, localizer, gate)
+        if intensity is not None:
+            intensities.append(intensity)
+    return intensities, localizer, gate
+
+
+def analyze_frames(frames, face_mode, fps=10):
+    localizer = FaceLocalizer(mode=face_mode)
+    gate = FrameQualityGate()
+    intensity_values = []
+    frames_received = 0
+
+    for frame_data_url in frames:
+        if _cannot_reach_minimum(len(intensity_values), len(frames) - frames_received):
+            break
+        frames_received += 1
+        intensity = _data_url_intensity(frame_data_url, frames_received, localizer, gate)
+        if intensity is not None:
+            intensity_values.append(intensity)
+
+    return _summarize(intensity_values, localizer, gate, fps, frames_received, len(frames) - frames_received)
+
+
+def analyze_binary_frames(payloads, encoding, width, height, face_mode, fps=10):
+    # `payloads` is either a list of encoded frames (multipart upload) or one
+    # length-prefixed body. The prefixes are walked once up front (the
+    # payloads stay views of the body) so the frame count is known for
+    # failing fast.
+    if isinstance(payloads, (bytes, bytearray, memoryview)):
+        payloads = list(iter_length_prefixed(payloads))
+
+    if not payloads:
+        raise FramePayloadError("No frames provided for analysis.")
+
+    localizer = FaceLocalizer(mode=face_mode)
+    gate = FrameQualityGate()
+    intensity_values = []
+    frames_received = 0
+
+    for payload in payloads:
+        if _cannot_reach_minimum(len(intensity_values), len(payloads) - frames_received):
+            break
+        frames_received += 1
+        try:
+            with localizer.timings.time("frame_decode"):
+                image_array, channel_order = decode_binary_frame(payload, encoding, width, height)
+        except FramePayloadError as e:
+            if encoding == "raw":
+                raise
+            logger.warning(f"Frame {frames_received}: {str(e)} Skipping.")
+            continue
+        try:
+            intensity = forehead_intensity(image_array, frames_received, localizer, channel_order, gate)
+        except Exception as frame_error:
+            logger.error(f"Frame {frames_received}: Error processing frame. Error: {frame_error}", exc_info=True)
+            continue
+        if intensity is not None:
+            intensity_values.append(intensity)
+
+    return _summarize(intensity_values, localizer, gate, fps, frames_received, len(payloads) - frames_received)
@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import secrets
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app.core.config import (
+    STRESS_POOL_SIZE, STRESS_QUEUE_DEPTH, STRESS_JOB_TIMEOUT, STRESS_RETRY_AFTER,
+    STRESS_START_METHOD, STRESS_WORKER_NICE, STRESS_FACE_MODE,
+    STRESS_BATCHING, STRESS_BATCH_MAX_SIZE, STRESS_BATCH_MAX_WAIT_MS
+)
+from app.utils.cpu import default_pool_size
+
+logger = logging.getLogger(__name__)
+
+
+class StressPoolBusy(Exception):
+
+    def __init__(self, retry_after):
+        super().__init__(f"Stress analysis queue is full. Retry after {retry_after}s.")
+        self.retry_after = retry_after
+
+
+_worker_ready = False
+
+
+def load_detector():
+    # A dummy inference builds DeepFace's SSD detector and caches it in the
+    # process, so the first real frame doesn't pay for it.
+    import numpy as np
+    from deepface import DeepFace
+
+    DeepFace.extract_faces(
+        img_path=np.zeros((224, 224, 3), dtype=np.uint8),
+        detector_backend='ssd',
+        enforce_detection=False,
+        align=False
+    )
+
+
+def _init_worker(batcher=None):
+    # Load the detector weights once per worker process instead of per request.
+    # With the batcher, detect-mode frames go to its process instead, and
+    # DeepFace is only loaded if an emotion request or a fallback needs it.
+    global _worker_ready
+    from app.services import face_batcher
+
+    logging.basicConfig(level=logging.INFO)
+    if STRESS_WORKER_NICE:
+        os.nice(STRESS_WORKER_NICE)
+    if batcher is not None and face_batcher.connect(*batcher) and STRESS_FACE_MODE == "detect":
+        _worker_ready = True
+        logger.info(f"Stress worker {os.getpid()} ready (batched detection).")
+        return
+    try:
+        load_detector()
+        _worker_ready = True
+        logger.info(f"Stress worker {os.getpid()} ready.")
+    except Exception as e:
+        logger.error(f"Stress worker {os.getpid()} failed to warm up DeepFace: {str(e)}", exc_info=True)
+
+
+def _worker_status():
+    return os.getpid(), _worker_ready
+
+
+def _mp_context():
+    # Plain fork is not offered: the parent runs an event loop and threads.
+    if STRESS_START_METHOD == "forkserver":
+        context = multiprocessing.get_context("forkserver")
+        # The fork server loads the detector once; workers forked from it
+        # share those pages copy-on-write instead of each loading its own.
+        context.set_forkserver_preload(["app.services.stress_preload"])
+        return context
+    if STRESS_START_METHOD != "spawn":
+        logger.warning(f"Unknown STRESS_START_METHOD '{STRESS_START_METHOD}'. Using spawn.")
+    return multiprocessing.get_context("spawn")
+
+
+class StressWorkerPool:
+    # Process pool for the CPU-bound stress pipeline. At most `queue_depth` jobs
+    # may be submitted (running or waiting) at once; beyond that callers get
+    # StressPoolBusy so the endpoint can answer 503 + Retry-After instead of
+    # queueing unbounded work. A job counts against the depth until the worker
+    # actually finishes it, even if the caller already timed out.
+
+    def __init__(self, size=STRESS_POOL_SIZE, queue_depth=STRESS_QUEUE_DEPTH, job_timeout=STRESS_JOB_TIMEOUT, retry_after=STRESS_RETRY_AFTER):
+        self.size = size if size > 0 else default_pool_size()
+        self.queue_depth = queue_depth if queue_depth > 0 else 2 * self.size
+        self.job_timeout = job_timeout
+        self.retry_after = retry_after
+        self._executor = None
+        self._batcher = None
+        self._batcher_process = None
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def start(self):
+        if self._executor is None:
+            context = _mp_context()
+            if STRESS_BATCHING and (self._batcher_process is None or not self._batcher_process.is_alive()):
+                self._start_batcher(context)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.size,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(self._batcher,)
+            )
+            logger.info(f"Stress worker pool started with {self.size} processes, queue depth {self.queue_depth}.")
+
+    def _start_batcher(self, context):
+        # The batcher outlives pool resets; workers of a new pool reconnect.
+        from app.services import face_batcher
+
+        self._batcher = (os.path.join(tempfile.mkdtemp(prefix="stress-batcher-"), "socket"), secrets.token_bytes(16))
+        self._batcher_process = context.Process(
+            target=face_batcher.serve,
+            args=(*self._batcher, STRESS_BATCH_MAX_SIZE, STRESS_BATCH_MAX_WAIT_MS),
+            name="face-batcher",
+            daemon=True
+        )
+        self._batcher_process.start()
+
+    def batching_stats(self) -> dict | None:
+        # Blocking round trip to the batcher; call it from a thread.
+        from app.services import face_batcher
+
+        if self._batcher is None or not self._batcher_process.is_alive():
+            return None
+        return face_batcher.fetch_stats(*self._batcher)
+
+    async def warm_up(self, timeout=None):
+        # One status job per process. The executor spawns a new worker for
+        # every job it can't hand to an idle one, and each worker runs
+        # _init_worker (the DeepFace load) before taking its first job.
+        self.start()
+        futures = [asyncio.wrap_future(self._executor.submit(_worker_status)) for _ in range(self.size)]
+        statuses = await asyncio.wait_for(asyncio.gather(*futures), timeout or self.job_timeout)
+        warmed = {pid for pid, ready in statuses if ready}
+        if not warmed:
+            raise RuntimeError("No stress worker could load the face detector.")
+        return len(warmed)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._batcher_process is not None:
+            self._batcher_process.terminate()
+            self._batcher_process = None
+            self._batcher = None
+
+    def _job_done(self, _future):
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, fn, *args, timeout=None):
+        with self._lock:
+            if self._pending >= self.queue_depth:
+                raise StressPoolBusy(self.retry_after)
+            self._pending += 1
+
+        try:
+            future = self._submit(fn, *args)
+        except Exception:
+            self._job_done(None)
+            raise
+        future.add_done_callback(self._job_done)
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.job_timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            raise
+        except BrokenProcessPool:
+            logger.error("A stress worker died. Restarting the pool.")
+            self._reset()
+            raise
+
+    def _submit(self, fn, *args):
+        self.start()
+        try:
+            return self._executor.submit(fn, *args)
+        except BrokenProcessPool:
+            logger.error("Stress worker pool is broken. Restarting it.")
+            self._reset()
+            self.start()
+            return self._executor.submit(fn, *args)
+
+    def _reset(self):
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+stress_pool = StressWorkerPool()
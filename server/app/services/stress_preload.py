@@ -0,0 +1,5 @@
+# Imported by the multiprocessing fork server when STRESS_START_METHOD is
+# "forkserver", before it forks any stress worker.
+from app.services.stress_pool import load_detector
+
+load_detector()
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import math
+import uuid
+from datetime import datetime
+from pymongo import UpdateOne
+
+from app.db.setup import STRESS_SAMPLES, STRESS_AGGREGATES, get_collection
+
+logger = logging.getLogger(__name__)
+
+SCOPES = ("session", "day", "lecture")
+PERCENTILES = (50, 90)
+# Aggregated metrics and the fixed histogram bins their percentiles are read
+# from. Values outside the range land in the first or last bin; min and max
+# are kept exactly.
+METRICS = {
+    "heart_rate": {"field": "avg_heart_rate", "low": 30.0, "width": 2.0, "bins": 95}, # 30-220 bpm
+    "lf_hf_ratio": {"field": "lf_hf_ratio", "low": 0.0, "width": 0.1, "bins": 100}, # 0-10
+}
+QUALITY_COUNTERS = ("checked_frames", "rejected_frames")
+SAMPLE_FIELDS = ("avg_heart_rate", "heart_rate", "sdnn", "rmssd", "bsi", "lf_hf_ratio", "valid_frames", "frames_received")
+
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
+
+
+def _bin(metric: dict, value: float) -> int:
+    return min(metric["bins"] - 1, max(0, int((value - metric["low"]) // metric["width"])))
+
+
+def _percentile(metric: dict, histogram: dict, count: int, q: float, low: float, high: float) -> float:
+    # Linear interpolation inside the bin holding the q-th value, clamped to
+    # the exact min/max so single-sample aggregates report the sample itself.
+    target = q / 100 * count
+    seen = 0
+    for index in sorted(int(i) for i in histogram):
+        in_bin = histogram[str(index)]
+        if seen + in_bin >= target:
+            start = metric["low"] + index * metric["width"]
+            value = start + metric["width"] * ((target - seen) / in_bin)
+            return round(min(high, max(low, value)), 3)
+        seen += in_bin
+    return round(high, 3)
+
+
+def _metric_view(metric: dict, state: dict | None) -> dict | None:
+    if not state or not state.get("count"):
+        return None
+    count = state["count"]
+    mean = state["sum"] / count
+    variance = max(0.0, state["sumsq"] / count - mean * mean)
+    view = {"count": count, "mean": round(mean, 3), "std": round(math.sqrt(variance), 3),
+            "min": round(state["min"], 3), "max": round(state["max"], 3)}
+    for q in PERCENTILES:
+        view[f"p{q}"] = _percentile(metric, state["hist"], count, q, state["min"], state["max"])
+    return view
+
+
+def aggregate_view(doc: dict) -> dict:
+    view = {
+        "scope": doc["scope"],
+        "key": doc["key"],
+        "video_id": doc.get("video_id"),
+        "start": doc["start"].isoformat(),
+        "end": doc["end"].isoformat(),
+        "samples": doc["samples"],
+        "frame_quality": doc.get("frame_quality", {}),
+    }
+    for name, metric in METRICS.items():
+        view[name] = _metric_view(metric, doc.get(name))
+    return view
+
+
+class StressStore:
+    # Stress results of signed-in users. Every result is one raw sample in a
+    # time-series collection; on the same write, the session's, the UTC
+    # day's and the lecture video's aggregates are updated in place with
+    # $inc/$min/$max (count, sum, sum of squares, extremes and a fixed-bin
+    # histogram per metric), so trend queries read a handful of aggregate
+    # documents instead of scanning samples. Streaming sessions write one
+    # sample when they end, so every session weighs the same in a trend.
+
+    @property
+    def samples(self):
+        return get_collection(STRESS_SAMPLES)
+
+    @property
+    def aggregates(self):
+        return get_collection(STRESS_AGGREGATES)
+
+    async def record(self, user_id: str, session_id: str, result: dict, video_id: str | None = None,
+                     frame_quality: dict | None = None, source: str = "batch"):
+        # frame_quality holds the session's gate counters.
+        now = datetime.utcnow()
+        sample = {
+            "ts": now,
+            "meta": {"user_id": user_id, "video_id": video_id},
+            "session_id": session_id,
+            "source": source,
+            **{k: result[k] for k in SAMPLE_FIELDS if result.get(k) is not None},
+        }
+        if frame_quality is not None:
+            sample["frame_quality"] = frame_quality
+
+        inc, low, high = {"samples": 1}, {"start": now}, {"end": now}
+        for name, metric in METRICS.items():
+            value = result.get(metric["field"])
+            # The calculator reports 0 when a metric could not be estimated.
+            if not value or math.isnan(value):
+                continue
+            inc.update({f"{name}.count": 1, f"{name}.sum": value, f"{name}.sumsq": value * value,
+                        f"{name}.hist.{_bin(metric, value)}": 1})
+            low[f"{name}.min"] = value
+            high[f"{name}.max"] = value
+        if frame_quality is not None:
+            for counter in QUALITY_COUNTERS:
+                inc[f"frame_quality.{counter}"] = frame_quality.get(counter, 0)
+            for reason, count in frame_quality.get("rejected_by_reason", {}).items():
+                if count:
+                    inc[f"frame_quality.rejected_by_reason.{reason}"] = count
+
+        keys = {"session": session_id, "day": now.strftime("%Y-%m-%d")}
+        if video_id:
+            keys["lecture"] = video_id
+        updates = [
+            UpdateOne(
+                {"_id": f"{scope}:{user_id}:{key}"},
+                {"$inc": inc, "$min": low, "$max": high, "$set": {"updated_at": now},
+                 "$setOnInsert": {"scope": scope, "key": key, "user_id": user_id,
+                                  "video_id": video_id if scope != "day" else None}},
+                upsert=True
+            )
+            for scope, key in keys.items()
+        ]
+        await asyncio.gather(self.samples.insert_one(sample), self.aggregates.bulk_write(updates, ordered=False))
+
+    async def trends(self, user_id: str, scope: str, video_id: str | None = None, since: datetime | None = None,
+                     until: datetime | None = None, limit: int = 30) -> list[dict]:
+        query = {"user_id": user_id, "scope": scope}
+        if video_id:
+            query["video_id"] = video_id
+        if since or until:
+            query["start"] = {**({"$gte": since} if since else {}), **({"$lt": until} if until else {})}
+        docs = await self.aggregates.find(query).sort("start", -1).limit(limit).to_list(length=limit)
+        return [aggregate_view(doc) for doc in docs]
+
+
+stress_store = StressStore()
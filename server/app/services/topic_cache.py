@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+from app.core.config import (
+    LECTURE_CACHE_MAX_ENTRIES, LECTURE_CACHE_FRESH_SECONDS,
+    LECTURE_CACHE_STALE_SECONDS, LECTURE_CACHE_REFRESH_LEASE_SECONDS
+)
+from app.db.setup import LECTURE_CACHE, get_collection
+from app.services.upstream_scheduler import BACKGROUND, upstream_priority
+from app.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_topic(topic: str) -> str:
+    return " ".join(topic.casefold().split())
+
+
+class TopicCache:
+    # Two-tier stale-while-revalidate cache for generated lectures.
+    #   tier 1: per-process LRU (TTLCache), checked first;
+    #   tier 2: a MongoDB collection shared by all workers and kept across
+    #           restarts (documents expire through a TTL index on expires_at).
+    # Entries younger than fresh_seconds are served as hits. Older entries,
+    # up to stale_seconds, are served immediately as stale while a single
+    # background refresh runs; a lease on the Mongo document keeps other
+    # workers from refreshing the same topic at the same time.
+
+    def __init__(self, collection_name, max_entries=LECTURE_CACHE_MAX_ENTRIES, fresh_seconds=LECTURE_CACHE_FRESH_SECONDS,
+                 stale_seconds=LECTURE_CACHE_STALE_SECONDS, lease_seconds=LECTURE_CACHE_REFRESH_LEASE_SECONDS):
+        self.collection_name = collection_name
+        self.fresh_seconds = fresh_seconds
+        self.stale_seconds = stale_seconds
+        self.lease_seconds = lease_seconds
+        self._memory = TTLCache(max_entries, stale_seconds)
+        self._refreshing = {}
+        self.counters = {"hits": 0, "stale": 0, "misses": 0, "memory_hits": 0, "mongo_hits": 0, "refreshes": 0, "refresh_errors": 0}
+
+    @property
+    def collection(self):
+        return get_collection(self.collection_name)
+
+    def stats(self) -> dict:
+        lookups = self.counters["hits"] + self.counters["stale"] + self.counters["misses"]
+        return {
+            **self.counters,
+            "hit_rate": (self.counters["hits"] + self.counters["stale"]) / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "refreshes_in_flight": len(self._refreshing),
+        }
+
+    async def lookup(self, topic: str, fetch=None):
+        # Returns the cached value, or None on a miss. A stale value is still
+        # returned; if fetch is given a background refresh is scheduled.
+        key = normalize_topic(topic)
+        entry = self._memory.get(key)
+        if entry is not None:
+            self.counters["memory_hits"] += 1
+        else:
+            entry = await self._load(key)
+            if entry is not None:
+                self.counters["mongo_hits"] += 1
+                self._memory.set(key, entry, ttl_seconds=max(1, self.stale_seconds - (time.time() - entry["fetched_at"])))
+
+        if entry is not None:
+            age = time.time() - entry["fetched_at"]
+            if age < self.fresh_seconds:
+                self.counters["hits"] += 1
+                return entry["value"]
+            if age < self.stale_seconds:
+                self.counters["stale"] += 1
+                if fetch is not None:
+                    self._schedule_refresh(key, topic, fetch)
+                return entry["value"]
+
+        self.counters["misses"] += 1
+        return None
+
+    async def store(self, topic: str, value):
+        await self._store(normalize_topic(topic), topic, value)
+
+    async def get_or_fetch(self, topic: str, fetch):
+        value = await self.lookup(topic, fetch)
+        if value is None:
+            value = await fetch(topic)
+            await self.store(topic, value)
+        return value
+
+    def _schedule_refresh(self, key, topic, fetch):
+        if key in self._refreshing:
+            return
+        task = asyncio.create_task(self._refresh(key, topic, fetch))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+
+    async def _refresh(self, key, topic, fetch):
+        # Users already have an answer, so refreshes yield upstream quota to them.
+        with upstream_priority(BACKGROUND):
+            await self._refresh_now(key, topic, fetch)
+
+    async def _refresh_now(self, key, topic, fetch):
+        try:
+            # Another worker may already have refreshed the shared copy.
+            shared = await self._load(key)
+            if shared is not None and time.time() - shared["fetched_at"] < self.fresh_seconds:
+                self._memory.set(key, shared)
+                return
+            if not await self._acquire_lease(key):
+                return
+            value = await fetch(topic)
+            await self._store(key, topic, value)
+            self.counters["refreshes"] += 1
+        except Exception as e:
+            self.counters["refresh_errors"] += 1
+            logger.warning(f"Background refresh failed for topic '{topic}': {str(e)}")
+
+    async def _load(self, key):
+        try:
+            doc = await self.collection.find_one({"_id": key})
+        except Exception as e:
+            logger.warning(f"Lecture cache lookup failed for '{key}': {str(e)}")
+            return None
+        if not doc:
+            return None
+        return {"value": doc["value"], "fetched_at": doc["fetched_at"].replace(tzinfo=timezone.utc).timestamp()}
+
+    async def _store(self, key, topic, value):
+        fetched_at = time.time()
+        self._memory.set(key, {"value": value, "fetched_at": fetched_at})
+        try:
+            await self.collection.update_one(
+                {"_id": key},
+                {
+                    "$set": {
+                        "topic": topic,
+                        "value": value,
+                        "fetched_at": datetime.utcfromtimestamp(fetched_at),
+                        "expires_at": datetime.utcfromtimestamp(fetched_at + self.stale_seconds),
+                    },
+                    "$unset": {"refresh_lease": ""},
+                },
+                upsert=True
+            )
+        except Exception as e:
+            logger.warning(f"Lecture cache write failed for '{key}': {str(e)}")
+
+    async def _acquire_lease(self, key) -> bool:
+        now = datetime.utcnow()
+        try:
+            result = await self.collection.update_one(
+                {"_id": key, "$or": [{"refresh_lease": {"$exists": False}}, {"refresh_lease": {"$lt": now}}]},
+                {"$set": {"refresh_lease": now + timedelta(seconds=self.lease_seconds)}}
+            )
+        except Exception as e:
+            logger.warning(f"Could not take refresh lease for '{key}': {str(e)}")
+            return True # Mongo unavailable: refresh locally rather than never
+        if result.modified_count == 1:
+            return True
+        # No match means either another worker holds the lease or the entry only
+        # exists in this process (its Mongo write failed); refresh in the latter case.
+        return await self.collection.count_documents({"_id": key}, limit=1) == 0
+
+
+lecture_cache = TopicCache(LECTURE_CACHE)
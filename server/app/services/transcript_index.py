@@ -0,0 +1,133 @@
+import logging
+import math
+import re
+from collections import Counter
+from fastapi.concurrency import run_in_threadpool
+from youtube_transcript_api import YouTubeTranscriptApi
+
+from app.core.config import QA_CHUNK_CHARS, QA_INDEX_CACHE_ENTRIES, QA_INDEX_CACHE_SECONDS
+from app.core.metrics import stage
+from app.services.content_cache import transcript_cache
+from app.utils.cache import TTLCache
+from app.utils.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from how i if in is it its of on or so that the "
+    "this to was what when where which who why will with you your".split()
+)
+CHARS_PER_TOKEN = 4 # rough Gemini/English ratio, good enough for budgeting
+
+
+def tokenize(text: str) -> list[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def format_timestamp(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+
+def chunk_transcript(entries: list[dict], chunk_chars: int = QA_CHUNK_CHARS) -> list[dict]:
+    # Groups consecutive caption lines into passages of roughly chunk_chars,
+    # keeping the start time of the first line and the end of the last one.
+    chunks = []
+    texts, start, end, size = [], None, 0.0, 0
+    for entry in entries:
+        text = entry.get("text", "").replace("\n", " ").strip()
+        if not text:
+            continue
+        if start is None:
+            start = float(entry.get("start", 0.0))
+        texts.append(text)
+        size += len(text) + 1
+        end = float(entry.get("start", 0.0)) + float(entry.get("duration", 0.0))
+        if size >= chunk_chars:
+            chunks.append({"start": start, "end": end, "text": " ".join(texts)})
+            texts, start, size = [], None, 0
+    if texts:
+        chunks.append({"start": start, "end": end, "text": " ".join(texts)})
+    return chunks
+
+
+class TranscriptIndex:
+    # Okapi BM25 over the chunks of one transcript. Built once per video and
+    # cached; scoring walks only the postings of the question's terms.
+    K1 = 1.5
+    B = 0.75
+
+    def __init__(self, chunks: list[dict]):
+        self.chunks = chunks
+        self.lengths = []
+        self.postings = {}
+        for i, chunk in enumerate(chunks):
+            terms = Counter(tokenize(chunk["text"]))
+            self.lengths.append(sum(terms.values()))
+            for term, tf in terms.items():
+                self.postings.setdefault(term, []).append((i, tf))
+        self.avg_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+        n = len(chunks)
+        self.idf = {term: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5)) for term, p in self.postings.items()}
+
+    @classmethod
+    def from_transcript(cls, entries: list[dict], chunk_chars: int = QA_CHUNK_CHARS) -> "TranscriptIndex":
+        return cls(chunk_transcript(entries, chunk_chars))
+
+    def search(self, query: str) -> list[tuple[float, int]]:
+        scores = {}
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for i, tf in self.postings[term]:
+                norm = tf + self.K1 * (1 - self.B + self.B * self.lengths[i] / self.avg_length)
+                scores[i] = scores.get(i, 0.0) + idf * tf * (self.K1 + 1) / norm
+        return sorted(((score, i) for i, score in scores.items()), reverse=True)
+
+    def select_passages(self, query: str, max_tokens: int, top_k: int) -> list[dict]:
+        # Best-scoring passages that fit the token budget, returned in
+        # transcript order. Without any lexical match (e.g. "summarize this")
+        # the opening of the lecture is used, as the old prefix cut did.
+        ranked = [i for _, i in self.search(query)] or range(len(self.chunks))
+        picked, used = [], 0
+        for i in ranked:
+            cost = estimate_tokens(self.chunks[i]["text"])
+            if used + cost > max_tokens:
+                continue
+            picked.append(i)
+            used += cost
+            if len(picked) >= top_k:
+                break
+        return [self.chunks[i] for i in sorted(picked)]
+
+
+_indexes = TTLCache(QA_INDEX_CACHE_ENTRIES, QA_INDEX_CACHE_SECONDS)
+_index_flights = SingleFlight("transcript_index")
+
+
+def fetch_transcript(video_id: str) -> list[dict]:
+    return YouTubeTranscriptApi.get_transcript(video_id)
+
+
+async def _load_index(video_id: str) -> TranscriptIndex:
+    entries = await transcript_cache.get_or_load(video_id, fetch_transcript)
+    with stage("transcript_index_build"):
+        index = await run_in_threadpool(TranscriptIndex.from_transcript, entries)
+    _indexes.set(video_id, index)
+    logger.info(f"Indexed transcript for {video_id}: {len(index.chunks)} passages.")
+    return index
+
+
+async def get_transcript_index(video_id: str) -> TranscriptIndex:
+    index = _indexes.get(video_id)
+    if index is None:
+        index = await _index_flights.do(video_id, _load_index, video_id)
+    return index
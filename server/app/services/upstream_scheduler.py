@@ -0,0 +1,221 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from app.core.config import (
+    YOUTUBE_DAILY_QUOTA, YOUTUBE_QUOTA_BURST, GEMINI_REQUESTS_PER_MINUTE,
+    UPSTREAM_MAX_WAIT_SECONDS, UPSTREAM_BACKGROUND_MAX_WAIT_SECONDS,
+    UPSTREAM_BACKOFF_BASE_SECONDS, YOUTUBE_BACKOFF_MAX_SECONDS, GEMINI_BACKOFF_MAX_SECONDS
+)
+from app.core.metrics import stage
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BACKGROUND = 10
+_priority = ContextVar("upstream_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def upstream_priority(priority: int):
+    # Upstream calls made inside the block (and tasks created from it) are
+    # queued with this priority; lower values are served first.
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def _retry_after(seconds: float) -> int:
+    return max(1, math.ceil(seconds))
+
+
+class UpstreamThrottled(Exception):
+
+    def __init__(self, provider, retry_after):
+        super().__init__(f"{provider} budget exhausted. Retry after {retry_after}s.")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+
+    def __init__(self, capacity: float, refill_per_second: float, clock=time.monotonic):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self._clock = clock
+        self._updated = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.refill_per_second)
+        self._updated = now
+
+    def available(self) -> float:
+        self._refill()
+        return self.tokens
+
+    def time_until(self, cost: float) -> float:
+        self._refill()
+        return 0.0 if self.tokens >= cost else (cost - self.tokens) / self.refill_per_second
+
+    def take(self, cost: float):
+        self._refill()
+        self.tokens -= cost
+
+    def drain(self):
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
+
+
+class UpstreamScheduler:
+    # Admission for outbound calls to one provider. Each call takes `cost`
+    # units from a token bucket sized to the provider's quota; callers wait in
+    # a (priority, deadline) queue and are granted strictly in that order.
+    # A caller whose estimated wait exceeds its deadline fails fast with
+    # UpstreamThrottled instead of piling up. When the provider reports
+    # exhaustion the bucket is drained and admission pauses for an
+    # exponentially growing backoff, halved again by each success.
+    #
+    # Empty budget: callers are never queued behind a refill longer than
+    # their max_wait. Once the daily YouTube budget is spent, a 100-unit search
+    # needs minutes of refill, so an interactive request fails at once with
+    # UpstreamThrottled (HTTP 429, Retry-After = the refill time) instead of
+    # holding its connection; topics in the lecture cache are still served.
+
+    def __init__(self, name, capacity, refill_per_second, max_wait=UPSTREAM_MAX_WAIT_SECONDS,
+                 background_max_wait=UPSTREAM_BACKGROUND_MAX_WAIT_SECONDS,
+                 backoff_base=UPSTREAM_BACKOFF_BASE_SECONDS, backoff_max=60.0, min_capacity=1):
+        self.name = name
+        self.budget = (capacity, refill_per_second)
+        self.min_capacity = min_capacity
+        self.share = 1.0
+        self.bucket = TokenBucket(capacity, refill_per_second)
+        self.max_wait = max_wait
+        self.background_max_wait = background_max_wait
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._queue = []
+        self._seq = itertools.count()
+        self._timer = None
+        self._paused_until = 0.0
+        self._backoff = 0.0
+        self.counters = {"granted": 0, "units_granted": 0, "throttled": 0, "expired": 0, "exhausted_signals": 0}
+
+    def set_share(self, share: float):
+        # Quotas belong to the API key, so each process sharing the key takes
+        # `share` of the budget. The burst never drops below min_capacity, so
+        # the most expensive call still fits.
+        capacity, refill_per_second = self.budget
+        self.share = share
+        self.bucket = TokenBucket(max(self.min_capacity, capacity * share), refill_per_second * share)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            **self.counters,
+            "budget_share": round(self.share, 4),
+            "remaining_units": round(max(self.bucket.available(), 0.0), 2),
+            "capacity_units": self.bucket.capacity,
+            "refill_units_per_second": self.bucket.refill_per_second,
+            "queued": sum(1 for entry in self._queue if not entry[4].done()),
+            "paused_for_seconds": round(max(0.0, self._paused_until - now), 2),
+            "backoff_seconds": self._backoff,
+        }
+
+    def _estimated_wait(self, cost: float, priority: int) -> float:
+        ahead = sum(entry[3] for entry in self._queue if entry[0] <= priority and not entry[4].done())
+        paused = max(0.0, self._paused_until - time.monotonic())
+        return max(paused, self.bucket.time_until(ahead + cost))
+
+    async def acquire(self, cost: float = 1):
+        cost = min(cost, self.bucket.capacity)
+        priority = _priority.get()
+        max_wait = self.max_wait if priority <= INTERACTIVE else self.background_max_wait
+        estimate = self._estimated_wait(cost, priority)
+        if estimate > max_wait:
+            self.counters["throttled"] += 1
+            raise UpstreamThrottled(self.name, _retry_after(estimate))
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, time.monotonic() + max_wait, next(self._seq), cost, future))
+        self._pump()
+        try:
+            with stage(f"{self.name}_quota_wait"):
+                await asyncio.wait_for(future, max_wait)
+        except asyncio.TimeoutError:
+            self.counters["expired"] += 1
+            raise UpstreamThrottled(self.name, _retry_after(self._estimated_wait(cost, priority)))
+
+    def _pump(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._queue:
+            priority, deadline, _, cost, future = self._queue[0]
+            now = time.monotonic()
+            if future.done():
+                heapq.heappop(self._queue)
+                continue
+            if deadline <= now:
+                heapq.heappop(self._queue)
+                self.counters["expired"] += 1
+                future.set_exception(UpstreamThrottled(self.name, _retry_after(self.bucket.time_until(cost))))
+                continue
+            wait = max(self._paused_until - now, self.bucket.time_until(cost))
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._pump)
+                return
+            heapq.heappop(self._queue)
+            self.bucket.take(cost)
+            future.set_result(None)
+            self.counters["granted"] += 1
+            self.counters["units_granted"] += cost
+
+    def report_exhausted(self, retry_after: float | None = None, drain: bool = True):
+        # drain=False for short-term rate limits: pause, but keep the budget.
+        self.counters["exhausted_signals"] += 1
+        self._backoff = min(self.backoff_max, max(self.backoff_base, self._backoff * 2))
+        self._paused_until = max(self._paused_until, time.monotonic() + max(self._backoff, retry_after or 0))
+        if drain:
+            self.bucket.drain()
+        logger.warning(f"{self.name} reported quota exhaustion; pausing calls for {max(0.0, self._paused_until - time.monotonic()):.1f}s.")
+
+    def report_success(self):
+        if self._backoff:
+            self._backoff = self._backoff / 2 if self._backoff > self.backoff_base else 0.0
+
+
+_schedulers = {}
+
+
+def register(scheduler: UpstreamScheduler) -> UpstreamScheduler:
+    _schedulers[scheduler.name] = scheduler
+    return scheduler
+
+
+def share_budgets(processes: int):
+    # Called in every gunicorn worker (gunicorn.conf.py post_fork).
+    for scheduler in _schedulers.values():
+        scheduler.set_share(1 / max(1, processes))
+    logger.info(f"Upstream budgets shared by {processes} process(es).")
+
+
+def scheduler_stats() -> dict:
+    return {name: scheduler.stats() for name, scheduler in _schedulers.items()}
+
+
+youtube_scheduler = register(UpstreamScheduler(
+    "youtube", YOUTUBE_QUOTA_BURST, YOUTUBE_DAILY_QUOTA / 86400, backoff_max=YOUTUBE_BACKOFF_MAX_SECONDS,
+    min_capacity=100 # one search.list call
+))
+gemini_scheduler = register(UpstreamScheduler(
+    "gemini", GEMINI_REQUESTS_PER_MINUTE, GEMINI_REQUESTS_PER_MINUTE / 60, backoff_max=GEMINI_BACKOFF_MAX_SECONDS
+))
@@ -0,0 +1,89 @@
+import logging
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+
+from app.core.config import VIDEO_CATALOG_MAX_AGE_SECONDS
+from app.db.setup import VIDEOS, get_collection
+
+logger = logging.getLogger(__name__)
+
+# Shared per-video metadata, keyed by YouTube videoId. Lectures only store
+# ordered {"videoId", "status"} references into it; status is per user and
+# never lives in the catalog. Videos that failed the lecture filters (too
+# short, no thumbnail) are remembered with qualifies=False so their details
+# aren't fetched again either.
+CATALOG_FIELDS = ("title", "description", "thumbnails", "channel", "duration")
+DEFAULT_STATUS = "todo"
+# fetched_at for metadata that did not come straight from YouTube (client
+# payloads, migrated lectures): it only seeds missing entries and is never
+# fresh enough to skip a detail fetch.
+UNVERIFIED = datetime(1970, 1, 1)
+
+
+def to_reference(video: dict) -> dict:
+    return {"videoId": video["videoId"], "status": video.get("status", DEFAULT_STATUS)}
+
+
+def catalog_update(video_id: str, video: dict | None, fetched_at: datetime, overwrite: bool = True) -> UpdateOne:
+    fields = {"qualifies": video is not None, "fetched_at": fetched_at}
+    if video is not None:
+        fields.update({f: video[f] for f in CATALOG_FIELDS if f in video})
+    return UpdateOne({"_id": video_id}, {"$set" if overwrite else "$setOnInsert": fields}, upsert=True)
+
+
+async def remember_videos(videos: dict[str, dict | None], fetched_at: datetime | None = None, overwrite: bool = True):
+    # videos maps videoId -> built video, or None when it did not qualify.
+    if not videos:
+        return
+    fetched_at = fetched_at or datetime.utcnow()
+    try:
+        await get_collection(VIDEOS).bulk_write(
+            [catalog_update(video_id, video, fetched_at, overwrite) for video_id, video in videos.items()],
+            ordered=False
+        )
+    except Exception as e:
+        logger.warning(f"Could not update the video catalog ({len(videos)} videos): {str(e)}")
+
+
+async def known_videos(video_ids: list[str]) -> dict[str, dict | None]:
+    # Recently fetched catalog entries for video_ids, as built videos (None
+    # for known non-qualifying ids). Missing or stale ids are left out.
+    if not video_ids:
+        return {}
+    since = datetime.utcnow() - timedelta(seconds=VIDEO_CATALOG_MAX_AGE_SECONDS)
+    try:
+        docs = await get_collection(VIDEOS).find(
+            {"_id": {"$in": video_ids}, "fetched_at": {"$gte": since}}
+        ).to_list(length=len(video_ids))
+    except Exception as e:
+        logger.warning(f"Video catalog lookup failed: {str(e)}")
+        return {}
+    return {doc["_id"]: _as_video(doc) if doc.get("qualifies") else None for doc in docs}
+
+
+def _as_video(doc: dict, fields=CATALOG_FIELDS) -> dict:
+    return {"videoId": doc["_id"], **{f: doc[f] for f in fields if f in doc}, "status": DEFAULT_STATUS}
+
+
+async def hydrate_lectures(lectures: list[dict], fields: tuple[str, ...] | None = None):
+    # Fills catalog fields into the video references of a page of lectures
+    # with one batched $in lookup. Entries that already carry the fields
+    # (lectures written before the catalog existed) are left untouched.
+    wanted = [f for f in (fields or CATALOG_FIELDS) if f in CATALOG_FIELDS]
+    if not wanted:
+        return
+    ids = {v["videoId"] for lecture in lectures for v in lecture.get("videos", [])
+           if "videoId" in v and any(f not in v for f in wanted)}
+    if not ids:
+        return
+    docs = await get_collection(VIDEOS).find(
+        {"_id": {"$in": list(ids)}}, {f: 1 for f in wanted}
+    ).to_list(length=len(ids))
+    catalog = {doc["_id"]: doc for doc in docs}
+    for lecture in lectures:
+        for video in lecture.get("videos", []):
+            doc = catalog.get(video.get("videoId"))
+            if doc:
+                for f in wanted:
+                    if f in doc:
+                        video.setdefault(f, doc[f])
@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import random
+import httpx
+
+from app.core.config import YOUTUBE_API_KEY, YOUTUBE_MAX_ATTEMPTS, YOUTUBE_BACKOFF_BASE_SECONDS
+from app.core.metrics import stage
+from app.services.http_client import get_http_client
+from app.services.upstream_scheduler import youtube_scheduler
+from app.services.video_catalog import known_videos, remember_videos
+from app.utils.helpers import parse_duration
+
+logger = logging.getLogger(__name__)
+
+YOUTUBE_SEARCH_URL = "https://www.googleapis.com/youtube/v3/search"
+YOUTUBE_VIDEOS_URL = "https://www.googleapis.com/youtube/v3/videos"
+SEARCH_PAGES = 4
+PAGE_SIZE = 50
+MAX_LECTURE_VIDEOS = 100
+SEARCH_COST = 100 # YouTube Data API quota units per call
+VIDEOS_COST = 1
+
+
+def _quota_signal(error: httpx.HTTPStatusError) -> str | None:
+    # "daily" when the project's quota is spent, "rate" for short-term limits.
+    if error.response.status_code == 429:
+        return "rate"
+    if error.response.status_code != 403:
+        return None
+    try:
+        reasons = {e.get("reason") for e in error.response.json().get("error", {}).get("errors", [])}
+    except ValueError:
+        return None
+    if reasons & {"quotaExceeded", "dailyLimitExceeded"}:
+        return "daily"
+    if reasons & {"rateLimitExceeded", "userRateLimitExceeded"}:
+        return "rate"
+    return None
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500 or error.response.status_code == 429
+    return isinstance(error, httpx.TransportError)
+
+
+async def _get_json(url: str, params: dict, cost: int, stage_name: str, attempts: int = YOUTUBE_MAX_ATTEMPTS) -> dict:
+    # Retries transport errors and 5xx/429 with full-jitter exponential backoff;
+    # other 4xx (e.g. quotaExceeded) are raised immediately. Every attempt is
+    # charged against the YouTube quota budget first.
+    client = get_http_client()
+    for attempt in range(attempts):
+        await youtube_scheduler.acquire(cost)
+        try:
+            with stage(stage_name):
+                response = await client.get(url, params=params)
+                response.raise_for_status()
+            youtube_scheduler.report_success()
+            return response.json()
+        except (httpx.HTTPStatusError, httpx.TransportError) as e:
+            if isinstance(e, httpx.HTTPStatusError) and (signal := _quota_signal(e)):
+                youtube_scheduler.report_exhausted(drain=signal == "daily")
+            if attempt == attempts - 1 or not _is_retryable(e):
+                raise
+            delay = random.uniform(0, YOUTUBE_BACKOFF_BASE_SECONDS * 2 ** attempt)
+            logger.warning(f"Attempt {attempt+1} for {url} failed: {str(e)}. Retrying in {delay:.2f}s.")
+            await asyncio.sleep(delay)
+
+
+async def search_page(topic: str, page_token: str | None) -> dict:
+    return await _get_json(YOUTUBE_SEARCH_URL, {
+        "part": "snippet",
+        "q": f"{topic} lecture",
+        "type": "video",
+        "maxResults": PAGE_SIZE,
+        "key": YOUTUBE_API_KEY,
+        "pageToken": page_token or "",
+        "relevanceLanguage": "en",
+        "videoEmbeddable": "true"
+    }, SEARCH_COST, "youtube_search")
+
+
+async def video_details(video_ids: list[str], chunk_no: int = 0) -> list[dict]:
+    # Detail failures only drop this chunk, as before; search failures propagate.
+    try:
+        data = await _get_json(YOUTUBE_VIDEOS_URL, {
+            "part": "contentDetails,snippet",
+            "id": ",".join(video_ids),
+            "key": YOUTUBE_API_KEY
+        }, VIDEOS_COST, "youtube_videos")
+        return data.get("items", [])
+    except Exception as e:
+        logger.error(f"All attempts failed to fetch video details for chunk {chunk_no}: {str(e)}")
+        return []
+
+
+def build_video(item: dict) -> dict | None:
+    try:
+        video_id = item["id"]
+        snippet = item.get("snippet", {})
+        content_details = item.get("contentDetails", {})
+
+        iso_duration = content_details.get("duration")
+        if not iso_duration:
+            logger.warning(f"Video {video_id} skipped: missing duration.")
+            return None
+
+        readable_duration, total_seconds = parse_duration(iso_duration)
+        if not readable_duration:
+            logger.debug(f"Video {video_id} skipped: duration {iso_duration} ({total_seconds}s) is less than 4 minutes.")
+            return None
+
+        thumbnails = snippet.get("thumbnails", {})
+        thumbnail = (thumbnails.get("high", {}).get("url") or
+                     thumbnails.get("medium", {}).get("url") or
+                     thumbnails.get("default", {}).get("url"))
+        if not thumbnail:
+            logger.warning(f"Video {video_id} skipped: missing thumbnail.")
+            return None
+
+        return {
+            "videoId": video_id,
+            "title": snippet.get("title", "Untitled Video"),
+            "description": snippet.get("description", ""),
+            "thumbnails": thumbnail,
+            "channel": snippet.get("channelTitle", "Unknown Channel"),
+            "duration": readable_duration,
+            "status": "todo"
+        }
+    except KeyError as e:
+        logger.error(f"Error processing video item (KeyError: {str(e)}): {item.get('id', 'Unknown ID')}")
+    except Exception as e:
+        logger.error(f"Error processing video item {item.get('id', 'Unknown ID')}: {str(e)}")
+    return None
+
+
+async def page_videos(video_ids: list[str], page_no: int = 0) -> list[dict]:
+    # Qualifying videos of one search page, in search order. Ids already in
+    # the video catalog are served from it; only the rest go to videos.list.
+    known = await known_videos(video_ids)
+    missing = [video_id for video_id in video_ids if video_id not in known]
+    fetched = {}
+    if missing:
+        items = await video_details(missing, page_no)
+        with stage("youtube_duration_filter"):
+            for item in items:
+                fetched[item.get("id")] = build_video(item)
+        await remember_videos(fetched)
+    videos = []
+    for video_id in video_ids:
+        video = known[video_id] if video_id in known else fetched.get(video_id)
+        if video:
+            videos.append(video)
+    return videos
+
+
+async def fetch_lecture_videos(topic: str, max_videos: int = MAX_LECTURE_VIDEOS) -> list[dict]:
+    # Search pages are inherently sequential (each needs the previous
+    # nextPageToken), but the detail request for a page is started as soon as
+    # that page arrives and runs while the next page is being searched.
+    page_tasks = []
+    page_token = None
+    try:
+        for page_no in range(SEARCH_PAGES):
+            search_data = await search_page(topic, page_token)
+            ids = [item["id"]["videoId"] for item in search_data.get("items", [])]
+            if ids:
+                page_tasks.append(asyncio.create_task(page_videos(ids, page_no)))
+            if not (page_token := search_data.get("nextPageToken")):
+                break
+
+        if not page_tasks:
+            logger.info(f"No video IDs found from YouTube search for topic: {topic}")
+            return []
+
+        videos = []
+        for page in await asyncio.gather(*page_tasks):
+            videos.extend(page)
+        return videos[:max_videos]
+    finally:
+        for task in page_tasks:
+            task.cancel()
+
+
+async def iter_lecture_videos(topic: str, max_videos: int = MAX_LECTURE_VIDEOS):
+    # Streaming variant: yields qualifying videos page by page and only issues
+    # the next search once the current page's details are in and the count is
+    # still short, so pages that would never be used cost no quota.
+    page_token = None
+    sent = 0
+    for page_no in range(SEARCH_PAGES):
+        search_data = await search_page(topic, page_token)
+        ids = [item["id"]["videoId"] for item in search_data.get("items", [])]
+        videos = await page_videos(ids, page_no) if ids else []
+        for video in videos:
+            yield video
+            sent += 1
+            if sent >= max_videos:
+                return
+        if not (page_token := search_data.get("nextPageToken")):
+            return
@@ -0,0 +1,11 @@
+import os
+
+
+def available_cores() -> int:
+    # Cores this process may run on (respects taskset/cgroup CPU affinity).
+    return len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+
+
+def default_pool_size() -> int:
+    # One worker per available core, minus one for the event loop.
+    return max(1, available_cores() - 1)
@@ -0,0 +1,65 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    # Coalesces concurrent calls with the same key onto one running task; every
+    # caller gets its result or exception. Callers await the task through
+    # asyncio.shield, so a caller that is cancelled (client went away) does
+    # not cancel the shared work for the others. The task is cancelled only
+    # when its last waiter leaves before it finishes.
+
+    def __init__(self, name: str):
+        self.name = name
+        self._flights = {}
+        self.counters = {"calls": 0, "executions": 0, "coalesced": 0, "abandoned": 0, "errors": 0}
+        _registry[name] = self
+
+    def stats(self) -> dict:
+        return {**self.counters, "in_flight": len(self._flights)}
+
+    async def do(self, key, fn, *args):
+        self.counters["calls"] += 1
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.create_task(fn(*args)))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda task: self._finished(key, flight, task))
+            self.counters["executions"] += 1
+        else:
+            self.counters["coalesced"] += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                self._forget(key, flight)
+                flight.task.cancel()
+                self.counters["abandoned"] += 1
+
+    def _forget(self, key, flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def _finished(self, key, flight, task):
+        self._forget(key, flight)
+        if not task.cancelled() and task.exception() is not None:
+            self.counters["errors"] += 1
+
+
+def singleflight_stats() -> dict:
+    return {name: flight.stats() for name, flight in _registry.items()}
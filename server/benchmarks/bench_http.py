@@ -0,0 +1,159 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import httpx
+
+from app.utils.cpu import available_cores
+
+# Usage (from the server directory; needs gunicorn and the app's dependencies):
+#   python -m benchmarks.bench_http --workers 1,2,4 --output http_scaling.json
+#   python -m benchmarks.bench_http --workers 1,2 --path /api/generate-lecture/cache-stats --env GEMINI_FAKE=1
+#
+# For each worker count a gunicorn pool (gunicorn.conf.py) is started on a
+# free local port, waited on until /readyz passes, and driven for --seconds
+# per path by --concurrency keep-alive clients. Requests/s, p50 and p95 are
+# recorded per worker count; run it on the target hardware, since scaling
+# depends on its core count and on what else shares the host.
+
+DEFAULT_ROUTERS = "auth,lectures,qa,stress_trends,retell_call,admin"
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(samples, q):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def _start_pool(workers, routers, extra_env):
+    port = _free_port()
+    env = dict(os.environ, **extra_env, WEB_WORKERS=str(workers), ENABLED_ROUTERS=routers,
+               WEB_BIND=f"127.0.0.1:{port}", PROMETHEUS_MULTIPROC_DIR=tempfile.mkdtemp(prefix="bench-metrics-"))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "main:app", "-c", "gunicorn.conf.py", "--log-level", "warning"],
+        env=env
+    )
+    return process, f"http://127.0.0.1:{port}"
+
+
+def _wait_ready(process, base_url, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with code {process.returncode}")
+        try:
+            if httpx.get(f"{base_url}/readyz", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{base_url} not ready after {timeout}s")
+
+
+async def _drive(url, concurrency, seconds):
+    latencies = []
+    errors = 0
+    deadline = time.monotonic() + seconds
+
+    async def client_loop(client):
+        nonlocal errors
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                response = await client.get(url)
+                if response.status_code >= 500:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies_ms = [l * 1000 for l in latencies]
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies_ms), 3) if latencies_ms else None,
+        "p95_ms": round(_percentile(latencies_ms, 0.95), 3) if latencies_ms else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of the production server per worker count.")
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--path", action="append", help="path to request (repeatable, default /healthz)")
+    parser.add_argument("--routers", default=DEFAULT_ROUTERS, help="ENABLED_ROUTERS for the pool")
+    parser.add_argument("--env", action="append", default=[], help="extra KEY=VALUE for the server")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--warmup-seconds", type=float, default=2)
+    parser.add_argument("--ready-timeout", type=float, default=120)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    paths = args.path or ["/healthz"]
+    extra_env = dict(item.split("=", 1) for item in args.env)
+    cores = available_cores()
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cores": cores,
+            "concurrency": args.concurrency,
+            "seconds": args.seconds,
+            "routers": args.routers,
+        },
+        "runs": {},
+    }
+    if any(int(w) > cores for w in args.workers.split(",")):
+        print(f"Note: only {cores} core(s) available; larger pools can't scale here.")
+
+    for workers in (int(w) for w in args.workers.split(",")):
+        process, base_url = _start_pool(workers, args.routers, extra_env)
+        try:
+            _wait_ready(process, base_url, args.ready_timeout)
+            run = {}
+            for path in paths:
+                asyncio.run(_drive(base_url + path, args.concurrency, args.warmup_seconds))
+                run[path] = asyncio.run(_drive(base_url + path, args.concurrency, args.seconds))
+                print(f"{workers} worker(s) {path}: {run[path]}")
+            results["runs"][str(workers)] = run
+        finally:
+            process.terminate()
+            process.wait()
+
+    base = results["runs"].get(args.workers.split(",")[0])
+    if base:
+        for workers, run in results["runs"].items():
+            for path, stats in run.items():
+                if base[path]["requests_per_second"]:
+                    stats["speedup"] = round(stats["requests_per_second"] / base[path]["requests_per_second"], 2)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+# Usage (from the server directory):
+#   python -m benchmarks.bench_stress --output bench_results.json
+#   python -m benchmarks.bench_stress --baseline                          # compare with benchmarks/baseline.json
+#   python -m benchmarks.bench_stress --output benchmarks/baseline.json   # refresh the baseline
+#
+# The comparison is opt-in. Absolute timings depend on the host, so it is
+# skipped with a warning when the baseline's "meta" (machine, cpu_count,
+# DeepFace stub or real) differs from this run; refresh the baseline on the
+# CI or target machine before relying on the exit code.
+#
+# Every stage is timed on its own with synthetic data, so the suite runs
+# offline. DeepFace is replaced by benchmarks/stubs unless --real-deepface is
+# given; the localization stage then measures tracking/bookkeeping only.
+
+FPS_VALUES = (10, 15, 30)
+TRACE_SECONDS = (None, 10, 60, 600) # None = 30 frames, the endpoint minimum
+FRAME_SECONDS = (None, 10, 60)
+FULL_FRAME_SECONDS = FRAME_SECONDS + (600,)
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+STAGES = ("base64_decode", "face_localization", "roi_extraction", "heart_metrics", "endpoint")
+
+
+def _frame_count(fps, seconds):
+    return 30 if seconds is None else int(fps * seconds)
+
+
+def _label(fps, seconds):
+    return f"{fps}fps/{'30frames' if seconds is None else f'{seconds}s'}"
+
+
+def _percentile(samples, q):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def _measure(run, repeats):
+    # Returns per-run wall times in ms plus the tracemalloc peak of one extra
+    # run (tracing is kept out of the timed runs).
+    timings = []
+    for _ in range(repeats):
+        gc.collect()
+        elapsed = run()
+        timings.append(elapsed * 1000)
+    gc.collect()
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "n": repeats,
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(_percentile(timings, 0.95), 3),
+        "peak_mem_kb": round(peak / 1024, 1),
+    }
+
+
+class _FixedBox:
+    # Stands in for FaceLocalizer so ROI extraction is timed without tracking.
+
+    def __init__(self, box):
+        self.box = box
+
+    def locate(self, image_array, frame_no=None, channel_order="RGB"):
+        return self.box
+
+
+def bench_stage(stage, fps, seconds, repeats, synthetic, stress_analysis, heart_metrics, client):
+    n_frames = _frame_count(fps, seconds)
+
+    if stage == "heart_metrics":
+        trace = synthetic.ppg_trace(fps, n_frames)
+        calculator = heart_metrics.HeartMetricsCalculator(fps=fps)
+
+        def run():
+            start = time.perf_counter()
+            calculator.estimate_heart_rate_from_intensities(trace)
+            return time.perf_counter() - start
+        return _measure(run, repeats)
+
+    jpegs = [synthetic.encode_jpeg(frame) for frame in synthetic.face_frames(fps, n_frames)]
+    data_urls = [synthetic.to_data_url(jpeg) for jpeg in jpegs]
+    del jpegs
+
+    if stage == "base64_decode":
+        def run():
+            start = time.perf_counter()
+            for url in data_urls:
+                stress_analysis.decode_data_url(url)
+            return time.perf_counter() - start
+        return _measure(run, repeats)
+
+    if stage == "face_localization":
+        def run():
+            localizer = stress_analysis.FaceLocalizer(mode="detect")
+            elapsed = 0.0
+            for i, url in enumerate(data_urls):
+                image_array = stress_analysis.decode_data_url(url)
+                start = time.perf_counter()
+                localizer.locate(image_array, i + 1)
+                elapsed += time.perf_counter() - start
+            return elapsed
+        return _measure(run, repeats)
+
+    if stage == "roi_extraction":
+        fixed = _FixedBox(synthetic.FACE_BOX)
+
+        def run():
+            elapsed = 0.0
+            for i, url in enumerate(data_urls):
+                image_array = stress_analysis.decode_data_url(url)
+                start = time.perf_counter()
+                stress_analysis.forehead_intensity(image_array, i + 1, fixed)
+                elapsed += time.perf_counter() - start
+            return elapsed
+        return _measure(run, repeats)
+
+    if stage == "endpoint":
+        payload = {"frames": data_urls}
+
+        def run():
+            start = time.perf_counter()
+            response = client.post("/analyze-stress", json=payload)
+            elapsed = time.perf_counter() - start
+            if response.status_code != 200 or "error" in response.json():
+                raise RuntimeError(f"Endpoint failed: {response.status_code} {response.text[:200]}")
+            return elapsed
+        return _measure(run, repeats)
+
+    raise ValueError(f"Unknown stage {stage}")
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    regressions = []
+    for key, current in sorted(results.items()):
+        previous = baseline.get(key)
+        if not previous:
+            continue
+        limit = previous["p50_ms"] * (1 + tolerance)
+        if current["p50_ms"] > limit and current["p50_ms"] - previous["p50_ms"] > min_delta_ms:
+            regressions.append((key, previous["p50_ms"], current["p50_ms"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the stress analysis pipeline on synthetic data.")
+    parser.add_argument("--stages", default=",".join(STAGES), help="Comma-separated subset of: " + ", ".join(STAGES))
+    parser.add_argument("--fps", default=",".join(map(str, FPS_VALUES)))
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--full", action="store_true", help="Also run frame-based stages on 10-minute captures.")
+    parser.add_argument("--real-deepface", action="store_true", help="Use the installed DeepFace instead of the offline stub.")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", nargs="?", const=DEFAULT_BASELINE, default=None,
+                        help="Compare with this baseline JSON (default benchmarks/baseline.json); exits 1 on regressions.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed p50 slowdown vs. baseline (fraction).")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="Ignore regressions smaller than this.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.ERROR)
+    if not args.real_deepface:
+        # Spawned stress workers inherit sys.path, so they pick up the stub too.
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "stubs"))
+
+    from benchmarks import synthetic
+    from app.services import heart_metrics, stress_analysis
+    from app.services.stress_pool import stress_pool
+
+    stages = [s for s in args.stages.split(",") if s]
+    fps_values = [int(f) for f in args.fps.split(",") if f]
+
+    client = None
+    if "endpoint" in stages:
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from app.api import stress
+
+        app = FastAPI()
+        app.include_router(stress.router)
+        client = TestClient(app)
+        stress_pool.start()
+        warmup = [synthetic.to_data_url(synthetic.encode_jpeg(f)) for f in synthetic.face_frames(10, 30)]
+        client.post("/analyze-stress", json={"frames": warmup})
+
+    results = {}
+    try:
+        for stage in stages:
+            if stage not in STAGES:
+                parser.error(f"Unknown stage {stage}")
+            lengths = TRACE_SECONDS if stage == "heart_metrics" else (FULL_FRAME_SECONDS if args.full else FRAME_SECONDS)
+            for fps in fps_values:
+                for seconds in lengths:
+                    key = f"{stage}/{_label(fps, seconds)}"
+                    results[key] = bench_stage(stage, fps, seconds, args.repeats, synthetic, stress_analysis, heart_metrics, client)
+                    r = results[key]
+                    print(f"{key:<45} p50 {r['p50_ms']:>10.2f} ms  p95 {r['p95_ms']:>10.2f} ms  peak {r['peak_mem_kb']:>10.1f} KiB")
+    finally:
+        stress_pool.shutdown()
+
+    report = {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "repeats": args.repeats,
+            "deepface": "real" if args.real_deepface else "stub",
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.baseline and os.path.abspath(args.baseline) != os.path.abspath(args.output):
+        with open(args.baseline) as f:
+            stored = json.load(f)
+        baseline = stored["results"]
+        host = {k: stored["meta"].get(k) for k in ("machine", "cpu_count", "deepface")}
+        current = {k: report["meta"][k] for k in host}
+        if host != current:
+            print(f"WARNING: skipping the comparison; {args.baseline} was recorded on {host}, this run is {current}. "
+                  f"Refresh the baseline on this host to compare.")
+            return 0
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+        for key, before, after in regressions:
+            print(f"REGRESSION {key}: p50 {before:.2f} ms -> {after:.2f} ms")
+        if regressions:
+            return 1
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%}).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
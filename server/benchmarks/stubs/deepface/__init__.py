@@ -0,0 +1,17 @@
+# Offline stand-in for the deepface package used by the benchmarks. It returns
+# the face box drawn by benchmarks.synthetic.face_frame so that the decode, ROI,
+# tracking and heart-metric stages can be timed without model weights.
+from benchmarks.synthetic import FACE_BOX
+
+
+class DeepFace:
+
+    @staticmethod
+    def extract_faces(img_path, **kwargs):
+        x, y, w, h = FACE_BOX
+        return [{"facial_area": {"x": x, "y": y, "w": w, "h": h}, "confidence": 0.99}]
+
+    @staticmethod
+    def analyze(img_path, **kwargs):
+        x, y, w, h = FACE_BOX
+        return [{"region": {"x": x, "y": y, "w": w, "h": h}, "dominant_emotion": "neutral"}]
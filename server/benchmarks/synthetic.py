@@ -0,0 +1,43 @@
+import base64
+import cv2
+import numpy as np
+
+FRAME_SIZE = (480, 640) # height, width of a typical webcam capture
+FACE_BOX = (220, 120, 200, 240) # x, y, w, h of the synthetic face
+
+
+def ppg_trace(fps, n_frames, heart_rate_bpm=72, noise=0.3, drift=0.02, seed=0):
+    # Green-channel forehead intensity: slow lighting drift, a pulse with mild
+    # respiratory modulation of the beat interval, and sensor noise.
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_frames) / fps
+    phase = 2 * np.pi * (heart_rate_bpm / 60) * t + 0.3 * np.sin(2 * np.pi * 0.25 * t)
+    return 120 + drift * t + np.sin(phase) + noise * rng.standard_normal(n_frames)
+
+
+def face_frame(intensity, rng):
+    height, width = FRAME_SIZE
+    frame = np.full((height, width, 3), 60, dtype=np.uint8)
+    frame += rng.integers(0, 8, size=frame.shape, dtype=np.uint8)
+    x, y, w, h = FACE_BOX
+    center = (x + w // 2, y + h // 2)
+    cv2.ellipse(frame, center, (w // 2, h // 2), 0, 0, 360, (150, int(np.clip(intensity, 0, 255)), 170), -1)
+    cv2.circle(frame, (x + w // 3, y + h // 2), 12, (40, 40, 40), -1)
+    cv2.circle(frame, (x + 2 * w // 3, y + h // 2), 12, (40, 40, 40), -1)
+    return frame
+
+
+def face_frames(fps, n_frames, seed=0):
+    rng = np.random.default_rng(seed)
+    return [face_frame(value, rng) for value in ppg_trace(fps, n_frames, seed=seed)]
+
+
+def encode_jpeg(frame, quality=80):
+    ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise RuntimeError("JPEG encoding failed")
+    return encoded.tobytes()
+
+
+def to_data_url(jpeg_bytes):
+    return "data:image/jpeg;base64," + base64.b64encode(jpeg_bytes).decode()
@@ -0,0 +1,53 @@
+import glob
+import os
+import tempfile
+
+from app.core.config import (
+    PORT, WEB_WORKERS, WEB_PRELOAD, WEB_GRACEFUL_TIMEOUT, WEB_TIMEOUT, WEB_KEEPALIVE, WEB_MAX_REQUESTS,
+    UPSTREAM_BUDGET_PROCESSES
+)
+from app.utils.cpu import available_cores
+
+# Production server config (from the server directory):
+#   gunicorn main:app -c gunicorn.conf.py
+# serve.py starts one such pool per route class; see DEPLOYMENT.md.
+
+# prometheus_client picks its multiprocess mode at import time, so the
+# directory has to be in the environment before the app is loaded.
+if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="intellectai-metrics-")
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+
+bind = os.getenv("WEB_BIND", f"0.0.0.0:{PORT}")
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = WEB_WORKERS if WEB_WORKERS > 0 else available_cores()
+# With preload the app modules are imported once in the master and shared
+# copy-on-write; each worker still runs the lifespan (DB client, pools) itself.
+preload_app = WEB_PRELOAD
+graceful_timeout = WEB_GRACEFUL_TIMEOUT
+timeout = WEB_TIMEOUT
+keepalive = WEB_KEEPALIVE
+max_requests = WEB_MAX_REQUESTS
+max_requests_jitter = WEB_MAX_REQUESTS // 10
+
+
+def on_starting(server):
+    # Files left by a previous run would be summed into the new counters.
+    for path in glob.glob(os.path.join(os.environ["PROMETHEUS_MULTIPROC_DIR"], "*.db")):
+        os.remove(path)
+
+
+def post_fork(server, worker):
+    # Upstream quota budgets are kept per process; split them so the pool as
+    # a whole stays within the API keys' quotas. server.cfg.workers includes
+    # a -w given on the command line.
+    from app.services.upstream_scheduler import share_budgets
+
+    share_budgets(UPSTREAM_BUDGET_PROCESSES or server.cfg.workers)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,19 +1,91 @@
+import time
+_import_started = time.perf_counter()
+
+import asyncio
+import importlib
 import logging
+from contextlib import asynccontextmanager
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
-from app.core.config import PORT
-from app.api import auth, lectures, qa, stress
+from app.core.config import PORT, ENABLED_ROUTERS, STRESS_WARMUP, STRESS_WARMUP_TIMEOUT, WEB_GRACEFUL_TIMEOUT
+from app.core.metrics import MetricsMiddleware, metrics_response
+from app.core.startup import startup
+from app.db.setup import init_db, close_db, ensure_indexes
+from app.services.http_client import init_http_client, close_http_client
+from app.services.password_hasher import password_hasher
+from app.services.stress_pool import stress_pool
+from app.services.gemini import init_gemini
+from app.services.call_jobs import call_jobs
+from app.services.retell import init_retell
+from app.utils.singleflight import singleflight_stats
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+# Router modules by name. Only the ENABLED_ROUTERS are imported, so a replica
+# that serves auth never loads the Q&A or stress dependencies.
+ROUTER_TAGS = {
+    "auth": "Authentication",
+    "lectures": "Lectures",
+    "qa": "Q&A",
+    "stress": "Stress Analysis",
+    "stress_trends": "Stress Trends",
+    "retell_call": "Retell Call",
+    "admin": "Admin",
+}
+
+
+async def _warm_up():
+    try:
+        if "stress" in ENABLED_ROUTERS and STRESS_WARMUP:
+            with startup.phase("stress_warmup"):
+                workers = await stress_pool.warm_up(timeout=STRESS_WARMUP_TIMEOUT)
+            logger.info(f"Stress warm-up finished; {workers} worker(s) confirmed the face detector loaded.")
+        startup.ready = True
+    except Exception as e:
+        logger.error(f"Warm-up failed; /readyz stays unavailable: {str(e)}", exc_info=True)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    with startup.phase("init"):
+        init_http_client()
+        if "qa" in ENABLED_ROUTERS:
+            init_gemini()
+        init_db()
+        # Failing steps are logged one by one; the app still runs without them.
+        await ensure_indexes()
+        password_hasher.start()
+        if "stress" in ENABLED_ROUTERS:
+            stress_pool.start()
+        if "retell_call" in ENABLED_ROUTERS:
+            init_retell()
+            call_jobs.start()
+    # Warm-up runs after startup so /healthz answers while models load;
+    # /readyz only passes once it is done.
+    warm_up = asyncio.create_task(_warm_up())
+    yield
+    # Fail readiness first so the balancer stops sending traffic while
+    # in-flight work drains (gunicorn allows WEB_GRACEFUL_TIMEOUT for all of it).
+    startup.ready = False
+    warm_up.cancel()
+    await call_jobs.shutdown(timeout=WEB_GRACEFUL_TIMEOUT / 2)
+    stress_pool.shutdown()
+    password_hasher.shutdown()
+    await close_http_client()
+    close_db()
+
+
 app = FastAPI(
     title="EduFocus API",
     description="API for EduFocus application, providing lecture generation, Q&A, and stress analysis.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -25,16 +97,38 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+app.add_middleware(MetricsMiddleware)
+
 # API routers
-app.include_router(auth.router, tags=["Authentication"])
-app.include_router(lectures.router, tags=["Lectures"])
-app.include_router(qa.router, tags=["Q&A"])
-app.include_router(stress.router, tags=["Stress Analysis"])
+for name in ENABLED_ROUTERS:
+    if name not in ROUTER_TAGS:
+        logger.warning(f"Unknown router '{name}' in ENABLED_ROUTERS. Skipping it.")
+        continue
+    app.include_router(importlib.import_module(f"app.api.{name}").router, tags=[ROUTER_TAGS[name]])
+
+startup.record("import", time.perf_counter() - _import_started)
 
 @app.get("/", summary="Root endpoint", tags=["General"])
 async def root():
     return {"message": "Welcome to the EduFocus API!"}
 
+@app.get("/healthz", summary="Liveness: the process is up and serving", tags=["General"])
+async def healthz():
+    return {"status": "ok"}
+
+@app.get("/readyz", summary="Readiness: startup and warm-up have finished", tags=["General"])
+async def readyz():
+    return JSONResponse(startup.status(), status_code=200 if startup.ready else 503)
+
+@app.get("/metrics", summary="Prometheus metrics", tags=["General"], include_in_schema=False)
+async def metrics_endpoint():
+    return metrics_response()
+
+@app.get("/stats/singleflight", summary="How many requests were coalesced onto a shared upstream call", tags=["General"])
+async def singleflight_stats_endpoint():
+    return singleflight_stats()
+
 if __name__ == "__main__":
+    # Development server. In production use `python serve.py` (see DEPLOYMENT.md).
     logger.info(f"Starting Uvicorn server on port {PORT}")
-    uvicorn.run("app.main:app", host="0.0.0.0", port=PORT, reload=True)
\ No newline at end of file
+    uvicorn.run("main:app", host="0.0.0.0", port=PORT, reload=True)
\ No newline at end of file
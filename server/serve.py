@@ -0,0 +1,81 @@
+import argparse
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from app.core.config import PORT, STRESS_PORT, WEB_WORKERS, STRESS_WEB_WORKERS
+
+# Production launcher (from the server directory):
+#   python serve.py              # every pool
+#   python serve.py api          # one pool, e.g. one per container
+#
+# Each route class runs as its own gunicorn pool (gunicorn.conf.py) with
+# only its routers enabled, so CPU-bound stress analysis can't starve the
+# latency-sensitive auth/lecture/Q&A traffic. A proxy in front sends
+# /analyze-stress and /ws/analyze-stress to the stress pool, everything else
+# to the api pool. SIGTERM and SIGINT (Ctrl-C) drain the pools gracefully;
+# SIGHUP makes gunicorn replace its workers gracefully.
+
+POOLS = {
+    "api": {"routers": "auth,lectures,qa,stress_trends,retell_call,admin", "port": PORT, "workers": WEB_WORKERS},
+    "stress": {"routers": "stress", "port": STRESS_PORT, "workers": STRESS_WEB_WORKERS},
+}
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("serve")
+
+
+def pool_command(name: str) -> tuple[list[str], dict]:
+    pool = POOLS[name]
+    env = dict(os.environ, ENABLED_ROUTERS=pool["routers"], WEB_WORKERS=str(pool["workers"]),
+               WEB_BIND=f"0.0.0.0:{pool['port']}")
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        # One metrics directory per pool; each pool serves its own /metrics.
+        env["PROMETHEUS_MULTIPROC_DIR"] = os.path.join(os.environ["PROMETHEUS_MULTIPROC_DIR"], name)
+    return [sys.executable, "-m", "gunicorn", "main:app", "-c", "gunicorn.conf.py"], env
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the API in production mode.")
+    parser.add_argument("pools", nargs="*", help=f"pools to run: {', '.join(POOLS)} (default: all)")
+    args = parser.parse_args()
+    unknown = [name for name in args.pools if name not in POOLS]
+    if unknown:
+        parser.error(f"unknown pool(s): {', '.join(unknown)}")
+
+    processes = {}
+    for name in args.pools or POOLS:
+        command, env = pool_command(name)
+        logger.info(f"Starting pool '{name}' on port {POOLS[name]['port']} with routers {POOLS[name]['routers']}.")
+        # Own session: a terminal's Ctrl-C reaches only this launcher, never
+        # gunicorn directly (where SIGINT means a quick shutdown).
+        processes[name] = subprocess.Popen(command, env=env, start_new_session=True)
+
+    def forward(signum, _frame):
+        # Gunicorn treats SIGINT like SIGQUIT (drop in-flight requests); only
+        # SIGTERM is its graceful stop.
+        if signum == signal.SIGINT:
+            signum = signal.SIGTERM
+        for process in processes.values():
+            if process.poll() is None:
+                process.send_signal(signum)
+
+    for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+        signal.signal(signum, forward)
+
+    # When one pool exits, stop the others so a supervisor restarts the set.
+    while all(process.poll() is None for process in processes.values()):
+        time.sleep(0.5)
+    exited_name, code = next((name, p.returncode) for name, p in processes.items() if p.returncode is not None)
+    logger.info(f"Pool '{exited_name}' exited with code {code}. Stopping the others.")
+    forward(signal.SIGTERM, None)
+    for process in processes.values():
+        process.wait()
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+import os
+
+# Settings are read when app.core.config is imported: keep the tests offline,
+# on the fake Gemini and Retell clients, without fake call latency.
+os.environ.setdefault("DB_NAME", "intellectai_test")
+os.environ.setdefault("JWT_SECRET", "test-secret")
+os.environ.setdefault("GEMINI_FAKE", "1")
+os.environ.setdefault("RETELL_FAKE", "1")
+os.environ.setdefault("RETELL_FAKE_LATENCY_SECONDS", "0")
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from app.db import setup
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    # In-memory stand-in for the shared motor client.
+    monkeypatch.setattr(setup, "_client", AsyncMongoMockClient())
+    return setup.get_collection
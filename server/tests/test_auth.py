@@ -0,0 +1,106 @@
+import asyncio
+import threading
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app.core import security
+from app.core.security import create_token, decode_token
+from app.services.password_hasher import PasswordHasher, PasswordHasherBusy
+from app.utils.cache import TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(security, "_claims_cache", TTLCache(16, 300, clock=lambda: now[0]))
+    return now
+
+
+@pytest.fixture
+def reject_all(monkeypatch):
+    # After this, only cached claims can still be returned.
+    def enable():
+        def reject(*args, **kwargs):
+            raise security.JWTError("signature verification failed")
+        monkeypatch.setattr(security.jwt, "decode", reject)
+    return enable
+
+
+def test_claims_are_served_from_the_cache(clock, reject_all):
+    token = create_token({"sub": "alice", "email": "alice@example.com"})
+    assert decode_token(token).user_id == "alice"
+    reject_all()
+    assert decode_token(token).email == "alice@example.com"
+
+
+def test_cached_claims_never_outlive_the_token(clock, reject_all):
+    token = create_token({"sub": "alice"}, expires_delta=timedelta(seconds=30))
+    decode_token(token)
+    reject_all()
+    clock[0] += 20
+    assert decode_token(token).user_id == "alice"
+    clock[0] += 15 # past exp, though well within the cache's 300 s
+    with pytest.raises(HTTPException) as rejected:
+        decode_token(token)
+    assert rejected.value.status_code == 401
+
+
+@pytest.mark.parametrize("token", ["not-a-token", create_token({"email": "nobody@example.com"})])
+def test_invalid_tokens_are_rejected_and_not_cached(clock, token):
+    for _ in range(2):
+        with pytest.raises(HTTPException) as rejected:
+            decode_token(token)
+        assert rejected.value.status_code == 401
+    assert len(security._claims_cache) == 0
+
+
+def test_hash_and_verify():
+    async def scenario():
+        hasher = PasswordHasher(workers=1)
+        try:
+            hashed = await hasher.hash("correct horse")
+            return await hasher.verify("correct horse", hashed), await hasher.verify("wrong", hashed)
+        finally:
+            hasher.shutdown()
+
+    assert asyncio.run(scenario()) == (True, False)
+
+
+def test_queue_is_bounded():
+    release = threading.Event()
+
+    async def scenario():
+        hasher = PasswordHasher(workers=1, queue_depth=2, retry_after=7)
+        blocked = [asyncio.create_task(hasher._run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(PasswordHasherBusy) as busy:
+            await hasher._run(release.wait)
+        release.set()
+        await asyncio.gather(*blocked)
+        hasher.shutdown()
+        return busy.value, hasher.pending
+
+    busy, pending = asyncio.run(scenario())
+    assert busy.retry_after == 7 and pending == 0
+
+
+def test_timed_out_job_frees_its_slot_when_it_finishes():
+    release = threading.Event()
+
+    async def scenario():
+        hasher = PasswordHasher(workers=1, queue_depth=1, timeout=0.05)
+        with pytest.raises(asyncio.TimeoutError):
+            await hasher._run(release.wait)
+        # The thread is still busy, so the slot stays taken until it returns.
+        still_pending = hasher.pending
+        release.set()
+        for _ in range(100):
+            if hasher.pending == 0:
+                break
+            await asyncio.sleep(0.01)
+        hasher.shutdown()
+        return still_pending, hasher.pending
+
+    assert asyncio.run(scenario()) == (1, 0)
@@ -0,0 +1,169 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.db.setup import CALL_JOBS
+from app.services import retell
+from app.services.call_jobs import CallJobQueue, QUEUED, DISPATCHING, SUCCEEDED, FAILED
+
+REQUEST = {"to_number": "+15550100", "text_to_explain": "Photosynthesis", "topic": "Biology", "video_id": "vid1"}
+
+
+@pytest.fixture
+def fake_retell(mongo, monkeypatch):
+    asyncio.run(mongo(CALL_JOBS).create_index("idempotency_key", unique=True))
+    client = retell.FakeRetellClient()
+    monkeypatch.setattr(retell, "_client", client)
+    return client
+
+
+def _queue(**kwargs):
+    return CallJobQueue(dispatchers=0, **{"max_attempts": 3, "backoff_base": 0, **kwargs})
+
+
+async def _dispatch_due(queue):
+    job = await queue._claim()
+    assert job is not None
+    await queue._dispatch(job)
+    return await queue.get(job["_id"])
+
+
+def test_identical_requests_share_one_job(fake_retell):
+    async def scenario():
+        queue = _queue()
+        first, created = await queue.enqueue(REQUEST)
+        again, created_again = await queue.enqueue(dict(REQUEST))
+        keyed, created_keyed = await queue.enqueue(REQUEST, client_key="click-1")
+        keyed_again, created_keyed_again = await queue.enqueue({**REQUEST, "topic": "Other"}, client_key="click-1")
+        return first, created, again, created_again, keyed, created_keyed, keyed_again, created_keyed_again, queue
+
+    first, created, again, created_again, keyed, created_keyed, keyed_again, created_keyed_again, queue = asyncio.run(scenario())
+    assert created and not created_again and again["_id"] == first["_id"]
+    # A client key is its own identity, whatever the body says.
+    assert created_keyed and not created_keyed_again and keyed_again["_id"] == keyed["_id"] != first["_id"]
+    assert queue.counters["enqueued"] == 2 and queue.counters["deduplicated"] == 2
+
+
+def test_dispatch_places_the_call(fake_retell):
+    async def scenario():
+        queue = _queue()
+        await queue.enqueue(REQUEST)
+        return await _dispatch_due(queue)
+
+    job = asyncio.run(scenario())
+    assert job["status"] == SUCCEEDED and job["attempts"] == 1
+    assert [call["call_id"] for call in fake_retell.call.placed] == [job["call_id"]]
+    assert "lease_until" not in job
+
+
+def test_retryable_failures_are_retried_then_failed(fake_retell, monkeypatch):
+    monkeypatch.setattr(retell, "RETELL_FAKE_FAILURE_RATE", 1.0)
+
+    async def scenario():
+        queue = _queue(max_attempts=2)
+        await queue.enqueue(REQUEST)
+        retried = await _dispatch_due(queue)
+        failed = await _dispatch_due(queue)
+        return queue, retried, failed
+
+    queue, retried, failed = asyncio.run(scenario())
+    assert retried["status"] == QUEUED and retried["attempts"] == 1
+    assert retried["error"] == "Fake Retell service unavailable"
+    assert retried["next_attempt_at"] <= datetime.utcnow()
+    assert failed["status"] == FAILED and failed["attempts"] == 2
+    assert queue.counters["retried"] == 1 and queue.counters["failed"] == 1
+    assert fake_retell.call.placed == []
+
+
+def test_client_errors_are_not_retried(fake_retell, monkeypatch):
+    def reject(**kwargs):
+        raise retell.FakeRetellError(400, "Invalid number")
+
+    monkeypatch.setattr(fake_retell.call, "create_phone_call", reject)
+
+    async def scenario():
+        queue = _queue()
+        await queue.enqueue(REQUEST)
+        return await _dispatch_due(queue)
+
+    job = asyncio.run(scenario())
+    assert job["status"] == FAILED and job["attempts"] == 1 and job["error"] == "Invalid number"
+
+
+def test_expired_lease_fails_the_job_without_redialing(fake_retell):
+    async def scenario():
+        queue = _queue(lease_seconds=60)
+        job, _ = await queue.enqueue(REQUEST)
+        claimed = await queue._claim()
+        # The dispatching process died: its lease runs out with the call unknown.
+        await queue.collection.update_one({"_id": job["_id"]}, {"$set": {"lease_until": datetime.utcnow() - timedelta(seconds=1)}})
+        await queue._expire_leases()
+        return queue, claimed, await queue.get(job["_id"]), await queue._claim()
+
+    queue, claimed, expired, reclaimed = asyncio.run(scenario())
+    assert claimed["status"] == DISPATCHING and "lease_until" in claimed
+    assert expired["status"] == FAILED and "lease_until" not in expired
+    assert reclaimed is None
+    assert queue.counters["lease_expired"] == 1
+    assert fake_retell.call.placed == []
+
+
+def test_live_lease_is_left_alone(fake_retell):
+    async def scenario():
+        queue = _queue(lease_seconds=60)
+        job, _ = await queue.enqueue(REQUEST)
+        await queue._claim()
+        await queue._expire_leases()
+        return await queue.get(job["_id"])
+
+    assert asyncio.run(scenario())["status"] == DISPATCHING
+
+
+def test_dispatchers_drain_the_queue(fake_retell):
+    async def scenario():
+        queue = CallJobQueue(dispatchers=2, poll_seconds=0.05)
+        queue.start()
+        jobs = [(await queue.enqueue({**REQUEST, "to_number": f"+1555010{n}"}))[0] for n in range(3)]
+        for _ in range(100):
+            statuses = [(await queue.get(job["_id"]))["status"] for job in jobs]
+            if all(status == SUCCEEDED for status in statuses):
+                break
+            await asyncio.sleep(0.02)
+        await queue.shutdown(timeout=1)
+        return statuses
+
+    assert asyncio.run(scenario()) == [SUCCEEDED] * 3
+    assert len(fake_retell.call.placed) == 3
+
+
+def test_a_failed_call_can_be_requested_again(fake_retell, monkeypatch):
+    monkeypatch.setattr(retell, "RETELL_FAKE_FAILURE_RATE", 1.0)
+
+    async def scenario():
+        queue = _queue(max_attempts=1)
+        first, _ = await queue.enqueue(REQUEST, client_key="click-1")
+        failed = await _dispatch_due(queue)
+        monkeypatch.setattr(retell, "RETELL_FAKE_FAILURE_RATE", 0.0)
+        again, created = await queue.enqueue(REQUEST, client_key="click-1")
+        duplicate, created_duplicate = await queue.enqueue(REQUEST, client_key="click-1")
+        return first, failed, again, created, duplicate, created_duplicate, await _dispatch_due(queue)
+
+    first, failed, again, created, duplicate, created_duplicate, placed = asyncio.run(scenario())
+    assert failed["status"] == FAILED
+    assert created and again["_id"] != first["_id"]
+    assert not created_duplicate and duplicate["_id"] == again["_id"]
+    assert placed["_id"] == again["_id"] and placed["status"] == SUCCEEDED
+
+
+def test_an_expired_lease_releases_the_request(fake_retell):
+    async def scenario():
+        queue = _queue(lease_seconds=60)
+        job, _ = await queue.enqueue(REQUEST)
+        await queue._claim()
+        await queue.collection.update_one({"_id": job["_id"]}, {"$set": {"lease_until": datetime.utcnow() - timedelta(seconds=1)}})
+        await queue._expire_leases()
+        return job, await queue.enqueue(REQUEST)
+
+    job, (again, created) = asyncio.run(scenario())
+    assert created and again["_id"] != job["_id"]
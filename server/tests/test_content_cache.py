@@ -0,0 +1,92 @@
+import asyncio
+import zlib
+from datetime import datetime
+
+import pytest
+from youtube_transcript_api import CouldNotRetrieveTranscript
+
+from app.api import qa
+from app.db.setup import CONTENT_CACHE
+from app.services.content_cache import ContentCache
+
+TRANSCRIPT = [{"text": f"Chlorophyll absorbs light in step {n}.", "start": n * 4.0, "duration": 4.0} for n in range(200)]
+
+
+class _Loader:
+    def __init__(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.calls = []
+
+    def __call__(self, key):
+        self.calls.append(key)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def _cache(**kwargs):
+    # Each instance stands for one worker process sharing the Mongo tier.
+    return ContentCache("transcript", CONTENT_CACHE, 3600, negative_ttl_seconds=60,
+                        negative_errors=(CouldNotRetrieveTranscript,), freeze=lambda e: {"reason": str(e)},
+                        thaw=lambda video_id, error: CouldNotRetrieveTranscript(video_id), **kwargs)
+
+
+def test_values_round_trip_compressed(mongo):
+    async def scenario():
+        first, load = _cache(), _Loader(TRANSCRIPT)
+        loaded = await first.get_or_load("vid1", load)
+        cached = await first.get_or_load("vid1", load)
+        shared = await _cache().get_or_load("vid1", load)
+        return first, load, loaded, cached, shared, await mongo(CONTENT_CACHE).find_one({"_id": "transcript:vid1"})
+
+    first, load, loaded, cached, shared, doc = asyncio.run(scenario())
+    assert load.calls == ["vid1"]
+    assert loaded == cached == shared == TRANSCRIPT
+    assert zlib.decompress(doc["data"]).startswith(b'{"value":') and not doc["negative"]
+    assert first.stats()["compression_ratio"] < 0.5
+
+
+def test_missing_transcript_is_cached_for_the_negative_ttl(mongo):
+    async def scenario():
+        load = _Loader(error=CouldNotRetrieveTranscript("vid1"))
+        for cache in (_cache(), _cache()):
+            for _ in range(2):
+                with pytest.raises(CouldNotRetrieveTranscript):
+                    await cache.get_or_load("vid1", load)
+        return load, await mongo(CONTENT_CACHE).find_one({"_id": "transcript:vid1"})
+
+    load, doc = asyncio.run(scenario())
+    assert load.calls == ["vid1"]
+    assert doc["negative"]
+    assert 50 < (doc["expires_at"] - datetime.utcnow()).total_seconds() <= 60
+
+
+def test_other_errors_are_not_cached(mongo):
+    async def scenario():
+        cache, load = _cache(), _Loader(error=RuntimeError("timeout"))
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await cache.get_or_load("vid1", load)
+        return cache, load
+
+    cache, load = asyncio.run(scenario())
+    assert len(load.calls) == 2 and cache.counters["load_errors"] == 2
+
+
+def test_wikipedia_topics_share_one_entry(mongo, monkeypatch):
+    looked_up = []
+
+    def summary(topic):
+        looked_up.append(topic)
+        return "Photosynthesis converts light energy into chemical energy."
+
+    monkeypatch.setattr(qa, "wikipedia_cache", ContentCache("wikipedia", CONTENT_CACHE, 3600))
+    monkeypatch.setattr(qa, "_wikipedia_summary", summary)
+
+    async def scenario():
+        return [await qa._wikipedia_context(topic) for topic in ("Photosynthesis", "photosynthesis ", "PHOTOSYNTHESIS")]
+
+    contexts = asyncio.run(scenario())
+    assert looked_up == ["Photosynthesis"]
+    assert len(set(contexts)) == 1
@@ -0,0 +1,39 @@
+import asyncio
+
+from pymongo.errors import ServerSelectionTimeoutError
+
+from app.db import setup
+
+
+def test_a_failing_step_does_not_skip_later_indexes(mongo, monkeypatch):
+    users = mongo(setup.USERS)
+    original = type(users).create_index
+
+    async def failing_create_index(self, keys, **kwargs):
+        if self.name == setup.USERS and keys == "email":
+            raise RuntimeError("duplicate key")
+        return await original(self, keys, **kwargs)
+
+    monkeypatch.setattr(type(users), "create_index", failing_create_index)
+    failed = asyncio.run(setup.ensure_indexes())
+
+    # mongomock has no time-series collections, so that step fails too.
+    assert failed == ["users.email", "stress_samples"]
+    call_job_indexes = asyncio.run(mongo(setup.CALL_JOBS).index_information())
+    assert any(index["key"] == [("idempotency_key", 1)] and index.get("unique") for index in call_job_indexes.values())
+    assert "stress_aggregates" in asyncio.run(mongo(setup.STRESS_AGGREGATES).database.list_collection_names())
+
+
+def test_unreachable_server_skips_the_remaining_steps(mongo, monkeypatch):
+    users = mongo(setup.USERS)
+    attempts = []
+
+    async def unreachable(self, keys, **kwargs):
+        attempts.append(keys)
+        raise ServerSelectionTimeoutError("localhost:27017: connection refused")
+
+    monkeypatch.setattr(type(users), "create_index", unreachable)
+    failed = asyncio.run(setup.ensure_indexes())
+
+    assert len(attempts) == 1
+    assert failed[0] == "users.email" and failed[-1] == "stress_samples" and len(failed) == 10
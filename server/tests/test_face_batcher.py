@@ -0,0 +1,68 @@
+import sys
+import threading
+import time
+from types import SimpleNamespace
+from multiprocessing.connection import Listener
+
+import numpy as np
+import pytest
+
+from app.services import face_batcher
+from app.services.face_tracking import FaceLocalizer
+
+AUTHKEY = b"test"
+
+
+@pytest.fixture
+def stuck_batcher():
+    # Accepts the worker and reads its frames, but never answers.
+    listener = Listener(("127.0.0.1", 0), authkey=AUTHKEY)
+    received = []
+
+    def serve():
+        connection = listener.accept()
+        try:
+            while True:
+                received.append(connection.recv())
+        except (EOFError, OSError):
+            received.append("closed")
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    yield listener.address, received
+    listener.close()
+
+
+def test_detect_times_out_and_closes_the_connection(stuck_batcher, monkeypatch):
+    address, received = stuck_batcher
+    monkeypatch.setattr(face_batcher, "_detector", face_batcher.BatchedDetector(address, AUTHKEY, result_timeout=0.1))
+    detector = face_batcher.batched_detector()
+
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        detector.detect(np.zeros((120, 160, 3), dtype=np.uint8))
+    assert time.monotonic() - started < 2
+
+    face_batcher.disconnect()
+    assert face_batcher.batched_detector() is None
+    for _ in range(100):
+        if received and received[-1] == "closed":
+            break
+        time.sleep(0.01)
+    assert received[0][0] == "detect" and received[-1] == "closed"
+
+
+def test_localizer_falls_back_to_per_frame_detection(stuck_batcher, monkeypatch):
+    address, _ = stuck_batcher
+    monkeypatch.setattr(face_batcher, "_detector", face_batcher.BatchedDetector(address, AUTHKEY, result_timeout=0.1))
+    per_frame = SimpleNamespace(extract_faces=lambda **kwargs: [{"confidence": 0.99, "facial_area": {"x": 10, "y": 20, "w": 40, "h": 50}}])
+    monkeypatch.setitem(sys.modules, "deepface", SimpleNamespace(DeepFace=per_frame))
+
+    localizer = FaceLocalizer(mode="detect")
+    frame = np.zeros((120, 160, 3), dtype=np.uint8)
+    assert localizer._detect(frame, 1) == (10, 20, 40, 50)
+    assert face_batcher.batched_detector() is None
+    # Later frames go straight to per-frame detection.
+    started = time.monotonic()
+    assert localizer._detect(frame, 2) == (10, 20, 40, 50)
+    assert time.monotonic() - started < 0.1
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from app.services.frame_quality import FrameQualityGate
+
+SIZE = (480, 640)
+
+
+def _textured(seed=0):
+    # Random 40-px tiles: mid brightness, strong contrast and sharp edges.
+    rng = np.random.default_rng(seed)
+    tiles = rng.integers(60, 200, size=(SIZE[0] // 40, SIZE[1] // 40), dtype=np.uint8)
+    gray = np.kron(tiles, np.ones((40, 40), dtype=np.uint8))
+    return np.repeat(gray[:, :, None], 3, axis=2)
+
+
+def _flat(level):
+    return np.full((*SIZE, 3), level, dtype=np.uint8)
+
+
+def _ramp():
+    # Plenty of contrast but no edges: a defocused view.
+    row = np.linspace(40, 200, SIZE[1]).astype(np.uint8)
+    return np.repeat(np.tile(row, (SIZE[0], 1))[:, :, None], 3, axis=2)
+
+
+def test_normal_frames_pass():
+    gate = FrameQualityGate(enabled=True)
+    assert [gate.check(_textured(seed)) for seed in range(3)] == [None, None, None]
+    assert gate.stats()["checked_frames"] == 3 and gate.stats()["rejected_frames"] == 0
+
+
+@pytest.mark.parametrize("frame, reason", [
+    (_flat(0), "too_dark"),
+    (_flat(250), "overexposed"),
+    (_flat(128), "low_contrast"),
+    (_ramp(), "blurry"),
+])
+def test_unusable_frames_are_rejected(frame, reason):
+    gate = FrameQualityGate(enabled=True)
+    assert gate.check(frame) == reason
+    stats = gate.stats()
+    assert stats["rejected_frames"] == 1 and stats["rejected_by_reason"][reason] == 1
+
+
+def test_repeated_frame_is_a_duplicate():
+    gate = FrameQualityGate(enabled=True)
+    frame = _textured()
+    assert gate.check(frame) is None
+    assert gate.check(frame.copy(), "BGR") == "duplicate"
+    assert gate.check(_textured(seed=1)) is None
+    assert gate.stats()["rejected_by_reason"]["duplicate"] == 1
+
+
+def test_disabled_gate_passes_everything():
+    gate = FrameQualityGate(enabled=False)
+    assert gate.check(_flat(0)) is None
+    assert gate.stats()["checked_frames"] == 0
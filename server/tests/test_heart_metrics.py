@@ -0,0 +1,82 @@
+import itertools
+
+import numpy as np
+import pytest
+from scipy.signal import butter, detrend, filtfilt, find_peaks
+
+from app.services.heart_metrics import HeartMetricsCalculator
+from benchmarks.synthetic import ppg_trace
+
+# Parity of the vectorized calculator with the implementation it replaced,
+# on a seeded synthetic corpus. sosfiltfilt and filtfilt(b, a) round
+# differently, so float outputs are compared with a tolerance; the discrete
+# steps (peak positions) must agree for the metrics to match within it.
+RTOL = 1e-6
+ATOL = 1e-9
+
+FPS = (10, 15, 30)
+SECONDS = (3.4, 10, 60, 600)
+NOISE = (0.0, 0.3, 1.0, 3.0)
+SEEDS = (0, 1)
+
+
+def _corpus():
+    cases = []
+    for fps, seconds, noise, seed in itertools.product(FPS, SECONDS, NOISE, SEEDS):
+        heart_rate = 55 + 10 * ((fps + int(seconds) + seed) % 6)
+        cases.append(pytest.param(fps, ppg_trace(fps, int(seconds * fps), heart_rate_bpm=heart_rate, noise=noise, seed=seed),
+                                  id=f"{fps}fps-{seconds}s-noise{noise}-seed{seed}"))
+    return cases
+
+
+def baseline_metrics(intensity_over_time, fps):
+    # The pre-vectorization HeartMetricsCalculator.estimate_heart_rate_from_intensities.
+    calculator = HeartMetricsCalculator(fps=fps)
+    nyquist = 0.5 * fps
+    b, a = butter(5, [0.5 / nyquist, 3 / nyquist], btype='band')
+    filtered_signal = filtfilt(b, a, detrend(intensity_over_time))
+    ma_window_size = max(1, int(fps / 3.0))
+    smoothed_signal = np.convolve(filtered_signal, np.ones(ma_window_size) / ma_window_size, mode='valid')
+
+    heart_rates_list = []
+    for start in range(0, len(smoothed_signal) - calculator.window_length + 1, calculator.step_size):
+        segment = smoothed_signal[start:start + calculator.window_length]
+        if np.max(segment) == np.min(segment) and np.max(segment) == 0:
+            continue
+        if np.max(segment) == np.min(segment):
+            peaks, _ = find_peaks(segment, distance=max(1, int(fps / 3.0)))
+        else:
+            peaks, _ = find_peaks(segment, distance=max(1, int(fps / 3.0)), height=np.max(segment) * 0.6)
+        if len(peaks) > 1:
+            heart_rate = calculator.calculate_heart_rate(peaks, fps)
+            if heart_rate > 0:
+                heart_rates_list.append(heart_rate)
+    avg_heart_rate = sum(heart_rates_list) / len(heart_rates_list) if heart_rates_list else 0
+
+    all_peaks_height = np.max(filtered_signal) * 0.6 if np.max(filtered_signal) > 0 else 0
+    all_peaks, _ = find_peaks(filtered_signal, distance=max(1, int(fps / 3.0)), height=all_peaks_height)
+    if len(all_peaks) < 2:
+        return avg_heart_rate, 0, 0, 0, 0
+    return (avg_heart_rate, *calculator.compute_hrv(calculator.compute_IBI(all_peaks, fps)))
+
+
+@pytest.mark.parametrize("fps, trace", _corpus())
+def test_matches_baseline(fps, trace):
+    expected = baseline_metrics(trace, fps)
+    actual = HeartMetricsCalculator(fps=fps).estimate_heart_rate_from_intensities(trace)
+    np.testing.assert_allclose(actual, expected, rtol=RTOL, atol=ATOL)
+
+
+@pytest.mark.parametrize("fps", FPS)
+def test_batch_matches_single_sessions(fps):
+    calculator = HeartMetricsCalculator(fps=fps)
+    traces = np.array([ppg_trace(fps, 60 * fps, heart_rate_bpm=60 + 8 * seed, noise=0.5, seed=seed) for seed in range(6)])
+    batch = calculator.estimate_heart_rate_batch(traces)
+    for row, trace in enumerate(traces):
+        np.testing.assert_allclose(batch[row], calculator.estimate_heart_rate_from_intensities(trace), rtol=RTOL, atol=ATOL)
+
+
+def test_short_capture_is_filtered_instead_of_raising():
+    # filtfilt(b, a) needs more than 33 samples; the minimum capture is 30.
+    metrics = HeartMetricsCalculator(fps=10).estimate_heart_rate_from_intensities(ppg_trace(10, 30))
+    assert len(metrics) == 5
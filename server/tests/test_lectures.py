@@ -0,0 +1,89 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import lectures
+from app.core.security import create_token
+from app.db.setup import LECTURES, VIDEOS
+
+LECTURE = {"topic": "Photosynthesis", "videos": [{"videoId": "vid1", "title": "Light reactions", "status": "unwatched"}]}
+
+
+@pytest.fixture
+def client(mongo):
+    app = FastAPI()
+    app.include_router(lectures.router)
+    with TestClient(app) as client:
+        yield client
+
+
+def _auth(user_id):
+    return {"Authorization": f"Bearer {create_token({'sub': user_id, 'email': f'{user_id}@example.com'})}"}
+
+
+def test_saving_a_lecture_requires_a_token(client):
+    assert client.post("/user/lectures", json=LECTURE).status_code == 401
+
+
+def test_lecture_is_saved_for_the_token_owner(client):
+    response = client.post("/user/lectures", json={**LECTURE, "user_id": "alice"}, headers=_auth("alice"))
+    assert response.status_code == 200
+    listed = client.get("/user/lectures", params={"user_id": "alice"}, headers=_auth("alice")).json()
+    assert [lecture["topic"] for lecture in listed["lectures"]] == ["Photosynthesis"]
+
+
+def test_cannot_save_for_another_user(client):
+    response = client.post("/user/lectures", json={**LECTURE, "user_id": "bob"}, headers=_auth("alice"))
+    assert response.status_code == 403
+    assert client.get("/user/lectures", params={"user_id": "bob"}).json()["lectures"] == []
+
+
+def _insert_lectures(mongo, count, created_at):
+    lectures = [{"_id": ObjectId(), "user_id": "alice", "topic": f"Topic {n}", "created_at": created_at,
+                 "videos": [{"videoId": f"vid{n}", "status": "todo"}] * (n + 1)} for n in range(count)]
+    asyncio.run(mongo(LECTURES).insert_many(lectures))
+    asyncio.run(mongo(VIDEOS).insert_many([{"_id": f"vid{n}", "title": f"Video {n}", "duration": "PT5M"} for n in range(count)]))
+    return lectures
+
+
+def test_cursor_pages_through_equal_timestamps(client, mongo):
+    lectures = _insert_lectures(mongo, 5, datetime(2026, 1, 1))
+    topics, cursor = [], None
+    for _ in range(5):
+        page = client.get("/user/lectures", params={"user_id": "alice", "limit": 2, **({"cursor": cursor} if cursor else {})}).json()
+        topics += [lecture["topic"] for lecture in page["lectures"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    # Newest first; equal timestamps fall back to _id, with no repeats or gaps.
+    assert topics == [lecture["topic"] for lecture in sorted(lectures, key=lambda l: l["_id"], reverse=True)]
+
+
+def test_tampered_cursor_is_rejected(client, mongo):
+    _insert_lectures(mongo, 3, datetime(2026, 1, 1))
+    cursor = client.get("/user/lectures", params={"user_id": "alice", "limit": 1}).json()["next_cursor"]
+    for tampered in (cursor[:-4] + "AAAA", "not-a-cursor"):
+        response = client.get("/user/lectures", params={"user_id": "alice", "cursor": tampered})
+        assert response.status_code == 400 and response.json()["detail"] == "Invalid cursor."
+
+
+def test_summary_view_counts_videos(client, mongo):
+    _insert_lectures(mongo, 3, datetime(2026, 1, 1))
+    lectures = client.get("/user/lectures", params={"user_id": "alice", "view": "summary"}).json()["lectures"]
+    assert sorted((lecture["topic"], lecture["video_count"]) for lecture in lectures) == [("Topic 0", 1), ("Topic 1", 2), ("Topic 2", 3)]
+    assert all("videos" not in lecture for lecture in lectures)
+
+
+def test_video_fields_select_catalog_fields(client, mongo):
+    _insert_lectures(mongo, 1, datetime(2026, 1, 1))
+    (lecture,) = client.get("/user/lectures", params={"user_id": "alice", "video_fields": "title,"}).json()["lectures"]
+    assert lecture["videos"] == [{"title": "Video 0"}]
+
+
+def test_unknown_video_field_is_rejected(client, mongo):
+    response = client.get("/user/lectures", params={"user_id": "alice", "video_fields": "title,likes"})
+    assert response.status_code == 400 and "likes" in response.json()["detail"]
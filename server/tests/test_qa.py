@@ -0,0 +1,97 @@
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import qa
+from app.services import gemini
+from app.services.upstream_scheduler import UpstreamScheduler
+
+
+class _Index:
+    def select_passages(self, question, max_tokens, top_k):
+        return [{"start": 65.0, "text": "Chlorophyll absorbs light."}, {"start": 130.0, "text": "Glucose is produced."}]
+
+
+class _QuotaError(Exception):
+    pass
+
+
+class _ExhaustedModel(gemini.FakeGenerativeModel):
+    async def generate_content_async(self, prompt, stream=False):
+        raise _QuotaError("429 quota exceeded")
+
+
+def _events(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+@pytest.fixture
+def use_model(monkeypatch):
+    async def transcript_index(video_id):
+        return _Index()
+
+    async def wikipedia_context(topic):
+        return "Photosynthesis is the process plants use to make food."
+
+    monkeypatch.setattr(qa, "get_transcript_index", transcript_index)
+    monkeypatch.setattr(qa, "_wikipedia_context", wikipedia_context)
+    monkeypatch.setattr(gemini, "gemini_scheduler", UpstreamScheduler("gemini", 100, 100))
+
+    def use(model, **kwargs):
+        monkeypatch.setattr(gemini, "_client", gemini.GeminiClient(model, **kwargs))
+    use(gemini.FakeGenerativeModel())
+    return use
+
+
+@pytest.fixture
+def client(use_model):
+    app = FastAPI()
+    app.include_router(qa.router)
+    with TestClient(app) as client:
+        yield client
+
+
+PARAMS = {"videoId": "vid1", "topic": "Photosynthesis", "question": "What does chlorophyll do?"}
+
+
+def test_answer_comes_from_the_fake_model(client):
+    response = client.get("/generate-answer", params=PARAMS)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["answer"].startswith("Fake answer")
+    assert "What does chlorophyll do?" in body["answer"]
+    assert [s["start"] for s in body["sources"]] == [65.0, 130.0]
+
+
+def test_stream_sends_tokens_then_done(client):
+    plain = client.get("/generate-answer", params=PARAMS).json()
+    response = client.get("/generate-answer/stream", params=PARAMS)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = _events(response.text)
+    names = [name for name, _ in events]
+    assert names[-1] == "done" and set(names[:-1]) == {"token"} and len(names) > 2
+    assert "".join(data["text"] for name, data in events if name == "token").strip() == plain["answer"]
+    assert events[-1][1]["sources"] == plain["sources"]
+
+
+def test_quota_error_before_first_token_keeps_429(client, use_model):
+    use_model(_ExhaustedModel(), quota_errors=(_QuotaError,))
+    response = client.get("/generate-answer/stream", params=PARAMS)
+    assert response.status_code == 429
+    assert gemini.gemini_scheduler.counters["exhausted_signals"] == 1
+
+
+def test_throttled_call_is_not_sent(client, monkeypatch):
+    monkeypatch.setattr(gemini, "gemini_scheduler", UpstreamScheduler("gemini", 1, 1 / 3600, max_wait=1))
+    assert client.get("/generate-answer", params=PARAMS).status_code == 200
+    response = client.get("/generate-answer/stream", params=PARAMS)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) > 0
@@ -0,0 +1,101 @@
+import asyncio
+
+from app.utils.singleflight import SingleFlight
+
+
+class _Work:
+    def __init__(self, error=None):
+        self.error = error
+        self.started = 0
+        self.cancelled = False
+        self.release = None
+
+    async def __call__(self, value):
+        self.started += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error is not None:
+            raise self.error
+        return {"value": value}
+
+
+async def _callers(flights, work, count, key="k"):
+    work.release = asyncio.Event()
+    tasks = [asyncio.create_task(flights.do(key, work, key)) for _ in range(count)]
+    await asyncio.sleep(0)
+    return tasks
+
+
+def test_concurrent_callers_share_one_execution():
+    async def scenario():
+        flights, work = SingleFlight("test_shared"), _Work()
+        tasks = await _callers(flights, work, 10)
+        work.release.set()
+        results = await asyncio.gather(*tasks)
+        # A finished flight is not a cache: the next call runs again.
+        again = await flights.do("k", work, "k")
+        return flights, work, results, again
+
+    flights, work, results, again = asyncio.run(scenario())
+    assert work.started == 2 and again == {"value": "k"}
+    assert all(result is results[0] for result in results)
+    assert flights.stats() == {"calls": 11, "executions": 2, "coalesced": 9, "abandoned": 0, "errors": 0, "in_flight": 0}
+
+
+def test_every_caller_gets_the_same_exception():
+    async def scenario():
+        flights, work = SingleFlight("test_errors"), _Work(error=ValueError("quota exceeded"))
+        tasks = await _callers(flights, work, 5)
+        work.release.set()
+        return flights, work, await asyncio.gather(*tasks, return_exceptions=True)
+
+    flights, work, errors = asyncio.run(scenario())
+    assert work.started == 1
+    assert all(isinstance(e, ValueError) and e is errors[0] for e in errors)
+    assert flights.counters["errors"] == 1
+
+
+def test_cancelling_one_waiter_keeps_the_shared_call():
+    async def scenario():
+        flights, work = SingleFlight("test_cancel_one"), _Work()
+        tasks = await _callers(flights, work, 3)
+        tasks[0].cancel()
+        await asyncio.sleep(0)
+        work.release.set()
+        return flights, work, await asyncio.gather(*tasks, return_exceptions=True)
+
+    flights, work, results = asyncio.run(scenario())
+    assert isinstance(results[0], asyncio.CancelledError)
+    assert results[1:] == [{"value": "k"}] * 2
+    assert not work.cancelled and flights.counters["abandoned"] == 0
+
+
+def test_call_is_cancelled_when_every_waiter_leaves():
+    async def scenario():
+        flights, work = SingleFlight("test_cancel_all"), _Work()
+        tasks = await _callers(flights, work, 2)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.sleep(0)
+        return flights, work
+
+    flights, work = asyncio.run(scenario())
+    assert work.cancelled
+    assert flights.counters["abandoned"] == 1 and flights.stats()["in_flight"] == 0
+
+
+def test_keys_do_not_share():
+    async def scenario():
+        flights, work = SingleFlight("test_keys"), _Work()
+        work.release = asyncio.Event()
+        tasks = [asyncio.create_task(flights.do(key, work, key)) for key in ("a", "b", "a")]
+        await asyncio.sleep(0)
+        work.release.set()
+        return work, await asyncio.gather(*tasks)
+
+    work, results = asyncio.run(scenario())
+    assert work.started == 2 and [r["value"] for r in results] == ["a", "b", "a"]
@@ -0,0 +1,60 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import stress
+
+
+class _RecordingPool:
+    def __init__(self):
+        self.calls = []
+
+    async def run(self, fn, *args):
+        self.calls.append(args)
+        return {"avg_heart_rate": 72.0, "stage_timings": ()}
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = _RecordingPool()
+    monkeypatch.setattr(stress, "stress_pool", pool)
+    monkeypatch.setattr(stress, "STRESS_MAX_UPLOAD_FRAMES", 3)
+    return pool
+
+
+@pytest.fixture
+def client(pool):
+    app = FastAPI()
+    app.include_router(stress.router)
+    with TestClient(app) as client:
+        yield client
+
+
+def _files(count):
+    return [("frames", (f"{n}.jpg", b"\xff\xd8jpeg", "image/jpeg")) for n in range(count)]
+
+
+def test_multipart_frames_are_analyzed(client, pool):
+    response = client.post("/analyze-stress/binary", files=_files(3))
+    assert response.status_code == 200 and response.json()["avg_heart_rate"] == 72.0
+    (payloads, *_), = pool.calls
+    assert len(payloads) == 3
+
+
+def test_too_many_parts_is_a_client_error(client, pool):
+    response = client.post("/analyze-stress/binary", files=_files(4))
+    assert response.status_code == 400 and "Too many files" in response.json()["detail"]
+    assert pool.calls == []
+
+
+def test_malformed_multipart_is_a_client_error(client, pool):
+    response = client.post("/analyze-stress/binary", content=b"not multipart",
+                           headers={"Content-Type": "multipart/form-data"})
+    assert response.status_code == 400
+    assert pool.calls == []
+
+
+@pytest.mark.parametrize("fps", [0, -10])
+def test_non_positive_fps_is_rejected(client, pool, fps):
+    response = client.post(f"/analyze-stress/binary?fps={fps}", files=_files(1))
+    assert response.status_code == 400 and response.json()["detail"] == "fps must be positive."
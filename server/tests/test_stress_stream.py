@@ -0,0 +1,101 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.api import stress
+from app.core.security import create_token
+from app.db.setup import STRESS_AGGREGATES, STRESS_SAMPLES
+from benchmarks.synthetic import ppg_trace
+
+FPS = 10
+TOKEN = {"sub": "alice", "email": "alice@example.com"}
+
+
+class _InlinePool:
+    # Stands in for the stress process pool: each "frame" is already its
+    # forehead intensity, so no image decoding or face detection runs.
+    async def run(self, fn, frames, first_frame_no, localizer, gate):
+        return [float(frame) for frame in frames], localizer, gate
+
+
+@pytest.fixture
+def client(mongo, monkeypatch):
+    monkeypatch.setattr(stress, "stress_pool", _InlinePool())
+    monkeypatch.setattr(stress, "STRESS_HISTORY", True)
+    app = FastAPI()
+    app.include_router(stress.router)
+    with TestClient(app) as client:
+        yield client
+
+
+def _send_trace(websocket, seconds):
+    trace = [str(value) for value in ppg_trace(FPS, seconds * FPS, heart_rate_bpm=72)]
+    for start in range(0, len(trace), FPS):
+        websocket.send_json({"frames": trace[start:start + FPS]})
+
+
+def _end(websocket) -> list[dict]:
+    websocket.send_json({"type": "end"})
+    messages = [websocket.receive_json()]
+    while messages[-1]["type"] != "final":
+        messages.append(websocket.receive_json())
+    return messages
+
+
+def _find(mongo, name, query=None):
+    return asyncio.run(mongo(name).find(query or {}).to_list(length=None))
+
+
+def test_a_stream_is_stored_once_when_it_ends(client, mongo):
+    with client.websocket_connect(f"/ws/analyze-stress?fps={FPS}&video_id=vid1&token={create_token(TOKEN)}") as websocket:
+        _send_trace(websocket, 30)
+        messages = _end(websocket)
+
+    final = messages[-1]
+    assert sum(message["type"] == "metrics" for message in messages) > 1
+    assert "session_id" not in messages[0] and final["session_id"]
+    (sample,) = _find(mongo, STRESS_SAMPLES)
+    assert sample["session_id"] == final["session_id"] and sample["source"] == "stream"
+    assert sample["avg_heart_rate"] == pytest.approx(final["avg_heart_rate"])
+    assert sample["frame_quality"]["checked_frames"] == final["frame_quality"]["checked_frames"]
+    (session,) = _find(mongo, STRESS_AGGREGATES, {"scope": "session"})
+    assert session["samples"] == 1 and session["heart_rate"]["count"] == 1
+
+
+def test_a_disconnected_stream_is_stored(client, mongo):
+    with client.websocket_connect(f"/ws/analyze-stress?fps={FPS}&token={create_token(TOKEN)}") as websocket:
+        _send_trace(websocket, 20)
+        websocket.receive_json()
+
+    # The server notices the disconnect once it has read the queued chunks.
+    for _ in range(100):
+        if _find(mongo, STRESS_SAMPLES):
+            break
+        time.sleep(0.01)
+    (sample,) = _find(mongo, STRESS_SAMPLES)
+    assert sample["valid_frames"] >= stress.MIN_VALID_FRAMES
+
+
+def test_short_and_anonymous_streams_are_not_stored(client, mongo):
+    with client.websocket_connect(f"/ws/analyze-stress?fps={FPS}&token={create_token(TOKEN)}") as websocket:
+        _send_trace(websocket, 2)
+        final = _end(websocket)[-1]
+    assert "error" in final and "session_id" not in final
+
+    with client.websocket_connect(f"/ws/analyze-stress?fps={FPS}") as websocket:
+        _send_trace(websocket, 30)
+        final = _end(websocket)[-1]
+    assert "error" not in final and "session_id" not in final
+    assert _find(mongo, STRESS_SAMPLES) == []
+
+
+@pytest.mark.parametrize("query", ["face_mode=unknown", "fps=0", "fps=-5", "token=not-a-token"])
+def test_bad_parameters_are_refused(client, query):
+    with pytest.raises(WebSocketDisconnect) as refused:
+        with client.websocket_connect(f"/ws/analyze-stress?{query}"):
+            pass
+    assert refused.value.code == 1008
@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import stress_trends
+from app.core.security import create_token
+from app.services.stress_store import stress_store
+
+RESULT = {"avg_heart_rate": 72.0, "lf_hf_ratio": 1.5, "valid_frames": 300}
+
+
+@pytest.fixture
+def client(mongo):
+    app = FastAPI()
+    app.include_router(stress_trends.router)
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def auth():
+    return {"Authorization": f"Bearer {create_token({'sub': 'alice', 'email': 'alice@example.com'})}"}
+
+
+def test_lecture_and_session_scopes_filter_by_video(client, mongo, auth):
+    asyncio.run(stress_store.record("alice", "s1", RESULT, "vid1"))
+    asyncio.run(stress_store.record("alice", "s2", RESULT, "vid2"))
+    for scope in ("lecture", "session"):
+        aggregates = client.get("/stress-trends", params={"scope": scope, "video_id": "vid1"}, headers=auth).json()["aggregates"]
+        assert [a["video_id"] for a in aggregates] == ["vid1"]
+    (day,) = client.get("/stress-trends", params={"scope": "day"}, headers=auth).json()["aggregates"]
+    assert day["samples"] == 2 and day["heart_rate"]["mean"] == 72.0
+
+
+def test_day_scope_rejects_a_video_filter(client, mongo, auth):
+    response = client.get("/stress-trends", params={"scope": "day", "video_id": "vid1"}, headers=auth)
+    assert response.status_code == 400 and "scope=day" in response.json()["detail"]
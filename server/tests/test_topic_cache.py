@@ -0,0 +1,104 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from app.db.setup import LECTURE_CACHE
+from app.services.topic_cache import TopicCache
+
+
+class _Fetcher:
+    def __init__(self, value="new"):
+        self.value = value
+        self.calls = []
+
+    async def __call__(self, topic):
+        self.calls.append(topic)
+        await asyncio.sleep(0)
+        return [self.value]
+
+
+def _cache(**kwargs):
+    # Each instance stands for one worker process sharing the Mongo tier.
+    return TopicCache(LECTURE_CACHE, **{"fresh_seconds": 60, "stale_seconds": 3600, **kwargs})
+
+
+async def _age(mongo, topic_key, seconds):
+    await mongo(LECTURE_CACHE).update_one({"_id": topic_key}, {"$set": {"fetched_at": datetime.utcnow() - timedelta(seconds=seconds)}})
+
+
+async def _refreshes_done(*caches):
+    for cache in caches:
+        await asyncio.gather(*cache._refreshing.values())
+
+
+def test_fresh_hits_do_not_fetch(mongo):
+    async def scenario():
+        fetch = _Fetcher()
+        first, second = _cache(), _cache()
+        values = [await first.get_or_fetch("Photosynthesis", fetch),
+                  await first.get_or_fetch("photosynthesis ", fetch),
+                  await second.get_or_fetch("PHOTOSYNTHESIS", fetch)]
+        return fetch, values, first, second
+
+    fetch, values, first, second = asyncio.run(scenario())
+    assert fetch.calls == ["Photosynthesis"] and values == [["new"]] * 3
+    assert first.counters["memory_hits"] == 1 and second.counters["mongo_hits"] == 1
+
+
+def test_stale_hit_serves_old_value_and_refreshes_once(mongo):
+    async def scenario():
+        await _cache().store("Photosynthesis", ["old"])
+        await _age(mongo, "photosynthesis", 120)
+        cache, fetch = _cache(), _Fetcher()
+        served = await asyncio.gather(*(cache.lookup("Photosynthesis", fetch) for _ in range(5)))
+        await _refreshes_done(cache)
+        stored = await mongo(LECTURE_CACHE).find_one({"_id": "photosynthesis"})
+        return cache, fetch, served, stored, await cache.lookup("Photosynthesis", fetch)
+
+    cache, fetch, served, stored, after = asyncio.run(scenario())
+    assert served == [["old"]] * 5
+    assert fetch.calls == ["Photosynthesis"] and cache.counters["refreshes"] == 1
+    assert stored["value"] == ["new"] and "refresh_lease" not in stored
+    assert after == ["new"]
+
+
+def test_worker_that_loses_the_lease_does_not_refetch(mongo):
+    async def scenario():
+        await _cache().store("Photosynthesis", ["old"])
+        await _age(mongo, "photosynthesis", 120)
+        holder, other = _cache(), _cache()
+        assert await holder._acquire_lease("photosynthesis")
+        fetch = _Fetcher()
+        served = await other.lookup("Photosynthesis", fetch)
+        await _refreshes_done(other)
+        return fetch, served, other
+
+    fetch, served, other = asyncio.run(scenario())
+    assert served == ["old"] and fetch.calls == [] and other.counters["refreshes"] == 0
+
+
+def test_expired_lease_can_be_taken_over(mongo):
+    async def scenario():
+        await _cache().store("Photosynthesis", ["old"])
+        await _age(mongo, "photosynthesis", 120)
+        await mongo(LECTURE_CACHE).update_one({"_id": "photosynthesis"}, {"$set": {"refresh_lease": datetime.utcnow() - timedelta(seconds=1)}})
+        cache, fetch = _cache(), _Fetcher()
+        await cache.lookup("Photosynthesis", fetch)
+        await _refreshes_done(cache)
+        return fetch
+
+    assert asyncio.run(scenario()).calls == ["Photosynthesis"]
+
+
+def test_memory_tier_evicts_least_recently_used(mongo):
+    async def scenario():
+        cache, fetch = _cache(max_entries=2), _Fetcher()
+        for topic in ("a", "b", "c"):
+            await cache.store(topic, [topic])
+        memory = len(cache._memory)
+        value = await cache.lookup("a", fetch)
+        return cache, fetch, memory, value
+
+    cache, fetch, memory, value = asyncio.run(scenario())
+    # "a" fell out of memory but is still served from Mongo without a fetch.
+    assert memory == 2 and value == ["a"]
+    assert cache.counters["mongo_hits"] == 1 and fetch.calls == []
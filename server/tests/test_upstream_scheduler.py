@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services.upstream_scheduler import BACKGROUND, UpstreamScheduler, UpstreamThrottled, upstream_priority
+
+DAILY_QUOTA = 10000
+BURST = 1000
+SEARCH_COST = 100
+
+
+def _youtube(**kwargs):
+    return UpstreamScheduler("youtube", BURST, DAILY_QUOTA / 86400, min_capacity=SEARCH_COST, **kwargs)
+
+
+def test_share_splits_burst_and_refill():
+    scheduler = _youtube()
+    scheduler.set_share(1 / 4)
+    assert scheduler.bucket.capacity == BURST / 4
+    assert scheduler.bucket.refill_per_second == pytest.approx(DAILY_QUOTA / 86400 / 4)
+
+
+def test_share_keeps_room_for_one_search():
+    scheduler = _youtube()
+    scheduler.set_share(1 / 32)
+    assert scheduler.bucket.capacity == SEARCH_COST
+
+
+def test_interactive_call_fails_fast_once_the_budget_is_spent():
+    async def run():
+        scheduler = _youtube(max_wait=10)
+        scheduler.set_share(1 / 2)
+        for _ in range(5):
+            await scheduler.acquire(SEARCH_COST)
+        started = time.monotonic()
+        with pytest.raises(UpstreamThrottled) as throttled:
+            await scheduler.acquire(SEARCH_COST)
+        return time.monotonic() - started, throttled.value.retry_after
+
+    elapsed, retry_after = asyncio.run(run())
+    assert elapsed < 0.1
+    # 100 units at 10000 / 86400 / 2 units per second.
+    assert retry_after == pytest.approx(SEARCH_COST / (DAILY_QUOTA / 86400 / 2), abs=2)
+
+
+def test_background_call_waits_for_a_short_refill():
+    async def run():
+        scheduler = UpstreamScheduler("gemini", 1, 20, max_wait=0.01, background_max_wait=1)
+        await scheduler.acquire()
+        with pytest.raises(UpstreamThrottled):
+            await scheduler.acquire()
+        with upstream_priority(BACKGROUND):
+            await scheduler.acquire()
+        return scheduler.counters
+
+    counters = asyncio.run(run())
+    assert counters["granted"] == 2 and counters["throttled"] == 1